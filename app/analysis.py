@@ -0,0 +1,464 @@
+from collections import Counter, OrderedDict
+from datetime import datetime
+from operator import itemgetter
+from sketches import QuantileSketch, FrequentItems, HyperLogLog
+from utils import (get_range, time_difference, get_counts, rate_per_minute, rate_per_hour,
+                   top_counts_per_hour, get_percentiles, top_values_per_bucket, to_number,
+                   sketch_percentiles, insight_key, analyze_log_data, MINUTE_BUCKET, HOUR_BUCKET)
+
+
+class RangeAccumulator:
+    """
+    Incremental counterpart of get_range: tracks the smallest and largest item.
+    """
+
+    def __init__(self):
+        self.low = None
+        self.high = None
+
+    def update(self, item):
+        if self.low is None or item < self.low:
+            self.low = item
+        if self.high is None or item > self.high:
+            self.high = item
+
+    def update_many(self, items):
+        self.update(min(items))
+        self.update(max(items))
+
+    def merge(self, other):
+        if other.low is not None:
+            self.update(other.low)
+            self.update(other.high)
+
+    def result(self):
+        return {"range": (self.low, self.high)}
+
+
+class TimeDifferenceAccumulator(RangeAccumulator):
+    """
+    Incremental counterpart of time_difference.
+
+    Normalized timestamps ("YYYY-MM-DD HH:MM:SS") sort chronologically as strings,
+    so only the earliest and latest value have to be converted to datetime objects.
+    """
+
+    def result(self):
+        earliest = datetime.strptime(self.low, "%Y-%m-%d %H:%M:%S")
+        latest = datetime.strptime(self.high, "%Y-%m-%d %H:%M:%S")
+        return {"time_difference": (latest - earliest).total_seconds() / 60}
+
+
+class CountsAccumulator:
+    """
+    Incremental counterpart of get_counts.
+    """
+
+    def __init__(self):
+        self.counts = {}
+
+    def update(self, item):
+        self.counts[item] = self.counts.get(item, 0) + 1
+
+    def update_many(self, items):
+        self.add_counts(Counter(items))
+
+    def add_counts(self, item_counts):
+        counts = self.counts
+        for item, count in item_counts.items():
+            counts[item] = counts.get(item, 0) + count
+
+    def merge(self, other):
+        self.add_counts(other.counts)
+
+    def result(self):
+        return {"counts": self.counts}
+
+
+class BucketCountsAccumulator(CountsAccumulator):
+    """
+    Incremental counterpart of rate_per_minute and rate_per_hour: counts the
+    normalized timestamps per bucket, identified by a prefix of the timestamp.
+    """
+
+    name = "rate_per_minute"
+    length = MINUTE_BUCKET
+
+    def update(self, item):
+        bucket = item[:self.length]
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+
+    def update_many(self, items):
+        length = self.length
+        self.add_counts(Counter([item[:length] for item in items]))
+
+    def result(self):
+        return {self.name: self.counts}
+
+
+class HourlyBucketCountsAccumulator(BucketCountsAccumulator):
+    name = "rate_per_hour"
+    length = HOUR_BUCKET
+
+
+class TopPerBucketAccumulator:
+    """
+    Incremental counterpart of top_counts_per_hour. Keeps the full counts per hour,
+    which stay small for fields with few distinct values such as the status.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+
+    def update(self, item):
+        ts, value = item
+        counts = self.buckets.get(ts[:HOUR_BUCKET])
+        if counts is None:
+            counts = self.buckets[ts[:HOUR_BUCKET]] = {}
+        counts[value] = counts.get(value, 0) + 1
+
+    def update_many(self, items):
+        buckets = self.buckets
+        for (bucket, value), count in Counter([(ts[:HOUR_BUCKET], value) for ts, value in items]).items():
+            counts = buckets.get(bucket)
+            if counts is None:
+                counts = buckets[bucket] = {}
+            counts[value] = counts.get(value, 0) + count
+
+    def merge(self, other):
+        for bucket, other_counts in other.buckets.items():
+            counts = self.buckets.setdefault(bucket, {})
+            for value, count in other_counts.items():
+                counts[value] = counts.get(value, 0) + count
+
+    def result(self):
+        return {"top_per_hour": top_values_per_bucket(self.buckets)}
+
+
+class PercentileAccumulator:
+    """
+    Incremental counterpart of get_percentiles. The sketch only adds up counts, so
+    the percentiles do not depend on the order of the items or of merges.
+    """
+
+    def __init__(self):
+        self.sketch = QuantileSketch()
+
+    def update(self, item):
+        number = to_number(item)
+        if number is not None:
+            self.sketch.add(number)
+
+    def update_many(self, items):
+        numbers = [to_number(item) for item in items]
+        self.sketch.add_many([number for number in numbers if number is not None])
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+
+    def result(self):
+        return sketch_percentiles(self.sketch)
+
+
+class TopValuesAccumulator:
+    """
+    Top-k of a high-cardinality field: exact up to a number of distinct values,
+    approximate in a fixed number of counters beyond it.
+    """
+
+    def __init__(self, k, error):
+        self.k = k
+        self.summary = FrequentItems.for_error(error)
+
+    def update(self, item):
+        self.summary.update(item)
+
+    def update_many(self, items):
+        self.summary.update_many(Counter(items))
+
+    def merge(self, other):
+        self.summary.merge(other.summary)
+
+    def result(self):
+        result = {"top_values": self.summary.top(self.k)}
+        if self.summary.approximate:
+            result["top_values_approximate"] = True
+        return result
+
+
+class DistinctCountAccumulator:
+    """
+    Number of distinct values: exact up to a limit, estimated with HyperLogLog beyond it.
+    """
+
+    def __init__(self, error):
+        self.sketch = HyperLogLog.for_error(error)
+
+    def update(self, item):
+        self.sketch.update(item)
+
+    def update_many(self, items):
+        self.sketch.update_many(items)
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+
+    def result(self):
+        result = {"distinct": self.sketch.estimate()}
+        if self.sketch.approximate:
+            result["distinct_approximate"] = True
+        return result
+
+
+class ApproximateAnalysis:
+    """
+    Base class for parameterized analysis functions backed by a fixed-size sketch.
+
+    Instances are used in a parser's analysis_config like the plain analysis
+    functions. Calling one analyzes a list of items; make_accumulator() returns the
+    streaming accumulator that make_accumulator() in this module picks up.
+    """
+
+    def __call__(self, items):
+        accumulator = self.make_accumulator()
+        for item in items:
+            accumulator.update(item)
+        return accumulator.result()
+
+    def make_accumulator(self):
+        raise NotImplementedError
+
+
+class ApproximateTopValues(ApproximateAnalysis):
+    """
+    Replacement for get_counts on fields with millions of distinct values (e.g.
+    client IPs): only the k most frequent values are reported. The counts are exact
+    up to sketches.EXACT_LIMIT distinct values and approximate beyond it.
+    """
+
+    def __init__(self, k=10, error=0.001):
+        """
+        Args:
+            k (int): Number of values to report.
+            error (float): Maximum count error as a fraction of the number of items.
+                Memory grows with 1 / error, not with the number of distinct values.
+        """
+        self.k = k
+        self.error = error
+
+    def make_accumulator(self):
+        return TopValuesAccumulator(self.k, self.error)
+
+
+class ApproximateDistinctCount(ApproximateAnalysis):
+    """
+    Number of distinct values of a field, exact up to sketches.EXACT_LIMIT values
+    and estimated beyond it.
+    """
+
+    def __init__(self, error=0.01):
+        """
+        Args:
+            error (float): Relative standard error of the estimate. The default uses
+                16 KiB per field.
+        """
+        self.error = error
+
+    def make_accumulator(self):
+        return DistinctCountAccumulator(self.error)
+
+
+# Maps the analysis functions used in a parser's analysis_config to their accumulators.
+ACCUMULATORS = {
+    get_range: RangeAccumulator,
+    time_difference: TimeDifferenceAccumulator,
+    get_counts: CountsAccumulator,
+    rate_per_minute: BucketCountsAccumulator,
+    rate_per_hour: HourlyBucketCountsAccumulator,
+    top_counts_per_hour: TopPerBucketAccumulator,
+    get_percentiles: PercentileAccumulator,
+}
+
+
+def make_accumulator(function):
+    """
+    Create the incremental accumulator for an analysis function.
+
+    Args:
+        function (func): An analysis function from a parser's analysis_config.
+
+    Returns:
+        object: An accumulator with update(item), update_many(items), merge(other) and
+            result() methods.
+    """
+    # Parameterized analyses (e.g. ApproximateTopValues) create their own accumulator
+    if hasattr(function, 'make_accumulator'):
+        return function.make_accumulator()
+    try:
+        return ACCUMULATORS[function]()
+    except KeyError:
+        raise ValueError(
+            f"No streaming accumulator registered for '{function.__name__}'.")
+
+
+class StreamingAnalyzer:
+    """
+    Computes the insights of analyze_log_data in a single pass, one record at a time.
+
+    Memory use only depends on the accumulators (e.g. the number of distinct values
+    for get_counts), not on the number of records.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.accumulators = {
+            key: [make_accumulator(function) for function in functions]
+            for key, functions in config.items()
+        }
+        # Plain field keys and combined (tuple) keys, split once so update() needs no type checks
+        self.field_accumulators = [(key, accumulators) for key, accumulators in self.accumulators.items()
+                                   if type(key) is not tuple]
+        self.combined_accumulators = [(key, accumulators) for key, accumulators in self.accumulators.items()
+                                      if type(key) is tuple]
+        self.seen_keys = set()
+        self.records = 0
+        self.lines_read = 0
+
+    def update(self, record):
+        """Feed a single parsed record into all accumulators."""
+        self.records += 1
+        seen_keys = self.seen_keys
+        for key, accumulators in self.field_accumulators:
+            if key in record:
+                item = record[key]
+                seen_keys.add(key)
+                for accumulator in accumulators:
+                    accumulator.update(item)
+        for key, accumulators in self.combined_accumulators:
+            # Only records with all fields of a combined key count
+            try:
+                item = tuple([record[field] for field in key])
+            except KeyError:
+                continue
+            seen_keys.add(key)
+            for accumulator in accumulators:
+                accumulator.update(item)
+
+    def update_batch(self, records):
+        """
+        Feed a batch of parsed records into all accumulators. Equivalent to calling
+        update() for each record, but every accumulator sees the items of a field at once.
+        """
+        self.records += len(records)
+        seen_keys = self.seen_keys
+        for key, accumulators in self.field_accumulators:
+            items = [record[key] for record in records if key in record]
+            if items:
+                seen_keys.add(key)
+                for accumulator in accumulators:
+                    accumulator.update_many(items)
+        for key, accumulators in self.combined_accumulators:
+            # Only records with all fields of a combined key count
+            get_item = itemgetter(*key) if len(key) > 1 else lambda record, field=key[0]: (record[field],)
+            items = []
+            for record in records:
+                try:
+                    items.append(get_item(record))
+                except KeyError:
+                    continue
+            if items:
+                seen_keys.add(key)
+                for accumulator in accumulators:
+                    accumulator.update_many(items)
+
+    def merge(self, other):
+        """Merge the partial result of another analyzer using the same config."""
+        self.records += other.records
+        self.lines_read += other.lines_read
+        self.seen_keys.update(other.seen_keys)
+        for key, accumulators in self.accumulators.items():
+            for accumulator, other_accumulator in zip(accumulators, other.accumulators[key]):
+                accumulator.merge(other_accumulator)
+
+    def insights(self):
+        """
+        Build the insights dictionary in the same layout as analyze_log_data.
+
+        Returns:
+            dict: Insights keyed by the analyzed field.
+        """
+        insights = {}
+        for key, accumulators in self.accumulators.items():
+            if key not in self.seen_keys:
+                continue
+            for accumulator in accumulators:
+                insights.setdefault(insight_key(key), {}).update(accumulator.result())
+        return insights
+
+
+class InsightsCache:
+    """
+    Memoizes the insights of RecordStores per analysis configuration.
+
+    A RecordStore only grows, so its insights stay valid as long as its number of
+    rows is unchanged. If the store's aggregates were computed while it was parsed
+    (RecordStore.aggregates) and cover all rows, the insights are taken from them
+    instead of a pass over the columns.
+    """
+
+    def __init__(self, size=8):
+        """
+        Args:
+            size (int): Number of (store, configuration) results kept, e.g. for
+                several filtered views of the same log.
+        """
+        self.size = size
+        # (id of the store, id of the config) -> (store, config, rows, insights). The
+        # store and config are kept so that their ids cannot be reused.
+        self.entries = OrderedDict()
+
+    def insights(self, parsed_data, config):
+        """
+        Return the insights of a store for an analysis configuration.
+
+        Args:
+            parsed_data (RecordStore): The parsed log entries.
+            config (dict): The analysis_config of the parser.
+
+        Returns:
+            dict: Insights keyed by the analyzed field.
+        """
+        key = (id(parsed_data), id(config))
+        entry = self.entries.get(key)
+        if entry is not None and entry[2] == len(parsed_data):
+            self.entries.move_to_end(key)
+            return entry[3]
+
+        aggregates = parsed_data.aggregates
+        if aggregates is not None and aggregates.config is config and aggregates.records == len(parsed_data):
+            insights = aggregates.insights()
+        else:
+            insights = analyze_log_data(parsed_data, config)
+        self.entries[key] = (parsed_data, config, len(parsed_data), insights)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return insights
+
+
+class CountingIterator:
+    """
+    Wraps an iterator and counts the items that were taken from it.
+    """
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self.iterator)
+        self.count += 1
+        return item
@@ -1,44 +1,292 @@
 import argparse
-from parsers.log_format import LogFormat
+from parsers.log_format import LogFormat, AUTO_FORMAT
+from prefilter import LineFilter
+from time_index import TimeRange, parse_time_bound
+from output_batch import OUTPUT_FORMATS
 from utils import *
 from output_cli import display_insights
+from pager import TablePager
+from query import QueryEngine
+from record_store import RecordStore
+from analysis import InsightsCache
+from group_by import GroupByAggregator, DEFAULT_MEMORY_MB
+from export import EXPORT_FORMATS, DEFAULT_TABLE
+from stats import current_stats
+from server import DEFAULT_HOST, DEFAULT_PORT
 
 
-def parse_arguments():
+def positive_int(value):
     """
-    Capture and process user inputs.
+    Argument type for options that expect a positive integer.
+
+    Args:
+        value (str): The raw command-line value.
 
     Returns:
-        args: A Namespace object containing the provided arguments.
+        int: The parsed value.
     """
-    parser = argparse.ArgumentParser(
-        description="LogLoom: A tool for parsing log files.")
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not an integer.")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"'{value}' must be at least 1.")
+    return number
+
+
+def positive_float(value):
+    """
+    Argument type for options that expect a positive number.
+
+    Args:
+        value (str): The raw command-line value.
+
+    Returns:
+        float: The parsed value.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a number.")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"'{value}' must be greater than 0.")
+    return number
+
 
+def add_input_arguments(parser):
+    """Add the log files and their format to an argument parser."""
     # Argument for the path to the log file
-    parser.add_argument('file_path', type=str,
-                        help='Path to the log file to be parsed.')
+    parser.add_argument('file_path', type=str, nargs='+',
+                        help="Paths to the log files to be parsed, directories, or quoted glob patterns of rotated "
+                             "sets (e.g. 'access.log*'). gzip, bz2, xz and zstd files are decompressed.")
 
     # Argument for the log format (e.g., "CLF", "Syslog", ...)
-    parser.add_argument('-f', '--format', type=str, choices=[
-                        log_format.value for log_format in LogFormat], default=LogFormat.CLF.value, help='The format of the log file.')
+    # Formats declared in format files or provided by plugins are accepted too, so the
+    # name is checked by the format registry instead of through choices
+    parser.add_argument('-f', '--format', type=str, default=LogFormat.CLF.value,
+                        help="The format of the log file: "
+                             f"{', '.join(log_format.value for log_format in LogFormat)}, a format declared "
+                             f"with --formats-file, or '{AUTO_FORMAT}' to detect it from the first lines of the file.")
+
+    # Declarative format specs (see parsers/registry.py)
+    parser.add_argument('--formats-file', type=str, action='append', metavar='FILE',
+                        help='JSON file declaring additional log formats. Can be given several times.')
+
+
+def add_filter_arguments(parser):
+    """Add the pre-filter options (--grep, --status, --query) to an argument parser."""
+    # Pre-filters that skip lines before they are parsed
+    parser.add_argument('-g', '--grep', type=str, action='append', default=[],
+                        help='Only keep lines containing this literal text. Can be given multiple times.')
+    parser.add_argument('--status', type=str,
+                        help="Only keep entries with these status codes, e.g. '5xx' or '404,503'.")
+    parser.add_argument('--query', type=str,
+                        help="Only keep entries matching a query, e.g. 'status>=500 AND ip=10.0.0.0/8 AND "
+                             "request~\"/api/\"'. Conditions use =, !=, <, <=, >, >=, ~ (regular expression) "
+                             "and !~, combined with AND, OR, NOT and parentheses.")
+
+
+def add_instrumentation_arguments(parser):
+    """Add --stats and --profile to an argument parser."""
+    # Instrumentation: where the time of a run goes
+    parser.add_argument('--stats', nargs='?', const='table', choices=('table', 'json'),
+                        help='Print counters and per-stage timings to stderr when the run ends, '
+                             "as a table (default) or as JSON ('--stats json').")
+    parser.add_argument('--profile', type=str, metavar='FILE',
+                        help='Profile the run with cProfile and save the result to FILE '
+                             '(an .html FILE uses pyinstrument, if installed).')
+
+
+def parse_arguments(argv=None):
+    """
+    Capture and process user inputs.
+
+    Args:
+        argv (list or None): The arguments, sys.argv[1:] by default.
+
+    Returns:
+        args: A Namespace object containing the provided arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="LogLoom: A tool for parsing log files. "
+                    "Run 'serve --help' for the options of the HTTP query server.")
+
+    add_input_arguments(parser)
 
     # Optional: Additional arguments, such as filter options, can be added here.
     parser.add_argument('-p', '--print', action='store_true',
                         help='Just print the log file without parsing.')
 
-    args = parser.parse_args()
+    # Analyze in a single pass without keeping the parsed data in memory
+    parser.add_argument('-s', '--stream', action='store_true',
+                        help='Analyze the log file in a single streaming pass and print the insights.')
+
+    # Parse byte ranges of the file in parallel worker processes (implies --stream)
+    parser.add_argument('-w', '--workers', type=positive_int, default=1,
+                        help='Number of worker processes for the streaming analysis (implies --stream).')
+
+    # Reuse the parsed data of earlier runs and only parse appended lines
+    parser.add_argument('-c', '--cache', action='store_true',
+                        help='Keep a sidecar cache file next to the log and only parse lines appended since the last run.')
+
+    # Watch a growing log file and show live insights
+    parser.add_argument('--follow', action='store_true',
+                        help='Follow the end of the log file (like tail -F) and keep a live summary of the insights.')
+    parser.add_argument('--interval', type=positive_float, default=2.0,
+                        help='Seconds between two redraws of the summary in --follow mode.')
+
+    add_filter_arguments(parser)
+
+    # Headless mode for scripts and cron jobs: no menu, machine-readable output on stdout
+    parser.add_argument('--analyze', action='store_true',
+                        help='Print the insights in the --output format instead of opening the interactive menu.')
+    parser.add_argument('--select', type=str,
+                        help="Comma-separated fields, e.g. 'ip,status'. Without --analyze, the selected fields "
+                             "of every entry are written as they are parsed; with --analyze, only these fields are analyzed.")
+    parser.add_argument('--output', type=str, choices=OUTPUT_FORMATS,
+                        help='Output format of the headless mode (default: json for --analyze, ndjson for entries).')
+
+    # Multi-dimensional aggregation, e.g. which IPs produce the 5xx errors
+    parser.add_argument('--group-by', type=str, metavar='FIELDS',
+                        help="Comma-separated fields, e.g. 'ip,status'. Writes one row per combination of their "
+                             "values with the number of entries, the sum of --sum-field and the first and last "
+                             "timestamp, in the --output format (default: ndjson).")
+    parser.add_argument('--sum-field', type=str, default='size', metavar='FIELD',
+                        help="Numeric field summed per group with --group-by (default: size).")
+    parser.add_argument('--top', type=positive_int, metavar='N',
+                        help='Only write the N groups with the most entries with --group-by.')
+    parser.add_argument('--group-memory', type=positive_float, default=DEFAULT_MEMORY_MB, metavar='MB',
+                        help='Memory budget of the --group-by table in megabytes; larger tables are spilled '
+                             f'to temporary files (default: {DEFAULT_MEMORY_MB}).')
+
+    # Write the parsed entries for downstream analytics instead of analyzing them
+    parser.add_argument('--export', type=str, metavar='PATH',
+                        help='Write the parsed entries (or the --select fields) to PATH in batches: a Parquet or '
+                             'Arrow dataset directory, a CSV file or a SQLite database.')
+    parser.add_argument('--export-format', type=str, choices=EXPORT_FORMATS,
+                        help='Format of --export (default: from the extension of PATH, .csv, .db/.sqlite, '
+                             '.arrow or parquet). Parquet and Arrow need pyarrow and fall back to CSV without it.')
+    parser.add_argument('--append', action='store_true',
+                        help='Add to an existing --export and only export lines appended since the last export.')
+    parser.add_argument('--export-table', type=str, default=DEFAULT_TABLE, metavar='NAME',
+                        help=f'Table of a SQLite --export (default: {DEFAULT_TABLE}).')
+
+    # Interleave the entries of several files (e.g. one per host) by time
+    parser.add_argument('-m', '--merge', action='store_true',
+                        help='Merge the entries of several files into one time-ordered view, for the key viewer '
+                             'and --select output. Each entry gets a "source" field with its file.')
+
+    add_instrumentation_arguments(parser)
+
+    # Time range; uncompressed files are entered by binary search instead of parsing them completely
+    parser.add_argument('--since', type=str,
+                        help="Only analyze entries at or after this time, e.g. '2023-10-10 14:00'.")
+    parser.add_argument('--until', type=str,
+                        help="Only analyze entries up to this time (inclusive), e.g. '2023-10-10 14:15'.")
+
+    args = parser.parse_args(argv)
     return args
 
 
-def print_log_lines(file_path):
+def parse_serve_arguments(argv=None):
+    """
+    Capture the arguments of 'logloom serve'.
+
+    Args:
+        argv (list or None): The arguments after 'serve'.
+
+    Returns:
+        args: A Namespace object containing the provided arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="logloom serve",
+        description="Parse log files once, keep them in memory and answer analysis, select, filter "
+                    "and group-by requests over a local HTTP JSON API.")
+    add_input_arguments(parser)
+    add_filter_arguments(parser)
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST,
+                        help=f'Address to listen on (default: {DEFAULT_HOST}).')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Port to listen on (default: {DEFAULT_PORT}).')
+    parser.add_argument('--interval', type=positive_float, default=1.0,
+                        help='Seconds between two checks for lines appended to the log files.')
+    parser.add_argument('--group-memory', type=positive_float, default=DEFAULT_MEMORY_MB, metavar='MB',
+                        help=f'Memory budget of a group-by request in megabytes (default: {DEFAULT_MEMORY_MB}).')
+    add_instrumentation_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def build_line_filter(args):
+    """
+    Create the pre-filter from the command-line arguments.
+
+    Args:
+        args (Namespace): Command-line arguments.
+
+    Returns:
+        LineFilter or None: The filter, or None if no filter options were given.
+    """
+    if not args.grep and not args.status and not args.query:
+        return None
+    return LineFilter(args.grep, args.status, args.query)
+
+
+def parse_field_list(value, option='--select'):
+    """
+    Split a comma-separated list of field names.
+
+    Args:
+        value (str or None): The raw value, e.g. of --select.
+        option (str): The option the value belongs to, for the error message.
+
+    Returns:
+        list or None: The field names, or None if no value was given.
+
+    Raises:
+        ValueError: If the list contains no field name.
+    """
+    if value is None:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    if not fields:
+        raise ValueError(f"{option} needs at least one field name.")
+    return fields
+
+
+def build_time_range(args):
+    """
+    Create the time range from the command-line arguments.
+
+    A date without a time means the start of that day for --since and its end for --until.
+
+    Args:
+        args (Namespace): Command-line arguments.
+
+    Returns:
+        TimeRange or None: The range, or None if neither --since nor --until was given.
+
+    Raises:
+        ValueError: If a bound is not a date or --since is after --until.
     """
-    Print each line of the log file.
+    if not args.since and not args.until:
+        return None
+    since = parse_time_bound(args.since) if args.since else None
+    until = parse_time_bound(args.until, end_of_day=True) if args.until else None
+    if since and until and since > until:
+        raise ValueError(f"--since ({since}) is after --until ({until}).")
+    return TimeRange(since, until)
+
+
+def print_log_lines(file_paths):
+    """
+    Print each line of the log files.
 
     Args:
-        file_path (str): Path to the log file to be printed.
+        file_paths (list): Paths of the log files to be printed.
     """
-    for line in read_log_file(file_path):
-        print(line, end="")  # Prevents double line breaks
+    for file_path in file_paths:
+        for line in read_log_file(file_path):
+            print(line, end="")  # Prevents double line breaks
 
 
 def display_available_keys(keys):
@@ -55,37 +303,17 @@ def display_available_keys(keys):
 
 def print_selected_data(parsed_data, selected_keys, max_width=50):
     """
-    Print the values of the selected keys from the parsed data with adjusted width.
+    Show the values of the selected keys from the parsed data, one page at a time.
+
+    Only the visible rows are formatted, and the column widths come from a sample of
+    the data and the visible page instead of a pass over all entries.
 
     Args:
-        parsed_data (list): List of dictionaries containing the parsed log entries.
+        parsed_data (RecordStore): The parsed log entries.
         selected_keys (list): List of selected keys to print.
         max_width (int): Maximum width for any column.
     """
-
-    # Step 1: Determine the maximum width for each key
-    key_widths = {}
-    for key in selected_keys:
-        # Getting the max length of the values associated with a key
-        max_length = max(len(str(entry.get(key, ''))) for entry in parsed_data)
-        # Include the key's own length in the consideration
-        max_length = max(max_length, len(key))
-        # Limiting the width to the max_width parameter
-        key_widths[key] = min(max_length, max_width)
-
-    # Print a separator
-    print('-' * (sum(key_widths.values()) + len(selected_keys) * 5 - 3))
-    # Print the headers (keys) first
-    header_values = [key.ljust(key_widths[key]) for key in selected_keys]
-    print("  |  ".join(header_values))
-    # Print a separator
-    print('-' * (sum(key_widths.values()) + len(selected_keys) * 5 - 3))
-
-    # Step 2: Print the data using the determined widths
-    for entry in parsed_data:
-        formatted_values = [str(entry.get(key, '')).ljust(key_widths[key])
-                            for key in selected_keys]
-        print("  |  ".join(formatted_values))
+    TablePager(parsed_data, selected_keys, max_width).run()
 
 
 def get_user_input(prompt, valid_choices=None, validation_func=None):
@@ -168,19 +396,85 @@ def get_user_choice(keys):
         return selected_keys
 
 
+def filter_data(query_engine):
+    """
+    Ask for a query and return the entries that match it.
+
+    Args:
+        query_engine (QueryEngine): Engine over all parsed entries.
+
+    Returns:
+        RecordStore or None: The matching entries, or None to remove the filter.
+    """
+    prompt = ('\nFilter entries, e.g. status>=500 AND ip=10.0.0.0/8 AND request~"/api/" '
+              "(empty to show all entries): ")
+    while True:
+        # Not lowercased like the menu choices: values are case-sensitive
+        query = input(prompt).strip()
+        if not query:
+            print("Showing all entries.")
+            return None
+        try:
+            with current_stats().timer("query"):
+                filtered_data = query_engine.select(query)
+        except ValueError as e:
+            print(e)
+            continue
+        if not filtered_data:
+            print("No entries match this filter.")
+            continue
+        print(f"{len(filtered_data):,} of {len(query_engine.store):,} entries match. "
+              "(A)nalyze, (S)elect and (G)roup now use these entries.")
+        return filtered_data
+
+
+def group_data(parsed_data, args):
+    """
+    Ask for fields and show the number of entries, the sum of --sum-field and the
+    first and last timestamp per combination of their values, most frequent first.
+
+    Args:
+        parsed_data (RecordStore): The parsed log entries, possibly filtered.
+        args (Namespace): Command-line arguments.
+    """
+    keys = parsed_data.keys()
+    display_available_keys(keys)
+    prompt = "\nGroup by which keys? Enter their numbers separated by commas (e.g., '1,3') or 'q' to return: "
+    choice = get_user_input(prompt, validation_func=lambda x: validate_choice_for_keys(x, keys))
+    if choice in ('q', '0'):
+        return
+
+    fields = [keys[int(ch) - 1] for ch in choice.split(",") if ch.strip().isdigit()]
+    aggregator = GroupByAggregator(fields, args.sum_field, int(args.group_memory * 2 ** 20))
+    try:
+        with current_stats().timer("analysis"):
+            aggregator.update_batch(parsed_data.rows(['timestamp', *fields, args.sum_field]))
+            groups = RecordStore.from_records(aggregator.results())
+    finally:
+        aggregator.close()
+    print(f"{len(groups):,} groups in {len(parsed_data):,} entries.")
+    TablePager(groups, aggregator.columns()).run()
+
+
 def user_interaction(parsed_data, args, parser_instance):
     """
     Interact with the user: display available keys, get user's choice, and display selected data.
 
     Args:
-        parsed_data (list): Parsed log data.
+        parsed_data (RecordStore): Parsed log data.
         args (Namespace): Command-line arguments.
         parser_instance (BaseParser): The parser used to process the log file.
     """
     display_welcome_message()
 
-    valid_choices = ['a', 's', 'q', 'w']
-    prompt = "Would you like LogLoom to (A)nalyze the log, (S)elect keys to view or display the (W)elcome Message? Enter 'a', 's' or 'w'. Or enter 'q' to quit: "
+    # Queries always run against all entries, so the indexes are built once
+    query_engine = QueryEngine(parsed_data)
+    all_data = parsed_data
+    # Repeated analyses of the same entries are answered from memory
+    insights_cache = InsightsCache()
+
+    valid_choices = ['a', 's', 'f', 'g', 'q', 'w']
+    prompt = "Would you like LogLoom to (A)nalyze the log, (S)elect keys to view, (F)ilter the entries, (G)roup them by keys or display the (W)elcome Message? Enter 'a', 's', 'f', 'g' or 'w'. Or enter 'q' to quit: "
 
     while True:
         action = get_user_input(prompt, valid_choices)
@@ -196,10 +490,13 @@ def user_interaction(parsed_data, args, parser_instance):
                 print("\nAnalysis is not supported for this log format.")
                 continue
 
-            insights = analyze_log_data(parsed_data, config)
-            lines_in_file = count_lines_in_file(args.file_path)
+            stats = current_stats()
+            with stats.timer("analysis"):
+                insights = insights_cache.insights(parsed_data, config)
+            lines_in_file = parsed_data.lines_read
             lines_in_parsed_data = count_lines_in_list(parsed_data)
-            display_insights(insights, lines_in_file, lines_in_parsed_data)
+            with stats.timer("output"):
+                display_insights(insights, lines_in_file, lines_in_parsed_data)
 
         elif action == 's':
             # Check if parsed_data is not empty before accessing its elements
@@ -207,7 +504,7 @@ def user_interaction(parsed_data, args, parser_instance):
                 print("No data available to display.")
                 continue
             
-            keys = list(parsed_data[0].keys())
+            keys = parsed_data.keys()
             while True:
                 display_available_keys(keys)
                 selected_keys = get_user_choice(keys)
@@ -219,5 +516,12 @@ def user_interaction(parsed_data, args, parser_instance):
                     continue
                 print_selected_data(parsed_data, selected_keys)
                 
+        elif action == 'f':
+            filtered_data = filter_data(query_engine)
+            parsed_data = all_data if filtered_data is None else filtered_data
+
+        elif action == 'g':
+            group_data(parsed_data, args)
+
         elif action == 'w':
             display_welcome_message()
\ No newline at end of file
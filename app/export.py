@@ -0,0 +1,496 @@
+import csv
+import os
+import sqlite3
+import sys
+import time
+from itertools import islice
+from analysis import CountingIterator
+from output_batch import to_json
+from parse_cache import (complete_lines_end, file_fingerprint, fingerprint_matches, read_sidecar,
+                         write_sidecar)
+from parsers.parsers_util import get_parser_for_format, iter_parsed_records, timestamp_warning_for
+from readers import detect_compression, read_raw_lines, read_raw_range
+from record_store import TimestampColumn
+from stats import current_stats
+
+# pyarrow is optional: Parquet and Arrow IPC exports fall back to CSV without it
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = ("parquet", "arrow", "csv", "sqlite")
+
+# Formats written as a dataset directory with one part file per export run
+DATASET_FORMATS = ("parquet", "arrow")
+
+# Export format of a path by its extension; other paths are Parquet datasets
+FORMAT_EXTENSIONS = {
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".csv": "csv",
+    ".db": "sqlite",
+    ".sqlite": "sqlite",
+    ".sqlite3": "sqlite",
+}
+
+# Number of entries written at once: a row group of Parquet, a record batch of
+# Arrow or one executemany of SQLite
+EXPORT_BATCH_SIZE = 65536
+
+# Fields a SQLite export gets an index on, if the entries have them
+INDEXED_FIELDS = ("timestamp", "status")
+
+DEFAULT_TABLE = "logs"
+
+# Increase whenever the layout of the export state changes
+EXPORT_STATE_VERSION = 1
+
+
+def export_format_for(path):
+    """Return the export format implied by the extension of a path (Parquet by default)."""
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "parquet")
+
+
+# Types of the values that are written as they are; others are written as JSON text
+SCALAR_TYPES = frozenset((type(None), str, int, float, bool))
+
+
+def export_value(value):
+    """Return a value as it is written: scalars as they are, nested values as JSON text."""
+    if type(value) in SCALAR_TYPES:
+        return value
+    return to_json(value)
+
+
+def column_values(records, columns):
+    """
+    Return the values of a batch of records as one list per column. Only the
+    columns with nested values are converted value by value.
+    """
+    values = []
+    for column in columns:
+        column_values = [record.get(column) for record in records]
+        if not SCALAR_TYPES.issuperset(map(type, column_values)):
+            column_values = [export_value(value) for value in column_values]
+        values.append(column_values)
+    return values
+
+
+def batch_columns(records):
+    """Return the fields of a batch of records in order of first appearance."""
+    return list(dict.fromkeys(key for record in records for key in record))
+
+
+def quote_identifier(name):
+    """Quote a table or column name for SQLite."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class Exporter:
+    """
+    Base of the export writers. Entries arrive in batches; the columns are the
+    selected fields or, without a selection, the fields of the first batch.
+    """
+
+    def __init__(self, fields=None):
+        """
+        Args:
+            fields (list or None): Fields to export, or None for those of the first batch.
+        """
+        self.fields = fields
+        self.columns = None
+        self.dropped = set()
+
+    def write_batch(self, records):
+        """
+        Write a batch of parsed records.
+
+        Args:
+            records (list): Parsed log entries.
+        """
+        if not records:
+            return
+        if self.columns is None:
+            self.columns = list(self.fields) if self.fields else batch_columns(records)
+            self.begin()
+        elif not self.fields and not set(self.columns).issuperset(set().union(*records)):
+            known = set(self.columns)
+            self.add_columns([key for key in batch_columns(records) if key not in known])
+        self.write_columns(column_values(records, self.columns))
+
+    def add_columns(self, new_columns):
+        """Handle fields that appear after the columns were fixed; by default they are left out."""
+        reported = [column for column in new_columns if column not in self.dropped]
+        if reported:
+            self.dropped.update(reported)
+            print(f"Note: The fields {', '.join(reported)} first appear after the columns of the export "
+                  "were fixed and are left out. Use --select to choose the fields.", file=sys.stderr)
+
+    def begin(self):
+        """Start writing once the columns are known."""
+
+    def write_columns(self, values):
+        """Write a batch given as one list of values per column."""
+        raise NotImplementedError
+
+    def close(self):
+        """Finish the export."""
+
+    def abort(self):
+        """Undo what can be undone after a failed export."""
+        self.close()
+
+
+class CSVExporter(Exporter):
+    """Writes the entries as CSV. Appending continues an existing file with its own header."""
+
+    def __init__(self, path, fields=None, append=False):
+        """
+        Raises:
+            ValueError: If the file exists and append is False, or its header does
+                not match the selected fields.
+        """
+        super().__init__(fields)
+        self.path = path
+        self.file = None
+        self.header = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            if not append:
+                raise ValueError(f"'{path}' already exists. Use --append to add the new entries to it.")
+            with open(path, newline='', encoding='utf-8') as file:
+                self.header = next(csv.reader(file), [])
+            if fields and list(fields) != self.header:
+                raise ValueError(f"The selected fields do not match the columns of '{path}': "
+                                 f"{', '.join(self.header)}.")
+            # An existing file keeps its columns
+            self.fields = self.header
+
+    def begin(self):
+        self.file = open(self.path, 'a' if self.header else 'w', newline='', encoding='utf-8')
+        # Size of the file before this export, restored by abort()
+        self.start_size = os.path.getsize(self.path)
+        self.writer = csv.writer(self.file, lineterminator="\n")
+        if not self.header:
+            self.writer.writerow(self.columns)
+
+    def write_columns(self, values):
+        self.writer.writerows(zip(*values))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def abort(self):
+        """Remove the rows written by this export, or the file if it created it."""
+        started = self.file is not None
+        self.close()
+        if not started:
+            return
+        if self.header:
+            os.truncate(self.path, self.start_size)
+        else:
+            os.remove(self.path)
+
+
+class SQLiteExporter(Exporter):
+    """
+    Writes the entries into a SQLite table with indexes on timestamp and status.
+
+    The whole export is one transaction, so a failed run leaves the table as it
+    was. Fields that appear in later batches are added as columns.
+    """
+
+    def __init__(self, path, fields=None, append=False, table=DEFAULT_TABLE):
+        """
+        Raises:
+            ValueError: If the table exists and append is False.
+        """
+        super().__init__(fields)
+        self.path = path
+        self.table = table
+        # Transactions are managed explicitly, so the table changes are part of them
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.table_columns = [row[1] for row in self.connection.execute(
+            f"PRAGMA table_info({quote_identifier(table)})")]
+        if self.table_columns and not append:
+            self.connection.close()
+            raise ValueError(f"The table '{table}' already exists in '{path}'. "
+                             "Use --append to add the new entries to it.")
+        self.connection.execute("BEGIN")
+
+    def begin(self):
+        table = quote_identifier(self.table)
+        if not self.table_columns:
+            self.connection.execute(
+                f"CREATE TABLE {table} ({', '.join(quote_identifier(column) for column in self.columns)})")
+            self.table_columns = list(self.columns)
+        self.add_table_columns(self.columns)
+
+    def add_table_columns(self, columns):
+        table = quote_identifier(self.table)
+        for column in columns:
+            if column not in self.table_columns:
+                self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {quote_identifier(column)}")
+                self.table_columns.append(column)
+        self.insert = (f"INSERT INTO {table} ({', '.join(quote_identifier(column) for column in self.columns)}) "
+                       f"VALUES ({', '.join('?' * len(self.columns))})")
+
+    def add_columns(self, new_columns):
+        self.columns.extend(new_columns)
+        self.add_table_columns(new_columns)
+
+    def write_columns(self, values):
+        self.connection.executemany(self.insert, zip(*values))
+
+    def close(self):
+        if self.connection is None:
+            return
+        # Created after the rows are inserted, which is faster than updating them per row
+        table = quote_identifier(self.table)
+        for field in INDEXED_FIELDS:
+            if field in self.table_columns:
+                index = quote_identifier(f"{self.table}_{field}")
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({quote_identifier(field)})")
+        self.connection.execute("COMMIT")
+        self.connection.close()
+        self.connection = None
+
+    def abort(self):
+        if self.connection is not None:
+            self.connection.execute("ROLLBACK")
+            self.connection.close()
+            self.connection = None
+
+
+class ArrowExporter(Exporter):
+    """
+    Writes the entries into a Parquet or Arrow IPC file, one row group or record
+    batch per batch of entries. Timestamps become timestamp columns, all other
+    fields strings.
+    """
+
+    def __init__(self, path, export_format, fields=None):
+        super().__init__(fields)
+        self.path = path
+        self.export_format = export_format
+        self.writer = None
+        self.invalid_timestamps = False
+
+    def begin(self):
+        self.schema = pyarrow.schema([
+            (column, pyarrow.timestamp('s') if column == 'timestamp' else pyarrow.string())
+            for column in self.columns])
+        if self.export_format == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_file(self.path, self.schema)
+
+    def write_columns(self, values):
+        arrays = []
+        for field, column in zip(self.schema, values):
+            if field.name == 'timestamp':
+                column = self.timestamp_epochs(column)
+            else:
+                column = [value if value is None or type(value) is str else str(value) for value in column]
+            arrays.append(pyarrow.array(column, type=field.type))
+        batch = pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema)
+        if self.export_format == "parquet":
+            self.writer.write_table(pyarrow.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+
+    def timestamp_epochs(self, column):
+        """
+        Convert normalized timestamps to epoch seconds. Other values (e.g. JSON
+        timestamps without timestamp_formats) are left empty with a note.
+        """
+        epochs = [TimestampColumn.to_epoch(value) for value in column]
+        if not self.invalid_timestamps and epochs.count(None) > column.count(None):
+            self.invalid_timestamps = True
+            print("Note: Some timestamps are not normalized (YYYY-MM-DD HH:MM:SS) and are left empty "
+                  "in the timestamp column. Add timestamp_formats to the format to convert them.",
+                  file=sys.stderr)
+        return epochs
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def abort(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def create_exporter(path, export_format, fields=None, append=False, table=DEFAULT_TABLE):
+    """
+    Create the writer of an export.
+
+    Parquet and Arrow exports are dataset directories: every run adds a part file,
+    which is how a columnar dataset grows. Without pyarrow, the part file is
+    written as CSV instead.
+
+    Args:
+        path (str): The CSV file, SQLite database or dataset directory.
+        export_format (str): One of EXPORT_FORMATS.
+        fields (list or None): Fields to export, or None for all fields.
+        append (bool): Whether to add to an existing export.
+        table (str): Table of a SQLite export.
+
+    Returns:
+        Exporter: The writer.
+
+    Raises:
+        ValueError: If the export exists and append is False.
+    """
+    if export_format == "sqlite":
+        return SQLiteExporter(path, fields, append, table)
+    if export_format == "csv":
+        return CSVExporter(path, fields, append)
+
+    if os.path.exists(path) and not os.path.isdir(path):
+        raise ValueError(f"'{path}' is not a directory. {export_format} exports are written "
+                         "as a dataset directory with one part file per run.")
+    os.makedirs(path, exist_ok=True)
+    if not append and any(name.startswith('part-') for name in os.listdir(path)):
+        raise ValueError(f"The dataset '{path}' already has part files. Use --append to add the new entries to it.")
+    part_path = os.path.join(path, f"part-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}")
+    if pyarrow is None:
+        print(f"Note: {export_format} exports need the 'pyarrow' package; writing CSV instead.", file=sys.stderr)
+        return CSVExporter(part_path + ".csv", fields)
+    return ArrowExporter(part_path + (".parquet" if export_format == "parquet" else ".arrow"), export_format, fields)
+
+
+def export_state_path(path, export_format, table=DEFAULT_TABLE):
+    """Return the path of the file that records how far each log file was exported."""
+    if export_format in DATASET_FORMATS:
+        # Files starting with '_' are ignored by readers of the dataset
+        return os.path.join(path, "_logloom-export")
+    if export_format == "sqlite":
+        return f"{path}.{table}.logloom-export"
+    return f"{path}.logloom-export"
+
+
+def resume_position(file_path, state):
+    """
+    Return where the export of a log file continues.
+
+    The file is looked up by device and inode, so a log that was rotated by renaming
+    it (access.log -> access.log.1) continues where its export stopped under the old name.
+    The modification time is not compared: re-exporting a log that was only touched
+    would duplicate all of its entries, so the hashed head and tail decide.
+
+    Returns:
+        tuple: (byte offset, number of lines before it), (0, 0) for a new or rewritten file.
+    """
+    stat = os.stat(file_path)
+    for entry in state:
+        if (entry["device"], entry["inode"]) == (stat.st_dev, stat.st_ino):
+            if fingerprint_matches(file_path, entry, check_mtime=False):
+                return entry["offset"], entry["lines"]
+            break
+    return 0, 0
+
+
+def iter_new_records(file_paths, parser, state, positions, line_filter=None, time_range=None):
+    """
+    Parse the lines of the log files that were not exported yet and yield their records.
+
+    Uncompressed files are read from their resume position up to their last complete
+    line. Compressed files cannot be entered in the middle: they are exported whole
+    once and skipped while they are unchanged.
+
+    Args:
+        file_paths (list): Paths of the log files, oldest first.
+        parser (BaseParser): The parser used for the files.
+        state (list): Fingerprints of earlier exports, see resume_position.
+        positions (list): Receives the fingerprint of each file once it is read.
+        line_filter (LineFilter or None): Only yield lines that match this filter.
+        time_range (TimeRange or None): Only yield entries within this time range.
+
+    Yields:
+        dict: A parsed log entry.
+    """
+    for file_path in file_paths:
+        start, lines_before = resume_position(file_path, state)
+        size = os.path.getsize(file_path)
+        if detect_compression(file_path):
+            end = size
+            if start:
+                positions.append({**file_fingerprint(file_path, end), "lines": lines_before})
+                continue
+            lines = CountingIterator(read_raw_lines(file_path))
+        else:
+            end = complete_lines_end(file_path, size)
+            lines = CountingIterator(read_raw_range(file_path, start, end))
+        records = iter_parsed_records(lines, parser, lines_before + 1,
+                                      timestamp_warning_for(file_path, len(file_paths)), line_filter=line_filter)
+        yield from time_range.filter(records) if time_range else records
+        positions.append({**file_fingerprint(file_path, end), "lines": lines_before + lines.count})
+
+
+def export_log_files(file_paths, format_type, path, export_format=None, fields=None, line_filter=None,
+                     time_range=None, append=False, table=DEFAULT_TABLE):
+    """
+    Parse log files and write their entries to an export in batches, without
+    keeping them in memory.
+
+    Every export records how far each log file was read. With append, only the
+    lines added since the previous export are parsed, so e.g. a nightly run adds
+    just the new entries.
+
+    Args:
+        file_paths (list): Paths of the log files, oldest first.
+        format_type (str): Log file format.
+        path (str): The CSV file, SQLite database or dataset directory.
+        export_format (str or None): One of EXPORT_FORMATS, by default from the path's extension.
+        fields (list or None): Fields to export, or None for all fields.
+        line_filter (LineFilter or None): Only export lines that match this filter.
+        time_range (TimeRange or None): Only export entries within this time range.
+        append (bool): Whether to add to an existing export.
+        table (str): Table of a SQLite export.
+
+    Returns:
+        int: Number of exported entries.
+
+    Raises:
+        ValueError: If the export exists and append is False.
+    """
+    export_format = export_format or export_format_for(path)
+    state_path = export_state_path(path, export_format, table)
+    state = []
+    if append:
+        saved = read_sidecar(state_path, EXPORT_STATE_VERSION)
+        state = saved["files"] if saved else []
+
+    exporter = create_exporter(path, export_format, fields, append, table)
+    parser = get_parser_for_format(format_type)
+    if fields:
+        parser.select_fields(['timestamp', *fields, *(line_filter.fields if line_filter else ())])
+    positions = []
+    records = iter_new_records(file_paths, parser, state, positions, line_filter, time_range)
+    stats = current_stats()
+    count = 0
+    try:
+        while batch := list(islice(records, EXPORT_BATCH_SIZE)):
+            # Parsing the batch is timed by its own stages
+            with stats.timer("output"):
+                exporter.write_batch(batch)
+            count += len(batch)
+        with stats.timer("output"):
+            exporter.close()
+    except BaseException:
+        exporter.abort()
+        raise
+
+    # Files of earlier exports that were not read this time keep their position
+    read = {(entry["device"], entry["inode"]) for entry in positions}
+    positions.extend(entry for entry in state if (entry["device"], entry["inode"]) not in read)
+    write_sidecar(state_path, {"version": EXPORT_STATE_VERSION, "files": positions})
+    return count
@@ -0,0 +1,137 @@
+import os
+import time
+
+
+class LogFollower:
+    """
+    Reads lines appended to a growing log file, similar to 'tail -F'.
+
+    The file is polled without re-scanning it: each call only reads the bytes written
+    since the previous call. When the path is rotated (a new file with a different
+    inode appears), the rest of the old file is read before switching to the new one.
+    When the file is truncated in place, reading restarts at its beginning.
+
+    After each read_lines call, the reopened attribute tells whether reading started
+    over at the beginning of a new or truncated file, so that line numbers restart.
+    """
+
+    def __init__(self, file_path, from_start=False, read_size=1024 * 1024, offset=None):
+        """
+        Args:
+            file_path (str): Path to the log file to be followed.
+            from_start (bool): Read the existing content first instead of starting at the end.
+            read_size (int): Maximum number of bytes read per block.
+            offset (int or None): Byte offset of a line start to continue from, e.g.
+                where an earlier parse of the file ended. Overrides from_start.
+        """
+        self.file_path = file_path
+        self.read_size = read_size
+        self.file = None
+        self.identity = None
+        self.buffer = b''
+        self.reopened = False
+        if not self._open(from_start or offset is not None):
+            raise FileNotFoundError(file_path)
+        if offset is not None:
+            self.file.seek(offset)
+
+    def _open(self, from_start):
+        try:
+            file = open(self.file_path, 'rb')
+        except FileNotFoundError:
+            return False
+        stat = os.fstat(file.fileno())
+        if not from_start:
+            file.seek(0, os.SEEK_END)
+        self.file = file
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.buffer = b''
+        return True
+
+    def _read_available(self):
+        """Read the next block and return its complete raw lines. Partial lines stay buffered."""
+        data = self.file.read(self.read_size)
+        if not data:
+            return []
+        data = self.buffer + data
+        end = data.rfind(b'\n') + 1
+        self.buffer = data[end:]
+        return data[:end].split(b'\n')[:-1]
+
+    def read_lines(self):
+        """
+        Return the complete lines appended since the last call.
+
+        Returns:
+            list: Raw lines (bytes without '\\n'), empty if nothing new was written.
+            The lines of a rotated file and of its successor are never returned
+            by the same call.
+        """
+        self.reopened = False
+        if self.file is None:
+            if not self._open(from_start=True):
+                return []  # The file was rotated away and has not been recreated yet
+            self.reopened = True
+
+        lines = self._read_available()
+        if lines:
+            return lines
+
+        # Nothing new: check for rotation or truncation
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return []
+        if (stat.st_dev, stat.st_ino) != self.identity:
+            # The new file is opened by the next call
+            return self._drain_old_file()
+        if stat.st_size < self.file.tell():
+            self.file.seek(0)
+            self.buffer = b''
+            self.reopened = True
+        return []
+
+    def _drain_old_file(self):
+        lines = []
+        while True:
+            block = self._read_available()
+            if not block:
+                break
+            lines.extend(block)
+        if self.buffer:
+            lines.append(self.buffer)
+        self.file.close()
+        self.file = None
+        return lines
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def follow_log_lines(file_path, poll_interval=0.1, from_start=False):
+    """
+    Follow a log file and yield the lines appended to it in batches.
+
+    An empty batch is yielded whenever there is nothing new, so callers can do
+    periodic work (e.g. redraw a summary) while the log is idle. The generator only
+    sleeps after an empty batch, so bursts of lines are read without delay.
+
+    Args:
+        file_path (str): Path to the log file to be followed.
+        poll_interval (float): Seconds to wait after an empty batch.
+        from_start (bool): Read the existing content first instead of starting at the end.
+
+    Yields:
+        list: The lines read in one polling step.
+    """
+    follower = LogFollower(file_path, from_start)
+    try:
+        while True:
+            lines = follower.read_lines()
+            yield lines
+            if not lines:
+                time.sleep(poll_interval)
+    finally:
+        follower.close()
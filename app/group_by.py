@@ -0,0 +1,206 @@
+import heapq
+import pickle
+import sys
+import tempfile
+from utils import to_number
+
+# Default memory budget of the group table in megabytes (--group-memory)
+DEFAULT_MEMORY_MB = 256
+
+# Number of files the groups are spread over when the table is spilled to disk
+SPILL_PARTITIONS = 16
+
+# Estimated bytes per group besides its key values: the dictionary slot, the key
+# tuple and the list with the aggregates
+GROUP_OVERHEAD = 240
+
+
+def group_size(key):
+    """Estimate the memory a group with this key takes in the table."""
+    return GROUP_OVERHEAD + sum(sys.getsizeof(value) for value in key)
+
+
+def merge_aggregates(target, other):
+    """Fold the [count, sum, first, last] aggregates of other into target."""
+    target[0] += other[0]
+    target[1] += other[1]
+    if other[2] is not None and (target[2] is None or other[2] < target[2]):
+        target[2] = other[2]
+    if other[3] is not None and (target[3] is None or other[3] > target[3]):
+        target[3] = other[3]
+
+
+class GroupByAggregator:
+    """
+    Hash aggregation of log entries by a combination of fields, e.g. status by ip.
+
+    Every group keeps its number of entries, the sum of a numeric field (the size
+    of a CLF response by default) and its first and last timestamp. Entries are
+    added one batch at a time, so the entries themselves are never kept.
+
+    The group table is limited to a memory budget. When it grows beyond it, the
+    groups are written to temporary files, partitioned by the hash of their key,
+    and the table starts over. Once all entries are added, the partitions are read
+    back one at a time and their partial groups merged, so only about one partition
+    of the groups is in memory at once.
+    """
+
+    def __init__(self, fields, sum_field='size', memory_budget=DEFAULT_MEMORY_MB * 2 ** 20, spill_dir=None):
+        """
+        Args:
+            fields (iterable): Fields whose combination of values forms a group.
+            sum_field (str or None): Numeric field summed per group, None for no sum.
+            memory_budget (int): Bytes the group table may use before it is spilled.
+            spill_dir (str or None): Directory of the spill files, the system's
+                temporary directory by default.
+        """
+        self.fields = tuple(fields)
+        if not self.fields:
+            raise ValueError("Grouping needs at least one field.")
+        self.sum_field = sum_field
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.groups = {}
+        self.memory = 0
+        # Temporary files of the partitions, created by the first spill
+        self.partitions = None
+        self.spills = 0
+        # Whether any entry had a numeric value in sum_field
+        self.summed = False
+        self.records = 0
+        self.lines_read = 0
+
+    def update(self, record):
+        """Add a single parsed record."""
+        self.update_batch([record])
+
+    def update_batch(self, records):
+        """
+        Add a batch of parsed records. Entries without one of the fields form
+        groups with an empty value for it. The table is spilled as soon as it
+        outgrows the memory budget, so a batch may be of any size.
+
+        Args:
+            records (iterable): Parsed log entries.
+        """
+        groups = self.groups
+        fields = self.fields
+        sum_field = self.sum_field
+        memory = self.memory
+        count = 0
+        for record in records:
+            count += 1
+            key = tuple([record.get(field) for field in fields])
+            amount = to_number(record.get(sum_field)) if sum_field else None
+            timestamp = record.get('timestamp')
+            entry = groups.get(key)
+            if entry is None:
+                groups[key] = [1, amount or 0, timestamp, timestamp]
+                memory += group_size(key)
+                if memory > self.memory_budget:
+                    self.spill()
+                    groups, memory = self.groups, 0
+            else:
+                entry[0] += 1
+                if amount is not None:
+                    entry[1] += amount
+                if timestamp is not None:
+                    if entry[2] is None or timestamp < entry[2]:
+                        entry[2] = timestamp
+                    if entry[3] is None or timestamp > entry[3]:
+                        entry[3] = timestamp
+            if amount is not None:
+                self.summed = True
+        self.records += count
+        self.memory = memory
+
+    def spill(self):
+        """Write the groups of the table to the partition files and empty the table."""
+        if self.partitions is None:
+            self.partitions = [tempfile.TemporaryFile(dir=self.spill_dir) for _ in range(SPILL_PARTITIONS)]
+        parts = [[] for _ in self.partitions]
+        for key, entry in self.groups.items():
+            # hash() is only used within this process, so its randomization does not matter
+            parts[hash(key) % SPILL_PARTITIONS].append((key, entry))
+        for file, part in zip(self.partitions, parts):
+            if part:
+                pickle.dump(part, file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.groups = {}
+        self.memory = 0
+        self.spills += 1
+
+    def iter_groups(self):
+        """
+        Yield the final groups as (key, [count, sum, first, last]) pairs.
+
+        Without a spill, the groups come from the table. Otherwise the table is
+        spilled as well and the partitions are merged one after the other, so the
+        groups come in partition order.
+        """
+        if self.partitions is None:
+            yield from self.groups.items()
+            return
+        if self.groups:
+            self.spill()
+        for file in self.partitions:
+            file.seek(0)
+            groups = {}
+            while True:
+                try:
+                    part = pickle.load(file)
+                except EOFError:
+                    break
+                for key, entry in part:
+                    if key in groups:
+                        merge_aggregates(groups[key], entry)
+                    else:
+                        groups[key] = entry
+            yield from groups.items()
+
+    def close(self):
+        """Delete the spill files."""
+        for file in self.partitions or ():
+            file.close()
+        self.partitions = None
+
+    def columns(self):
+        """Return the names of the fields of the result rows."""
+        columns = [*self.fields, 'count']
+        if self.summed:
+            columns.append(f'{self.sum_field}_sum')
+        return columns + ['first_seen', 'last_seen']
+
+    def to_row(self, key, entry):
+        """Turn a group into a result row dictionary."""
+        row = dict(zip(self.fields, key))
+        row['count'] = entry[0]
+        if self.summed:
+            row[f'{self.sum_field}_sum'] = entry[1]
+        row['first_seen'] = entry[2]
+        row['last_seen'] = entry[3]
+        return row
+
+    def results(self, limit=None):
+        """
+        Return the groups as result rows, those with the most entries first and
+        groups with the same number of entries ordered by their key.
+
+        Args:
+            limit (int or None): Number of groups to return, None for all. A limit
+                keeps only that many groups in memory while the partitions are merged.
+
+        Returns:
+            list or iterator: Result row dictionaries. All groups of a spilled table
+            are not sorted, but yielded in partition order, so that they never have
+            to be in memory at the same time.
+        """
+        # Ties are ordered by key, so spilled and in-memory tables give the same rows.
+        # Key values may be None or of mixed types, hence the comparison as text.
+        by_count = lambda group: (-group[1][0], str(group[0]))
+        if limit is not None:
+            groups = heapq.nsmallest(limit, self.iter_groups(), key=by_count)
+        elif self.partitions is None:
+            groups = sorted(self.groups.items(), key=by_count)
+        else:
+            return (self.to_row(key, entry) for key, entry in self.iter_groups())
+        return [self.to_row(key, entry) for key, entry in groups]
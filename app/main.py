@@ -1,37 +1,308 @@
 # Import necessary functions and modules
+import asyncio
+import os
+import sys
+import time
 from cli import *
 from utils import *
 from parsers import parsers_util
+from parsers.log_format import AUTO_FORMAT
+from parsers.registry import add_formats_file
+from output_cli import display_insights, display_compact_summary, clear_screen
+from analysis import StreamingAnalyzer
+from group_by import GroupByAggregator
+from export import export_log_files
+from follow import follow_log_lines
+from parallel import analyze_log_files_parallel
+from parse_cache import process_log_file_cached
+from readers import expand_log_inputs, detect_compression
+from output_batch import write_records, write_insights
+from server import LogServer, serve
+from stats import current_stats, instrumented
 
 
-def main():
+def run_streaming_analysis(args, file_paths, line_filter, time_range):
     """
-    Main entry point for the log parser.
+    Analyze the log files in a single pass and display the insights.
+
+    Args:
+        args (Namespace): Command-line arguments.
+        file_paths (list): Paths of the log files, oldest first.
+        line_filter (LineFilter or None): Pre-filter for the log lines.
+        time_range (TimeRange or None): Time range of the entries to analyze.
+    """
+    if args.workers > 1:
+        analyzer, parser_instance = analyze_log_files_parallel(
+            file_paths, args.format, args.workers, line_filter, time_range)
+    else:
+        analyzer, parser_instance = parsers_util.analyze_log_files(
+            file_paths, args.format, line_filter, time_range)
+
+    if not getattr(parser_instance, 'analysis_config', {}):
+        print("Analysis is not supported for this log format.")
+    elif analyzer.records:
+        stats = current_stats()
+        with stats.timer("analysis"):
+            insights = analyzer.insights()
+        with stats.timer("output"):
+            display_insights(insights, analyzer.lines_read, analyzer.records)
+    else:
+        print("No data was parsed from the log file. Check the file format and content, or try --format auto.")
+
+
+def run_batch_mode(args, file_paths, line_filter, time_range):
+    """
+    Headless mode: write the insights or the selected fields of every entry to stdout
+    in a machine-readable format. Entries are written while they are parsed, so
+    nothing is kept in memory and no column widths are computed.
+
+    Args:
+        args (Namespace): Command-line arguments.
+        file_paths (list): Paths of the log files, oldest first.
+        line_filter (LineFilter or None): Pre-filter for the log lines.
+        time_range (TimeRange or None): Time range of the entries to write.
+    """
+    fields = parse_field_list(args.select)
+
+    if args.analyze:
+        if not getattr(parsers_util.get_parser_for_format(args.format), 'analysis_config', {}):
+            raise ValueError("Analysis is not supported for this log format.")
+        if args.workers > 1:
+            analyzer, parser_instance = analyze_log_files_parallel(
+                file_paths, args.format, args.workers, line_filter, time_range, fields)
+        else:
+            analyzer, parser_instance = parsers_util.analyze_log_files(
+                file_paths, args.format, line_filter, time_range, fields)
+        stats = current_stats()
+        with stats.timer("analysis"):
+            insights = analyzer.insights()
+        with stats.timer("output"):
+            write_insights(insights, analyzer.lines_read, analyzer.records, args.output or "json")
+        return
+
+    parser_instance = parsers_util.get_parser_for_format(args.format)
+    if fields:
+        parser_instance.select_fields(['timestamp', *fields, *(line_filter.fields if line_filter else ())])
+    records = parsers_util.iter_log_records(file_paths, args.format, parser_instance,
+                                            line_filter, time_range, merge=args.merge)
+    # The output timer is exclusive, so parsing the records is not counted as output
+    with current_stats().timer("output"):
+        write_records(records, fields, args.output or "ndjson")
+
+
+def run_group_by(args, file_paths, line_filter, time_range):
+    """
+    Headless group-by: aggregate the entries by the --group-by fields in one pass and
+    write one row per group to stdout.
+
+    Args:
+        args (Namespace): Command-line arguments.
+        file_paths (list): Paths of the log files, oldest first.
+        line_filter (LineFilter or None): Pre-filter for the log lines.
+        time_range (TimeRange or None): Time range of the entries to group.
+    """
+    aggregator = GroupByAggregator(parse_field_list(args.group_by, '--group-by'), args.sum_field,
+                                   int(args.group_memory * 2 ** 20))
+    try:
+        parsers_util.group_log_files(file_paths, args.format, aggregator, line_filter, time_range)
+        if aggregator.spills and not args.top:
+            print(f"Note: The groups exceeded --group-memory and were spilled to disk {aggregator.spills} "
+                  "times, so they are written unsorted. Use --top N for the largest groups.", file=sys.stderr)
+        stats = current_stats()
+        with stats.timer("analysis"):
+            rows = aggregator.results(args.top)
+        with stats.timer("output"):
+            write_records(rows, aggregator.columns(), args.output or "ndjson")
+    finally:
+        aggregator.close()
+
+
+def run_export(args, file_paths, line_filter, time_range):
+    """
+    Headless export: write the parsed entries to --export in batches.
+
+    Args:
+        args (Namespace): Command-line arguments.
+        file_paths (list): Paths of the log files, oldest first.
+        line_filter (LineFilter or None): Pre-filter for the log lines.
+        time_range (TimeRange or None): Time range of the entries to export.
+    """
+    fields = parse_field_list(args.select) if args.select else None
+    count = export_log_files(file_paths, args.format, args.export, args.export_format, fields, line_filter,
+                             time_range, args.append, args.export_table)
+    print(f"Exported {count} entries to {args.export}.", file=sys.stderr)
+
+
+def run_follow_mode(args, file_path, line_filter):
+    """
+    Follow the log file and redraw a compact summary of the insights at a fixed interval.
+
+    Args:
+        args (Namespace): Command-line arguments.
+        file_path (str): Path to the log file.
+        line_filter (LineFilter or None): Pre-filter for the log lines.
     """
+    parser_instance = parsers_util.get_analysis_parser(
+        args.format, line_filter.fields if line_filter else ())
+    analyzer = StreamingAnalyzer(getattr(parser_instance, 'analysis_config', {}))
+    stats = current_stats()
+    next_redraw = time.monotonic()
+
+    try:
+        for lines in follow_log_lines(file_path):
+            with stats.timer("analysis"):
+                for record in parsers_util.iter_parsed_records(lines, parser_instance, analyzer.lines_read + 1,
+                                                               line_filter=line_filter):
+                    analyzer.update(record)
+            analyzer.lines_read += len(lines)
+
+            if time.monotonic() >= next_redraw:
+                with stats.timer("analysis"):
+                    insights = analyzer.insights()
+                with stats.timer("output"):
+                    clear_screen()
+                    display_compact_summary(insights, analyzer.lines_read, analyzer.records)
+                next_redraw = time.monotonic() + args.interval
+    except KeyboardInterrupt:
+        print("\nStopped following the log file. Goodbye!")
+
+
+def run_server(args):
+    """
+    'logloom serve': parse the log files once and answer HTTP requests on them.
+
+    Args:
+        args (Namespace): Arguments of the serve command.
+    """
+    for formats_file in args.formats_file or ():
+        add_formats_file(formats_file)
+    file_paths = expand_log_inputs(args.file_path)
+    if args.format == AUTO_FORMAT:
+        args.format, match_rate = parsers_util.detect_log_format(file_paths[0])
+        print(f"Note: Detected the {args.format} format ({match_rate:.0%} of the sampled lines match).",
+              file=sys.stderr)
+
+    log_server = LogServer(file_paths, args.format, build_line_filter(args), int(args.group_memory * 2 ** 20))
     try:
-        args = parse_arguments()
+        log_server.load()
+        asyncio.run(serve(log_server, args.host, args.port, args.interval))
+    except KeyboardInterrupt:
+        print("\nServer stopped. Goodbye!", file=sys.stderr)
+    finally:
+        log_server.close()
+
+
+def run(args):
+    """
+    Run LogLoom with the parsed command-line arguments.
+
+    Args:
+        args (Namespace): Command-line arguments.
+    """
+    line_filter = build_line_filter(args)
+    time_range = build_time_range(args)
+    # Glob patterns and directories select several files, each set read oldest first
+    file_paths = expand_log_inputs(args.file_path)
 
-        # Check if the user just wants to print the file or parse it
-        if args.print:
-            print_log_lines(args.file_path)
-            return
+    # Check if the user just wants to print the file or parse it
+    if args.print:
+        print_log_lines(file_paths)
+        return
 
-        parsed_data, parser_instance = parsers_util.process_log_file(
-            args.file_path, args.format)
+    for formats_file in args.formats_file or ():
+        add_formats_file(formats_file)
 
-        # If there's any parsed data, proceed with user interaction
-        if parsed_data:
-            user_interaction(parsed_data, args, parser_instance)
+    if args.format == AUTO_FORMAT:
+        args.format, match_rate = parsers_util.detect_log_format(file_paths[0])
+        print(f"Note: Detected the {args.format} format ({match_rate:.0%} of the sampled lines match).",
+              file=sys.stderr)
+
+    headless = args.analyze or args.select or args.output or args.group_by or args.export
+    if args.follow:
+        if headless:
+            raise ValueError("--analyze, --select, --output, --group-by and --export cannot be used with --follow.")
+        if len(file_paths) > 1 or detect_compression(file_paths[0]):
+            raise ValueError("--follow needs a single uncompressed log file.")
+        if time_range:
+            raise ValueError("--since and --until cannot be used with --follow.")
+        run_follow_mode(args, file_paths[0], line_filter)
+        return
+
+    if args.append and not args.export:
+        raise ValueError("--append needs --export.")
+    if args.export:
+        if args.analyze or args.group_by or args.output or args.merge:
+            raise ValueError("--export cannot be combined with --analyze, --group-by, --output or --merge.")
+        if args.workers > 1:
+            print("Note: --export runs in a single process; --workers is ignored.", file=sys.stderr)
+        run_export(args, file_paths, line_filter, time_range)
+        return
+
+    if args.group_by:
+        if args.analyze or args.select:
+            raise ValueError("--group-by cannot be combined with --analyze or --select.")
+        if args.workers > 1:
+            print("Note: --group-by runs in a single process; --workers is ignored.", file=sys.stderr)
+        run_group_by(args, file_paths, line_filter, time_range)
+        return
+
+    if headless:
+        run_batch_mode(args, file_paths, line_filter, time_range)
+        return
+
+    # Streaming mode: analyze in one pass without building the parsed data list
+    if args.stream or args.workers > 1:
+        run_streaming_analysis(args, file_paths, line_filter, time_range)
+        return
+
+    use_cache = args.cache and not line_filter and not time_range
+    if args.cache and (line_filter or time_range):
+        print("Note: The parse cache is not used together with filters.", file=sys.stderr)
+    elif args.cache and (len(file_paths) > 1 or detect_compression(file_paths[0])):
+        print("Note: The parse cache is only used for a single uncompressed log file.", file=sys.stderr)
+        use_cache = False
+    if use_cache:
+        parsed_data, parser_instance = process_log_file_cached(
+            file_paths[0], args.format)
+    else:
+        parsed_data, parser_instance = parsers_util.process_log_files(
+            file_paths, args.format, line_filter, time_range, args.merge)
+
+    # If there's any parsed data, proceed with user interaction
+    if parsed_data:
+        user_interaction(parsed_data, args, parser_instance)
+    else:
+        print("No data was parsed from the log file. Check the file format and content, or try --format auto.")
+
+
+def main():
+    """
+    Main entry point for the log parser.
+    """
+    try:
+        if sys.argv[1:2] == ['serve']:
+            args, command = parse_serve_arguments(sys.argv[2:]), run_server
         else:
-            print("No data was parsed from the log file. Check the file format and content.")
+            args, command = parse_arguments(), run
+        # --stats and --profile report where the time went, also when the run fails
+        with instrumented(args.stats, args.profile):
+            command(args)
     # Handle possible exceptions
-    except FileNotFoundError:
-        print(f"Error: The file '{args.file_path}' was not found.")
+    except BrokenPipeError:
+        # The reader of a pipe (e.g. head) stopped early; stop writing quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except FileNotFoundError as e:
+        print(f"Error: The file '{e.filename or e}' was not found.", file=sys.stderr)
+        return 1
     except ValueError as e:
-        print(f"Invalid value: {e}")
+        print(f"Invalid value: {e}", file=sys.stderr)
+        return 1
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        print(f"An unexpected error occurred: {e}", file=sys.stderr)
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,129 @@
+import csv
+import json
+import sys
+
+# orjson is used if installed, as it serializes rows several times faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+OUTPUT_FORMATS = ("json", "csv", "ndjson")
+
+
+def to_json(value):
+    """
+    Serialize a value to a single line of JSON. Values without a JSON type
+    (e.g. nested objects of custom types) are written as strings.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
+def write_records(records, fields, output_format, stream=None):
+    """
+    Write parsed records as soon as they are produced, without collecting them first.
+
+    Args:
+        records (iterable): Parsed log entries.
+        fields (list or None): Fields to write, or None to write whole records.
+        output_format (str): "json" (one array), "ndjson" (one object per line) or "csv".
+        stream (file object or None): Destination, standard output by default.
+
+    Returns:
+        int: Number of records written.
+
+    Raises:
+        ValueError: If CSV output is requested without fields.
+    """
+    stream = stream or sys.stdout
+    count = 0
+
+    if output_format == "csv":
+        if not fields:
+            raise ValueError("CSV output needs the fields to write, e.g. --select ip,status.")
+        writer = csv.writer(stream, lineterminator="\n")
+        writer.writerow(fields)
+        for record in records:
+            writer.writerow([record.get(field, '') for field in fields])
+            count += 1
+        return count
+
+    if fields:
+        records = ({field: record.get(field) for field in fields} for record in records)
+    if output_format == "ndjson":
+        for record in records:
+            stream.write(to_json(record) + "\n")
+            count += 1
+    else:
+        # A JSON array, written element by element
+        stream.write("[")
+        for record in records:
+            stream.write(("\n" if count == 0 else ",\n") + to_json(record))
+            count += 1
+        stream.write("\n]\n" if count else "]\n")
+    return count
+
+
+def flatten_insight(data):
+    """
+    Flatten the result of one analysis function into (key, value) pairs.
+
+    Dictionaries contribute one pair per entry, lists of (value, count, ...) tuples
+    one pair per tuple, a range its "from" and "to" and a single number one pair
+    with an empty key. Nested results (e.g. top values per hour) join their keys with a space.
+
+    Args:
+        data: The result of an analysis function, e.g. {"200": 12, "404": 3}.
+
+    Yields:
+        tuple: (key, value) pairs.
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            for sub_key, sub_value in flatten_insight(value):
+                yield (f"{key} {sub_key}" if sub_key != '' else key), sub_value
+    elif isinstance(data, list):
+        for entry in data:
+            yield entry[0], entry[1]
+    elif isinstance(data, tuple):
+        yield "from", data[0]
+        yield "to", data[1]
+    else:
+        yield '', data
+
+
+def write_insights(insights, log_data_length, parsed_data_length, output_format, stream=None):
+    """
+    Write the insights in a machine-readable format.
+
+    JSON writes a single object, NDJSON one object per field and insight, and CSV one
+    row per value with the columns field, insight, key and value.
+
+    Args:
+        insights (dict): Insights keyed by the analyzed field.
+        log_data_length (int): Number of lines read.
+        parsed_data_length (int): Number of parsed entries.
+        output_format (str): "json", "ndjson" or "csv".
+        stream (file object or None): Destination, standard output by default.
+    """
+    stream = stream or sys.stdout
+    totals = {"log_length": log_data_length, "parsed_length": parsed_data_length}
+
+    if output_format == "json":
+        stream.write(to_json({**totals, "insights": insights}) + "\n")
+    elif output_format == "ndjson":
+        stream.write(to_json(totals) + "\n")
+        for field, results in insights.items():
+            for insight, data in results.items():
+                stream.write(to_json({"field": field, "insight": insight, "data": data}) + "\n")
+    else:
+        writer = csv.writer(stream, lineterminator="\n")
+        writer.writerow(["field", "insight", "key", "value"])
+        for name, value in totals.items():
+            writer.writerow(["", name, "", value])
+        for field, results in insights.items():
+            for insight, data in results.items():
+                for key, value in flatten_insight(data):
+                    writer.writerow([field, insight, key, value])
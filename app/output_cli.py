@@ -1,3 +1,14 @@
+import heapq
+import sys
+from datetime import datetime
+
+# Layout of the bucket keys of rate_per_minute and rate_per_hour, and their length in minutes
+BUCKET_UNITS = {
+    "rate_per_minute": ("Minute", "%Y-%m-%d %H:%M", 1),
+    "rate_per_hour": ("Hour", "%Y-%m-%d %H", 60),
+}
+
+
 def display_counts(key, data):
     counts_strings = [f"{sub_key}: {count}" for sub_key, count in data.items()]
     return f"{key.capitalize()} Counts:\n" + "\n".join(counts_strings)
@@ -12,6 +23,53 @@ def display_time_difference(data):
     return f"Time Difference: {data} minutes"
 
 
+def format_bucket(bucket, unit):
+    # Hour buckets are stored as "YYYY-MM-DD HH"
+    return f"{bucket}:00" if unit == "Hour" else bucket
+
+
+def display_rate(key, data, rate_key):
+    unit, bucket_format, minutes = BUCKET_UNITS[rate_key]
+    first = datetime.strptime(min(data), bucket_format)
+    last = datetime.strptime(max(data), bucket_format)
+    # Buckets without any entry count towards the average as well
+    bucket_count = int((last - first).total_seconds() // (minutes * 60)) + 1
+    average = sum(data.values()) / bucket_count
+    busiest = heapq.nlargest(3, data.items(), key=lambda item: item[1])
+    busiest_strings = [f"{format_bucket(bucket, unit)}: {count}" for bucket, count in busiest]
+    return (f"{key.capitalize()} Rate per {unit}:\nAverage: {average:.1f}\n"
+            f"Busiest:\n" + "\n".join(busiest_strings))
+
+
+def display_top_per_hour(key, data):
+    field = key.split("/")[-1]
+    bucket_strings = [
+        f"{format_bucket(bucket, 'Hour')}: " + ", ".join(f"{value} ({count})" for value, count in top)
+        for bucket, top in data.items()]
+    return f"Top {field.capitalize()} per Hour:\n" + "\n".join(bucket_strings)
+
+
+def display_percentiles(key, data):
+    if not data:
+        return f"{key.capitalize()} Percentiles: no numeric values"
+    percentile_strings = [f"p{percentile}: {value:.1f}" for percentile, value in data.items()]
+    return f"{key.capitalize()} Percentiles:\n" + "\n".join(percentile_strings)
+
+
+def display_approximate(key, note):
+    return f"(Too many distinct {key} values to count exactly: {note}.)"
+
+
+def display_top_values(key, data):
+    value_strings = [f"{value}: ~{count} (error <= {error})" if error else f"{value}: {count}"
+                     for value, count, error in data]
+    return f"{key.capitalize()} Top {len(data)}:\n" + "\n".join(value_strings)
+
+
+def display_distinct(key, data):
+    return f"{key.capitalize()} Distinct Values: {data}"
+
+
 def display_log_length(data):
     return f"Log Length: {data} lines"
 
@@ -31,13 +89,23 @@ def display_insights(insights, log_data_length, parsed_data_length):
         "counts": display_counts,
         "range": display_range,
         "time_difference": display_time_difference,
+        "rate_per_minute": lambda key, data: display_rate(key, data, "rate_per_minute"),
+        "rate_per_hour": lambda key, data: display_rate(key, data, "rate_per_hour"),
+        "top_per_hour": display_top_per_hour,
+        "percentiles": display_percentiles,
+        "percentiles_approximate": lambda key, data: display_approximate(key, "the percentiles are within 1%"),
+        "top_values": display_top_values,
+        "top_values_approximate": lambda key, data: display_approximate(key, "the top counts are approximate"),
+        "distinct": display_distinct,
+        "distinct_approximate": lambda key, data: display_approximate(key, "the number of distinct values is an estimate"),
         "log_length": display_log_length,
         "parsed_length": display_parsed_length
     }
 
-    # Integrating the log length into the insights dictionary for uniformity
-    insights["log"] = {"log_length": log_data_length}
-    insights["parsed"] = {"parsed_length": parsed_data_length}
+    # Integrating the log length into the insights dictionary for uniformity. The
+    # insights are copied, since they may be memoized and displayed again.
+    insights = {**insights, "log": {"log_length": log_data_length},
+                "parsed": {"parsed_length": parsed_data_length}}
 
     insight_messages = []
     for key, data in insights.items():
@@ -60,3 +128,47 @@ def display_insights(insights, log_data_length, parsed_data_length):
     ]
 
     print("\n".join(message_parts))
+
+
+def clear_screen():
+    """Clear the terminal before redrawing. Does nothing if the output is redirected."""
+    if sys.stdout.isatty():
+        print("\033[H\033[J", end="")
+
+
+def display_compact_summary(insights, log_data_length, parsed_data_length, top=5):
+    """
+    Display a short summary of the insights that fits on one screen.
+    Counts are limited to the most frequent values.
+    """
+    summary_lines = [
+        f"LogLoom live summary - {log_data_length} new lines, {parsed_data_length} parsed",
+        "-" * 50
+    ]
+    if not insights:
+        summary_lines.append("Waiting for new log lines...")
+
+    for key, data in insights.items():
+        if "range" in data:
+            start, end = data["range"]
+            summary_lines.append(f"{key.capitalize()}: {start} .. {end}")
+        if "counts" in data:
+            most_common = heapq.nlargest(top, data["counts"].items(), key=lambda item: item[1])
+            values = ", ".join(f"{value} ({count})" for value, count in most_common)
+            summary_lines.append(f"{key.capitalize()}: {values}")
+        if "top_values" in data:
+            approximate = "~" if data.get("top_values_approximate") else ""
+            values = ", ".join(f"{value} ({approximate}{count})" for value, count, _ in data["top_values"][:top])
+            summary_lines.append(f"{key.capitalize()}: {values}")
+        if "distinct" in data:
+            approximate = "~" if data.get("distinct_approximate") else ""
+            summary_lines.append(f"{key.capitalize()} distinct: {approximate}{data['distinct']}")
+        if data.get("rate_per_minute"):
+            rates = data["rate_per_minute"]
+            latest = max(rates)
+            summary_lines.append(f"Rate: {rates[latest]}/min at {latest}, peak {max(rates.values())}/min")
+        if data.get("percentiles"):
+            values = " / ".join(f"{value:.0f}" for value in data["percentiles"].values())
+            summary_lines.append(f"{key.capitalize()} p50/p95/p99: {values}")
+
+    print("\n".join(summary_lines))
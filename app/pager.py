@@ -0,0 +1,147 @@
+import shutil
+from time_index import parse_time_bound
+from stats import current_stats
+
+# Number of rows spread over the whole store that determine the initial column widths
+WIDTH_SAMPLE_SIZE = 1000
+
+# Terminal lines used by the separators, the header and the prompt of a page
+PAGE_OVERHEAD = 6
+
+
+def terminal_page_size():
+    """Return the number of rows that fit on the terminal, at least 5."""
+    return max(5, shutil.get_terminal_size().lines - PAGE_OVERHEAD)
+
+
+def sample_rows(parsed_data, sample_size=WIDTH_SAMPLE_SIZE):
+    """
+    Return evenly spaced row numbers of the store, so a sample covers the whole log
+    and not only its first entries.
+    """
+    count = len(parsed_data)
+    step = max(1, count // sample_size)
+    return range(0, count, step)
+
+
+class TablePager:
+    """
+    Shows the selected fields of a RecordStore one page at a time.
+
+    Only the rows of the visible page are read and formatted. Column widths come from
+    a sample of rows spread over the store and grow when a page contains wider
+    values, so the columns do not jump back and forth while paging.
+    """
+
+    def __init__(self, parsed_data, selected_keys, max_width=50, page_size=None):
+        """
+        Args:
+            parsed_data (RecordStore): The parsed log entries.
+            selected_keys (list): List of selected keys to show.
+            max_width (int): Maximum width for any column.
+            page_size (int or None): Rows per page, by default what fits on the terminal.
+        """
+        self.parsed_data = parsed_data
+        self.selected_keys = selected_keys
+        self.max_width = max_width
+        self.page_size = page_size or terminal_page_size()
+        self.start = 0
+        # Include the key's own length in the consideration
+        self.key_widths = {key: min(len(key), max_width) for key in selected_keys}
+        self.fit_widths(parsed_data.row(index, selected_keys) for index in sample_rows(parsed_data))
+
+    def fit_widths(self, rows):
+        """Widen the columns to the values of the given rows, limited to max_width."""
+        key_widths = self.key_widths
+        for row in rows:
+            for key, value in row.items():
+                width = len(str(value))
+                if width > key_widths[key]:
+                    key_widths[key] = min(width, self.max_width)
+
+    def render_page(self):
+        """
+        Format the current page.
+
+        Returns:
+            list: The lines of the page, including the header.
+        """
+        rows = list(self.parsed_data.rows(self.selected_keys, self.start, self.start + self.page_size))
+        self.fit_widths(rows)
+        key_widths = self.key_widths
+
+        separator = '-' * (sum(key_widths.values()) + len(self.selected_keys) * 5 - 3)
+        lines = [separator,
+                 "  |  ".join(key.ljust(key_widths[key]) for key in self.selected_keys),
+                 separator]
+        for entry in rows:
+            lines.append("  |  ".join(str(entry.get(key, '')).ljust(key_widths[key])
+                                      for key in self.selected_keys))
+        return lines
+
+    def go_to(self, row):
+        """Move the page to start at the given row number (0-based), within the store."""
+        last_page_start = max(0, len(self.parsed_data) - self.page_size)
+        self.start = max(0, min(row, last_page_start))
+
+    def handle_command(self, command):
+        """
+        Apply a pager command to the position.
+
+        Args:
+            command (str): '' or 'n' for the next page, 'p' for the previous one,
+                'g N' to go to row N, 't TIME' to go to the first entry at or after
+                TIME (e.g. 't 2023-10-10 14:00') and 'q' to quit.
+
+        Returns:
+            bool: False if the pager should close.
+
+        Raises:
+            ValueError: If the command or its argument is invalid.
+        """
+        action, _, argument = command.strip().partition(' ')
+        action = action.lower()
+        argument = argument.strip()
+        if action == 'q':
+            return False
+        if action in ('', 'n'):
+            self.go_to(self.start + self.page_size)
+        elif action == 'p':
+            self.go_to(self.start - self.page_size)
+        elif action == 'g':
+            if not argument.isdigit() or int(argument) < 1:
+                raise ValueError(f"'{argument}' is not a row number. Use e.g. 'g 1000'.")
+            self.go_to(int(argument) - 1)
+        elif action == 't':
+            if 'timestamp' not in self.parsed_data:
+                raise ValueError("The parsed data has no timestamps.")
+            self.go_to(self.parsed_data.find_timestamp(parse_time_bound(argument)))
+        else:
+            raise ValueError(f"Unknown command '{command.strip()}'.")
+        return True
+
+    def run(self):
+        """Show pages until the user quits or the input ends."""
+        total = len(self.parsed_data)
+        prompt = ("[Enter] next, (P)revious, (G)o to row 'g N', (T)ime 't 2023-10-10 14:00' "
+                  "or (Q)uit: ")
+        stats = current_stats()
+        while True:
+            # Only rendering is timed, not the time the user looks at the page
+            with stats.timer("output"):
+                print("\n".join(self.render_page()))
+            last = min(total, self.start + self.page_size)
+            print(f"Rows {self.start + 1}-{last} of {total}")
+            if total <= self.page_size:
+                return
+            while True:
+                try:
+                    command = input(prompt)
+                except EOFError:
+                    return
+                try:
+                    if not self.handle_command(command):
+                        return
+                    break
+                except ValueError as e:
+                    print(e)
@@ -0,0 +1,187 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from analysis import StreamingAnalyzer, CountingIterator
+from parsers.parsers_util import get_analysis_parser, iter_parsed_records, timestamp_warning_for
+from readers import read_raw_lines, read_raw_range, detect_compression
+from stats import RunStats, activate_stats, current_stats
+
+# Number of byte ranges per worker. More ranges than workers keeps all processes
+# busy when some parts of the file are slower to parse than others.
+RANGES_PER_WORKER = 4
+
+
+def split_file_ranges(file_path, count, start=0, end=None):
+    """
+    Split a file into newline-aligned byte ranges of roughly equal size.
+
+    Args:
+        file_path (str): Path to the file to be split.
+        count (int): Desired number of ranges.
+        start (int): Line start where the first range begins.
+        end (int or None): Line start (or file size) where the last range ends.
+
+    Returns:
+        list: List of (start, end) byte offsets covering [start, end) of the file.
+    """
+    size = os.path.getsize(file_path) if end is None else end
+    boundaries = [start]
+    with open(file_path, 'rb') as file:
+        for index in range(1, count):
+            position = start + (size - start) * index // count
+            if position <= boundaries[-1]:
+                continue
+            # Continue to the start of the next line. Seeking one byte back keeps a
+            # position that already is the start of a line where it is.
+            file.seek(position - 1)
+            file.readline()
+            position = file.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    if size > boundaries[-1]:
+        boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def analyze_file_range(file_path, format_type, start, end, line_filter=None, time_range=None,
+                       analysis_fields=None, collect_stats=False):
+    """
+    Parse and analyze one byte range of a log file. Runs inside a worker process.
+
+    Args:
+        file_path (str): Path to the log file.
+        format_type (str): Log file format.
+        start (int or None): Byte offset of the first line of the range, or None to
+            read the whole (possibly compressed) file.
+        end (int or None): Byte offset at which the range ends.
+        line_filter (LineFilter or None): Only analyze lines that match this filter.
+        time_range (TimeRange or None): Only analyze entries within this time range.
+        analysis_fields (iterable or None): Only run the analyses of these fields.
+        collect_stats (bool): Whether to record run statistics for --stats.
+
+    Returns:
+        tuple: (StreamingAnalyzer with the partial result, list of timestamp errors
+        as (line number within the range, details) tuples, RunStats or None).
+    """
+    stats = RunStats() if collect_stats else None
+    activate_stats(stats)
+    parser = get_analysis_parser(format_type, line_filter.fields if line_filter else (), analysis_fields)
+    analyzer = StreamingAnalyzer(getattr(parser, 'analysis_config', {}))
+    timestamp_errors = []
+
+    def collect_error(line_number, error):
+        timestamp_errors.append((line_number, str(error)))
+
+    if start is None:
+        lines = CountingIterator(read_raw_lines(file_path))
+    else:
+        lines = CountingIterator(read_raw_range(file_path, start, end))
+    records = iter_parsed_records(lines, parser, on_timestamp_error=collect_error,
+                                  line_filter=line_filter)
+    with current_stats().timer("analysis"):
+        for record in time_range.filter(records) if time_range else records:
+            analyzer.update(record)
+    analyzer.lines_read = lines.count
+    activate_stats(None)
+    return analyzer, timestamp_errors, stats
+
+
+def plan_file_ranges(file_paths, count, format_type, time_range=None):
+    """
+    Split log files into the ranges analyzed by the worker processes.
+
+    Uncompressed files are split into byte ranges. A compressed file cannot be
+    entered in the middle, so it is a single range that is decompressed as a whole.
+
+    Args:
+        file_paths (list): Paths of the log files, in the order they are read.
+        count (int): Desired total number of ranges.
+        format_type (str): Log file format.
+        time_range (TimeRange or None): Only plan the part of each file this range can match.
+
+    Returns:
+        tuple: (list of (file_path, start, end) tuples in file order,
+        {file_path: number of lines before its first range}).
+    """
+    ranges_per_file = max(1, count // len(file_paths))
+    parser = get_analysis_parser(format_type)
+    tasks, lines_before = [], {}
+    for file_path in file_paths:
+        lines_before[file_path] = 0
+        if detect_compression(file_path):
+            tasks.append((file_path, None, None))
+            continue
+        start, end = 0, None
+        if time_range is not None:
+            start, end, lines_before[file_path] = time_range.locate(file_path, format_type, parser)
+        tasks.extend((file_path, range_start, range_end)
+                     for range_start, range_end in split_file_ranges(file_path, ranges_per_file, start, end))
+    return tasks, lines_before
+
+
+def analyze_log_files_parallel(file_paths, format_type, workers, line_filter=None, time_range=None,
+                               analysis_fields=None):
+    """
+    Parse and analyze log files with a pool of worker processes.
+
+    The files are split into newline-aligned byte ranges (compressed files stay whole)
+    that are analyzed independently, so several archives of a rotated set are
+    decompressed at the same time. The partial results are merged in file order, so
+    the line numbers in the warnings are those of a single-process run. The
+    insights are identical as well, except for analyses that ran out of exact
+    counters (e.g. top values of more than sketches.EXACT_LIMIT distinct IPs): their
+    results are approximate and marked as such. With --stats, the statistics of the workers are added up,
+    so their stage times are CPU time summed over all processes.
+
+    Args:
+        file_paths (list): Paths of the log files, in the order they are read.
+        format_type (str): Log file format.
+        workers (int): Number of worker processes.
+        line_filter (LineFilter or None): Only analyze lines that match this filter.
+        time_range (TimeRange or None): Only analyze entries within this time range.
+        analysis_fields (iterable or None): Only run the analyses of these fields.
+
+    Returns:
+        tuple: A tuple containing (StreamingAnalyzer, parser instance).
+    """
+    parser = get_analysis_parser(format_type, analysis_fields=analysis_fields)
+    analyzer = StreamingAnalyzer(getattr(parser, 'analysis_config', {}))
+    tasks, lines_before = plan_file_ranges(file_paths, workers * RANGES_PER_WORKER, format_type, time_range)
+    stats = current_stats()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(analyze_file_range, file_path, format_type, start, end,
+                                   line_filter, time_range, analysis_fields, stats.enabled)
+                   for file_path, start, end in tasks]
+        current_file, line_offset = None, 0
+        for (file_path, _, _), future in zip(tasks, futures):
+            partial, timestamp_errors, partial_stats = future.result()
+            if partial_stats is not None:
+                stats.merge(partial_stats)
+            if file_path != current_file:
+                current_file, line_offset = file_path, lines_before[file_path]
+            warn = timestamp_warning_for(file_path, len(file_paths))
+            for line_number, details in timestamp_errors:
+                warn(line_offset + line_number, details)
+            line_offset += partial.lines_read
+            with stats.timer("analysis"):
+                analyzer.merge(partial)
+
+    return analyzer, parser
+
+
+def analyze_log_file_parallel(file_path, format_type, workers, line_filter=None):
+    """
+    Parse and analyze a log file with a pool of worker processes.
+
+    Args:
+        file_path (str): Path to the log file to be analyzed.
+        format_type (str): Log file format.
+        workers (int): Number of worker processes.
+        line_filter (LineFilter or None): Only analyze lines that match this filter.
+
+    Returns:
+        tuple: A tuple containing (StreamingAnalyzer, parser instance).
+    """
+    return analyze_log_files_parallel([file_path], format_type, workers, line_filter)
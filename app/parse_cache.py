@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+from analysis import CountingIterator, StreamingAnalyzer
+from parsers.parsers_util import get_parser_for_format, iter_parsed_records, store_records
+from record_store import RecordStore
+from readers import read_raw_range
+
+# Increase whenever the layout of the cache entry or the RecordStore changes
+CACHE_VERSION = 2
+
+# Number of bytes at the start and before the cached offset that are hashed to
+# recognize a rotated or rewritten file
+FINGERPRINT_BYTES = 4096
+
+
+def cache_path_for(file_path, format_type):
+    """
+    Return the path of the sidecar cache file for a log file and format.
+
+    Args:
+        file_path (str): Path to the log file.
+        format_type (str): Log file format.
+
+    Returns:
+        str: Path of the cache file next to the log file.
+    """
+    return f"{file_path}.{format_type}.logloom-cache"
+
+
+def _hash_bytes(file, start, end):
+    file.seek(start)
+    return hashlib.sha1(file.read(end - start)).hexdigest()
+
+
+def file_fingerprint(file_path, offset):
+    """
+    Build the fingerprint of the first offset bytes of a file.
+
+    Besides inode and modification time, the fingerprint contains hashes of the
+    beginning of the file and of the bytes right before offset, so a file that was
+    rotated, truncated or rewritten in place no longer matches.
+
+    Args:
+        file_path (str): Path to the log file.
+        offset (int): Number of bytes covered by the cache.
+
+    Returns:
+        dict: The fingerprint.
+    """
+    stat = os.stat(file_path)
+    with open(file_path, 'rb') as file:
+        head = _hash_bytes(file, 0, min(offset, FINGERPRINT_BYTES))
+        tail = _hash_bytes(file, max(0, offset - FINGERPRINT_BYTES), offset)
+    return {
+        "device": stat.st_dev,
+        "inode": stat.st_ino,
+        "mtime": stat.st_mtime_ns,
+        "offset": offset,
+        "head": head,
+        "tail": tail,
+    }
+
+
+def sidecar_is_trusted(file):
+    """
+    Check that an open sidecar file can only have been written by the current user:
+    it must be owned by them and must not be writable by the group or others.
+    Unpickling a file that someone else could write would run their code.
+
+    Args:
+        file (file object): The opened sidecar file.
+
+    Returns:
+        bool: Whether the file may be unpickled.
+    """
+    stat = os.fstat(file.fileno())
+    if stat.st_mode & 0o022:
+        return False
+    # Platforms without user ids (Windows) only get the permission check
+    return not hasattr(os, 'getuid') or stat.st_uid == os.getuid()
+
+
+def directory_is_owned(file_path):
+    """
+    Check whether the directory of a file belongs to the current user, so that
+    sidecar files written there unasked do not end up in e.g. /var/log.
+
+    Args:
+        file_path (str): Path to the log file.
+
+    Returns:
+        bool: Whether the directory is owned by the current user.
+    """
+    try:
+        stat = os.stat(os.path.dirname(os.path.abspath(file_path)))
+    except OSError:
+        return False
+    return not hasattr(os, 'getuid') or stat.st_uid == os.getuid()
+
+
+def read_sidecar(sidecar_path, version, as_json=False):
+    """
+    Read a sidecar entry written by write_sidecar.
+
+    Sidecars that are not owned by the current user, or that the group or others
+    can write, are ignored with a warning, so that nobody else can plant a pickle.
+
+    Args:
+        sidecar_path (str): Path to the sidecar file.
+        version (int): Expected value of the entry's "version" field.
+        as_json (bool): Whether the entry was written as JSON instead of a pickle.
+
+    Returns:
+        dict or None: The entry, or None if there is none, it has another version
+        or it is not trusted.
+    """
+    try:
+        with open(sidecar_path, 'rb') as file:
+            if not sidecar_is_trusted(file):
+                print(f"Warning: Ignoring the sidecar file '{sidecar_path}', since it is not owned by you "
+                      "or can be written by others.", file=sys.stderr)
+                return None
+            entry = json.load(file) if as_json else pickle.load(file)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(entry, dict) or entry.get("version") != version:
+        return None
+    return entry
+
+
+def fingerprint_matches(file_path, cached, check_mtime=True):
+    """
+    Check whether the first bytes of a file are still those a fingerprint was taken of.
+
+    Args:
+        file_path (str): Path to the log file.
+        cached (dict): Fingerprint from file_fingerprint.
+        check_mtime (bool): Whether a file that did not grow but has another
+            modification time counts as rewritten. Without it, only the hashed
+            head and tail decide, so e.g. touching the file keeps the match.
+
+    Returns:
+        bool: False if the file was rotated, truncated or rewritten since.
+    """
+    stat = os.stat(file_path)
+    if (stat.st_dev, stat.st_ino) != (cached["device"], cached["inode"]):
+        return False  # Rotated: a different file now lives at this path
+    if stat.st_size < cached["offset"]:
+        return False  # Truncated
+    if check_mtime and stat.st_size == cached["offset"] and stat.st_mtime_ns != cached["mtime"]:
+        return False  # Rewritten in place without growing
+
+    current = file_fingerprint(file_path, cached["offset"])
+    return (current["head"], current["tail"]) == (cached["head"], cached["tail"])
+
+
+def write_sidecar(sidecar_path, entry, as_json=False):
+    """
+    Write a sidecar entry atomically. Failing to write it is not fatal.
+
+    Args:
+        sidecar_path (str): Path to the sidecar file.
+        entry (dict): The entry to be written.
+        as_json (bool): Whether to write the entry as JSON instead of a pickle.
+    """
+    temporary_path = f"{sidecar_path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, 'wb') as file:
+            # Only the owner may write it, whatever the umask, or read_sidecar ignores it
+            if hasattr(os, 'fchmod'):
+                os.fchmod(file.fileno(), 0o644)
+            if as_json:
+                file.write(json.dumps(entry).encode())
+            else:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, sidecar_path)
+    except OSError as e:
+        print(f"Warning: Could not write the sidecar file '{sidecar_path}'. Details: {e}", file=sys.stderr)
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+def load_cache(file_path, format_type):
+    """
+    Load the cache entry of a log file if it is still valid.
+
+    Args:
+        file_path (str): Path to the log file.
+        format_type (str): Log file format.
+
+    Returns:
+        dict or None: The cache entry, or None if there is none or it is stale.
+    """
+    entry = read_sidecar(cache_path_for(file_path, format_type), CACHE_VERSION)
+    if entry is None or not fingerprint_matches(file_path, entry["fingerprint"]):
+        return None
+    return entry
+
+
+def save_cache(file_path, format_type, parsed_data, offset, lines_read):
+    """
+    Write the cache entry atomically. Failing to write the cache is not fatal.
+
+    Args:
+        file_path (str): Path to the log file.
+        format_type (str): Log file format.
+        parsed_data (RecordStore): Records parsed from the first offset bytes.
+        offset (int): Byte offset up to which the file was parsed.
+        lines_read (int): Number of lines in the first offset bytes.
+    """
+    write_sidecar(cache_path_for(file_path, format_type), {
+        "version": CACHE_VERSION,
+        "fingerprint": file_fingerprint(file_path, offset),
+        "lines_read": lines_read,
+        "parsed_data": parsed_data,
+    })
+
+
+def complete_lines_end(file_path, size):
+    """
+    Return the offset right after the last newline in the first size bytes of a file.
+
+    Args:
+        file_path (str): Path to the log file.
+        size (int): Number of bytes to consider.
+
+    Returns:
+        int: Offset where a trailing incomplete line starts (or size).
+    """
+    with open(file_path, 'rb') as file:
+        position = size
+        while position > 0:
+            block_start = max(0, position - 65536)
+            file.seek(block_start)
+            block = file.read(position - block_start)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                return block_start + newline + 1
+            position = block_start
+    return 0
+
+
+def process_log_file_cached(file_path, format_type):
+    """
+    Like parsers_util.process_log_file, but reuse the sidecar cache of an earlier run.
+
+    Only bytes appended since the cached offset are parsed. An incomplete last line
+    is parsed for this run but left out of the cache, so it is read again once the
+    writer has finished it.
+
+    Args:
+        file_path (str): Path to the log file to be processed.
+        format_type (str): Log file format.
+
+    Returns:
+        tuple: A tuple containing (RecordStore with the parsed data, parser instance).
+    """
+    parser = get_parser_for_format(format_type)
+    config = getattr(parser, 'analysis_config', {})
+    entry = load_cache(file_path, format_type)
+    if entry:
+        parsed_data = entry["parsed_data"]
+        offset = entry["fingerprint"]["offset"]
+        lines_read = entry["lines_read"]
+        aggregates = parsed_data.aggregates
+        if aggregates is not None:
+            # The unpickled aggregates carry a copy of the config; they are only
+            # reused while the parser still analyzes the same fields
+            if list(aggregates.accumulators) == list(config):
+                aggregates.config = config
+            else:
+                parsed_data.aggregates = None
+    else:
+        parsed_data, offset, lines_read = RecordStore(), 0, 0
+        if config:
+            # Cached together with the columns and updated with appended lines
+            parsed_data.aggregates = StreamingAnalyzer(config)
+
+    size = os.path.getsize(file_path)
+    end = complete_lines_end(file_path, size)
+    if end > offset or not entry:
+        lines = CountingIterator(read_raw_range(file_path, offset, end))
+        store_records(parsed_data, iter_parsed_records(lines, parser, lines_read + 1))
+        lines_read += lines.count
+        save_cache(file_path, format_type, parsed_data, end, lines_read)
+        offset = end
+
+    parsed_data.lines_read = lines_read
+    if size > offset:
+        store_records(parsed_data, iter_parsed_records(
+            read_raw_range(file_path, offset, size), parser, lines_read + 1))
+        parsed_data.lines_read += 1
+
+    return parsed_data, parser
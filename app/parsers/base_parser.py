@@ -6,16 +6,65 @@ class BaseParser:
     """
     Base parser class. All format-specific parsers should inherit from this class.
     """
+
+    # Optional projection: if set, parsed records only contain these fields
+    fields = None
+
+    def select_fields(self, fields):
+        """
+        Restrict the parsed records to the given fields.
+
+        Args:
+            fields (iterable or None): Field names to keep, or None for all fields.
+        """
+        self.fields = tuple(fields) if fields else None
+
+    def project(self, record):
+        """Drop all fields of a record that are not part of the projection."""
+        if self.fields is None:
+            return record
+        return {key: record[key] for key in self.fields if key in record}
+
     def parse_line(self, line):
         """
         Removes ANSI codes and then matches the line against the parser's pattern.
         """
-        # First, remove any ANSI escape codes from the entire line.
-        cleaned_line = self.ansi_escape.sub('', line)
-        
+        # First, remove any ANSI escape codes from the entire line. Most lines have
+        # none, so the substitution only runs when an escape character is present.
+        if '\x1b' in line:
+            line = self.ansi_escape.sub('', line)
+
         # Then, try to match the pattern on the cleaned line.
-        match = self.pattern.match(cleaned_line)
+        match = self.pattern.match(line)
         if match:
-            return match.groupdict()
+            return self.project(match.groupdict())
         else:
-            return None
\ No newline at end of file
+            return None
+
+    def strip_ansi(self, lines):
+        """
+        Remove ANSI codes from a batch of lines. parse_line does the same per line;
+        this lets --stats time the stripping on its own.
+
+        Args:
+            lines (list): Lines from the log file.
+
+        Returns:
+            list: The lines without ANSI codes.
+        """
+        ansi_escape = self.ansi_escape
+        return [ansi_escape.sub('', line) if '\x1b' in line else line for line in lines]
+
+    def parse_lines(self, lines):
+        """
+        Parse a batch of lines. Parsers that can decode many lines more efficiently
+        than one at a time override this method.
+
+        Args:
+            lines (list): Lines from the log file.
+
+        Returns:
+            list: One parsed record (or None) per line.
+        """
+        parse_line = self.parse_line
+        return [parse_line(line) for line in lines]
@@ -1,6 +1,8 @@
 import re
 from datetime import datetime
-from utils import calculate_time_difference, get_range, time_difference, get_counts
+from utils import (calculate_time_difference, get_range, time_difference, get_counts,
+                   rate_per_minute, top_counts_per_hour, get_percentiles)
+from analysis import ApproximateTopValues, ApproximateDistinctCount
 from .base_parser import BaseParser
 
 
@@ -14,11 +16,21 @@ class CLFParser(BaseParser):
         "%d/%b/%Y %H:%M:%S"      # Format without timezone
     ]
 
+    # Fixed layout that allows the timestamp normalizer to slice instead of calling strptime
+    timestamp_layout = "clf"
+
+    # Text that directly precedes a field in the raw line, used by the pre-filter
+    raw_field_prefixes = {
+        "status": '" '
+    }
+
     # Analysis configuration for CLF data
     analysis_config = {
-        "timestamp": [get_range, time_difference],
+        "timestamp": [get_range, time_difference, rate_per_minute],
         "status": [get_counts],
-        "ip": [get_counts]
+        "ip": [ApproximateTopValues(), ApproximateDistinctCount()],
+        "size": [get_percentiles],
+        ("timestamp", "status"): [top_counts_per_hour]
     }
 
     # Regular expression to match the CLF format
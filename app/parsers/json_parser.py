@@ -2,6 +2,18 @@ import json
 from .base_parser import BaseParser
 from utils import get_range, time_difference, get_counts
 
+# Optional accelerated decoders, used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
 class JSONParser(BaseParser):
     """
     Parser for log files where each line is a JSON object.
@@ -16,6 +28,18 @@ class JSONParser(BaseParser):
         "service": [get_counts],
     }
 
+    # Keys that some logs use instead of 'timestamp', in order of preference
+    timestamp_aliases = ('time', 'ts')
+
+    def __init__(self, fields=None):
+        """
+        Args:
+            fields (iterable or None): Projection of the fields to keep, or None for all.
+        """
+        self.select_fields(fields)
+        self.loads = orjson.loads if orjson else json.loads
+        self._simdjson_parser = simdjson.Parser() if simdjson and not orjson else None
+
     def parse_line(self, line):
         """
         Overrides the base method to parse a line as a JSON object.
@@ -26,23 +50,79 @@ class JSONParser(BaseParser):
         Returns:
             dict or None: A dictionary representing the log entry, or None if parsing fails.
         """
-        # Skip empty lines
-        if not line.strip():
-            return None
+        return self.parse_lines([line])[0]
+
+    def strip_ansi(self, lines):
+        """JSON lines are decoded as they are, without removing ANSI codes."""
+        return lines
+
+    def parse_lines(self, lines):
+        """
+        Decode a batch of lines.
+
+        orjson is used if installed. Without it, a projection is decoded with
+        pysimdjson (if installed), which only materializes the wanted fields. The
+        standard library is the fallback.
+
+        Args:
+            lines (list): Lines from the log file.
 
+        Returns:
+            list: One dictionary (or None for empty and invalid lines) per line.
+        """
+        if self.fields is not None and self._simdjson_parser is not None:
+            decode = self._decode_projected
+        else:
+            decode = self._decode
+        return [decode(line) if not line.isspace() and line else None for line in lines]
+
+    def _decode(self, line):
         try:
             # The core of the parser: load the line as a JSON object
-            data = json.loads(line)
-            
-            # It's good practice to normalize common keys. For example, some logs
-            # might use 'time' or 'ts' instead of 'timestamp'. We can handle that here.
-            if 'time' in data and 'timestamp' not in data:
-                data['timestamp'] = data.pop('time')
-            if 'ts' in data and 'timestamp' not in data:
-                data['timestamp'] = data.pop('ts')
-
-            return data
-        except json.JSONDecodeError:
+            data = self.loads(line)
+        except ValueError:
             # If a line is not valid JSON, we simply ignore it.
-            # Alternatively, you could log a warning here.
-            return None
\ No newline at end of file
+            return None
+        if not isinstance(data, dict):
+            return None
+
+        # It's good practice to normalize common keys. For example, some logs
+        # might use 'time' or 'ts' instead of 'timestamp'. We can handle that here.
+        if 'timestamp' not in data:
+            for alias in self.timestamp_aliases:
+                if alias in data:
+                    data['timestamp'] = data.pop(alias)
+                    break
+        return self.project(data)
+
+    def _decode_projected(self, line):
+        """
+        Decode only the projected fields with pysimdjson's lazy document proxies.
+        The proxies must not outlive this call, as the parser is reused for the next line.
+        """
+        try:
+            document = self._simdjson_parser.parse(line)
+        except ValueError:
+            return None
+        if not isinstance(document, simdjson.Object):
+            return None
+
+        record = {}
+        for key in self.fields:
+            if key == 'timestamp' and key not in document:
+                key = next((alias for alias in self.timestamp_aliases if alias in document), None)
+                if key is None:
+                    continue
+                record['timestamp'] = _materialize(document[key])
+            elif key in document:
+                record[key] = _materialize(document[key])
+        return record
+
+
+def _materialize(value):
+    """Convert pysimdjson proxies into plain Python objects."""
+    if isinstance(value, simdjson.Object):
+        return value.as_dict()
+    if isinstance(value, simdjson.Array):
+        return value.as_list()
+    return value
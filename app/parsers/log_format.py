@@ -1,7 +1,10 @@
 from enum import Enum
 
+# Value of --format that lets LogLoom detect the format from a sample of the file
+AUTO_FORMAT = "auto"
+
 class LogFormat(Enum):
     CLF = "CLF"
     SYSLOG = "Syslog"
     SYSTEMD = "Systemd"
-    JSON = "JSON"
\ No newline at end of file
+    JSON = "JSON"
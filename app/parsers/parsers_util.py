@@ -1,11 +1,23 @@
-from .log_format import LogFormat
-from .clf_parser import CLFParser
-from .syslog_parser import SyslogParser
-from .systemd_journal_parser import SystemdJournalParser
-from .json_parser import JSONParser
-from utils import read_log_file
-from datetime import datetime
-import re
+import heapq
+import sys
+from itertools import chain, islice
+from .registry import available_formats, create_parser
+from .timestamps import TimestampNormalizer
+from readers import read_raw_lines, read_raw_range, read_sample_lines, decode_log_lines
+from analysis import StreamingAnalyzer, CountingIterator
+from record_store import RecordStore
+from utils import config_fields, select_analyses
+from stats import current_stats, activate_stats
+
+# Number of lines handed to BaseParser.parse_lines at once
+PARSE_BATCH_SIZE = 1024
+
+# Number of timestamp warnings printed per run before they are suppressed
+TIMESTAMP_WARNING_LIMIT = 20
+timestamp_warnings_printed = 0
+
+# Number of bytes at the start of a file that --format auto tries the parsers on
+DETECTION_SAMPLE_SIZE = 16 * 1024
 
 
 def get_parser_for_format(log_format):
@@ -13,27 +25,93 @@ def get_parser_for_format(log_format):
     Return the appropriate parser for a given log format.
 
     Args:
-        log_format (str): The format of the log (e.g., "CLF", "Syslog").
+        log_format (str): The format of the log (e.g., "CLF", "Syslog", or a format
+            declared in a format file, see registry.py).
 
     Returns:
         BaseParser: An instance of the appropriate parser.
     """
-    if log_format == LogFormat.CLF.value:
-        return CLFParser()
-    elif log_format == LogFormat.SYSLOG.value:
-        return SyslogParser()
-    elif log_format == LogFormat.SYSTEMD.value:
-        return SystemdJournalParser()
-    elif log_format == LogFormat.JSON.value:
-        return JSONParser()
-    else:
-        raise ValueError(f"Unsupported log format: {log_format}")
+    return create_parser(log_format)
+
+
+def detect_log_format(file_path, sample_size=DETECTION_SAMPLE_SIZE):
+    """
+    Detect the format of a log file by trying every parser on a sample of its lines.
+
+    A line counts as a match if the parser returns a record whose timestamp can be
+    normalized. The format with the highest match rate wins; on a tie, the one listed
+    first by available_formats() (built-in formats come first).
+
+    Args:
+        file_path (str): Path to the log file.
+        sample_size (int): Number of bytes at the start of the file to sample.
+
+    Returns:
+        tuple: (format name, share of the sampled lines it matched).
+
+    Raises:
+        ValueError: If no parser matches any of the sampled lines.
+    """
+    lines = read_sample_lines(file_path, sample_size)
+    best_format, best_matches = None, 0
+    # The trial runs are not part of the run statistics
+    previous_stats = activate_stats(None)
+    try:
+        for log_format in available_formats():
+            matches = sum(1 for _ in iter_parsed_records(lines, get_parser_for_format(log_format),
+                                                         on_timestamp_error=lambda line_number, error: None))
+            if matches > best_matches:
+                best_format, best_matches = log_format, matches
+    finally:
+        activate_stats(previous_stats)
+    if best_format is None:
+        raise ValueError(f"Could not detect the format of '{file_path}'. Pass it with --format.")
+    return best_format, best_matches / len(lines)
+
+
+def get_analysis_parser(format_type, extra_fields=(), analysis_fields=None):
+    """
+    Return a parser whose records only contain the fields needed by its analysis_config.
+
+    Args:
+        format_type (str): Log file format.
+        extra_fields (iterable): Additional fields to keep, e.g. for filters.
+        analysis_fields (iterable or None): Restrict the analysis_config of the returned
+            instance to the analyses of these fields.
+
+    Returns:
+        BaseParser: An instance of the appropriate parser with a field projection.
+    """
+    parser = get_parser_for_format(format_type)
+    if analysis_fields is not None:
+        parser.analysis_config = select_analyses(getattr(parser, 'analysis_config', {}), analysis_fields)
+    config = getattr(parser, 'analysis_config', {})
+    if config:
+        parser.select_fields(['timestamp', *config_fields(config), *extra_fields])
+    return parser
+
+
+def get_timestamp_normalizer(parser):
+    """
+    Return the timestamp normalizer of a parser, creating it on first use.
+
+    Args:
+        parser (BaseParser): The parser instance which holds the timestamp format(s).
+
+    Returns:
+        TimestampNormalizer: The normalizer bound to this parser instance.
+    """
+    normalizer = parser.__dict__.get('_timestamp_normalizer')
+    if normalizer is None:
+        normalizer = TimestampNormalizer(parser)
+        parser._timestamp_normalizer = normalizer
+    return normalizer
 
 
 def convert_to_standard_timestamp(timestamp_str, parser):
     """
     Convert given timestamp string to a standardized format.
-    This version manually replaces month names to be locale-independent.
+    Month names are replaced manually to be locale-independent.
 
     Args:
         timestamp_str (str): Timestamp string to be converted.
@@ -42,73 +120,337 @@ def convert_to_standard_timestamp(timestamp_str, parser):
     Returns:
         str: Converted timestamp string in the format "YYYY-MM-DD HH:MM:SS".
     """
-    # Define a mapping for English month abbreviations
-    month_map = {
-        'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04', 'May': '05', 'Jun': '06',
-        'Jul': '07', 'Aug': '08', 'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
-    }
-
-    # Use regex to find and replace the month abbreviation
-    # This is safer than a simple string replace
-    month_search = re.search(r"([A-Z][a-z]{2})", timestamp_str)
-    if month_search:
-        month_abbr = month_search.group(1)
-        if month_abbr in month_map:
-            # Replace the month name with its number
-            timestamp_str = timestamp_str.replace(month_abbr, month_map[month_abbr])
-            # Adjust the format strings to expect a numeric month (%m)
-            formats_to_try = [fmt.replace('%b', '%m') for fmt in getattr(parser, 'timestamp_formats', [])]
-        else:
-            formats_to_try = getattr(parser, 'timestamp_formats', [])
-    else:
-        formats_to_try = getattr(parser, 'timestamp_formats', [])
-
-    if isinstance(formats_to_try, str):
-        formats_to_try = [formats_to_try]
-        
-    if not formats_to_try:
-        return timestamp_str
-
-    datetime_obj = None
-    for fmt in formats_to_try:
-        try:
-            datetime_obj = datetime.strptime(timestamp_str, fmt)
+    return get_timestamp_normalizer(parser).normalize(timestamp_str)
+
+
+def warn_timestamp_error(line_number, error, file_path=None):
+    """
+    Print a warning for a line that was skipped because of its timestamp.
+
+    Only the first TIMESTAMP_WARNING_LIMIT warnings of a run are printed; a log
+    with a broken timestamp format would otherwise print one line per entry.
+    --stats reports the total number of timestamp errors.
+
+    Args:
+        line_number (int): Line number in the log file.
+        error (Exception or str): Details of the timestamp error.
+        file_path (str or None): The log file, named when several files are read.
+    """
+    global timestamp_warnings_printed
+    timestamp_warnings_printed += 1
+    if timestamp_warnings_printed > TIMESTAMP_WARNING_LIMIT:
+        return
+    location = f"line {line_number}" if file_path is None else f"line {line_number} of '{file_path}'"
+    # Warnings go to stderr, so they do not mix with machine-readable output
+    print(f"Warning: Skipping {location} due to timestamp error. Details: {error}", file=sys.stderr)
+    if timestamp_warnings_printed == TIMESTAMP_WARNING_LIMIT:
+        print("Warning: Further timestamp errors are not shown. Use --stats to count them.", file=sys.stderr)
+
+
+def timestamp_warning_for(file_path, file_count):
+    """
+    Return the timestamp error handler for one of several log files.
+
+    Args:
+        file_path (str): The log file being read.
+        file_count (int): Number of log files read in this run.
+
+    Returns:
+        func: Handler called with (line_number, error).
+    """
+    if file_count == 1:
+        return warn_timestamp_error
+    return lambda line_number, error: warn_timestamp_error(line_number, error, file_path)
+
+
+def iter_parsed_records(lines, parser, first_line_number=1, on_timestamp_error=warn_timestamp_error,
+                        line_filter=None):
+    """
+    Parse raw lines one at a time and yield the records with a normalized timestamp.
+
+    Lines are only decoded once they passed the pre-filter. The lines are processed
+    in batches, and with --stats every stage of a batch is timed and counted.
+
+    Args:
+        lines (iterable): Raw lines (bytes) of the log file.
+        parser (BaseParser): The parser used for each line.
+        first_line_number (int): Line number of the first line, used in warnings.
+        on_timestamp_error (func): Called with (line_number, error) for skipped lines.
+        line_filter (LineFilter or None): Pre-filter checked before a line is parsed.
+
+    Yields:
+        dict: A parsed log entry.
+    """
+    stats = current_stats()
+    if line_filter is not None:
+        line_filter.bind(parser)
+    line_number = first_line_number
+    lines = iter(lines)
+    while True:
+        with stats.timer("read"):
+            batch = list(islice(lines, PARSE_BATCH_SIZE))
+        if not batch:
+            break
+
+        first_in_batch = line_number
+        line_numbers = range(first_in_batch, first_in_batch + len(batch))
+        line_number += len(batch)
+        if line_filter is not None:
+            with stats.timer("prefilter"):
+                # Only lines that pass the cheap raw check reach the parser
+                line_numbers = [number for number, line in zip(line_numbers, batch)
+                                if line_filter.match_line(line)]
+                batch = [batch[number - first_in_batch] for number in line_numbers]
+        with stats.timer("decode"):
+            batch = decode_log_lines(batch)
+        if stats.enabled:
+            # Stripped up front so that parsing can be timed without it
+            with stats.timer("ansi"):
+                batch = parser.strip_ansi(batch)
+        with stats.timer("parse"):
+            parsed_lines = parser.parse_lines(batch)
+
+        records = []
+        unmatched = filtered = timestamp_errors = 0
+        with stats.timer("timestamps"):
+            for number, parsed_line in zip(line_numbers, parsed_lines):
+                if not parsed_line or 'timestamp' not in parsed_line:
+                    unmatched += 1
+                    continue
+                if line_filter is not None and not line_filter.match_record(parsed_line):
+                    filtered += 1
+                    continue
+                try:
+                    parsed_line['timestamp'] = convert_to_standard_timestamp(
+                        parsed_line['timestamp'], parser)
+                except ValueError as e:
+                    timestamp_errors += 1
+                    on_timestamp_error(number, e)
+                else:
+                    records.append(parsed_line)
+
+        if stats.enabled:
+            stats.count("lines_read", line_number - first_in_batch)
+            stats.count("lines_prefiltered", line_number - first_in_batch - len(batch))
+            stats.count("lines_matched", len(batch) - unmatched)
+            stats.count("lines_unmatched", unmatched)
+            stats.count("records_filtered", filtered)
+            stats.count("timestamp_errors", timestamp_errors)
+        yield from records
+
+
+def read_log_lines(file_path, format_type, parser, time_range=None):
+    """
+    Open the raw lines of a log file, limited to the part a time range can match.
+
+    Args:
+        file_path (str): Path to the log file.
+        format_type (str): Log file format.
+        parser (BaseParser): The parser used for the file.
+        time_range (TimeRange or None): Only read the lines this range can match.
+
+    Returns:
+        tuple: (iterator of raw lines, line number of the first line).
+    """
+    located = time_range.locate(file_path, format_type, parser) if time_range else None
+    if located is None:
+        return read_raw_lines(file_path), 1
+    start, end, lines_before = located
+    return read_raw_range(file_path, start, end), lines_before + 1
+
+
+def record_time(record):
+    """Sort key of the time-ordered merge; entries without a timestamp sort first."""
+    return record.get('timestamp', '')
+
+
+def iter_file_records(file_path, format_type, parser, line_filter=None, time_range=None, totals=None,
+                      file_count=1):
+    """
+    Parse a single log file and yield its records. See iter_log_records.
+    """
+    raw_lines, first_line_number = read_log_lines(file_path, format_type, parser, time_range)
+    lines = CountingIterator(raw_lines)
+    records = iter_parsed_records(
+        lines, parser, first_line_number, timestamp_warning_for(file_path, file_count),
+        line_filter=line_filter)
+    yield from time_range.filter(records) if time_range else records
+    # The line count comes from the same pass, so "Log Length" needs no second read
+    if totals is not None:
+        totals.lines_read += lines.count
+
+
+def tag_source(records, file_path):
+    """Add the path of the file an entry comes from as its "source" field."""
+    for record in records:
+        record['source'] = file_path
+        yield record
+
+
+def iter_log_records(file_paths, format_type, parser, line_filter=None, time_range=None, totals=None,
+                     merge=False):
+    """
+    Parse one or more log files (e.g. a rotated set, oldest first) and yield their records.
+
+    With merge, the files are read side by side and their entries interleaved by
+    timestamp with a k-way merge (heapq.merge): only the next entry of every file is
+    held in memory, and nothing is concatenated or sorted. This is meant for logs of
+    the same service from several hosts, each of which is ordered by time; every
+    entry then carries the path of its file in the "source" field.
+
+    Args:
+        file_paths (list): Paths of the log files, in the order they are read.
+        format_type (str): Log file format.
+        parser (BaseParser): The parser used for the files.
+        line_filter (LineFilter or None): Only yield lines that match this filter.
+        time_range (TimeRange or None): Only yield entries within this time range.
+        totals (object or None): Object whose lines_read attribute is increased by the
+            number of lines read from each file (e.g. a RecordStore).
+        merge (bool): Whether to interleave the entries of the files by time.
+
+    Returns:
+        iterator: The parsed log entries.
+    """
+    streams = [iter_file_records(file_path, format_type, parser, line_filter, time_range, totals,
+                                 len(file_paths))
+               for file_path in file_paths]
+    if merge and len(file_paths) > 1:
+        streams = [tag_source(stream, file_path) for stream, file_path in zip(streams, file_paths)]
+        return heapq.merge(*streams, key=record_time)
+    return chain.from_iterable(streams)
+
+
+def store_records(parsed_data, records):
+    """
+    Append records to a store and feed them into its aggregates in the same pass, so
+    the insights of the store are ready once parsing ends.
+
+    Args:
+        parsed_data (RecordStore): The store to fill. Its aggregates are dropped if
+            they do not cover the rows it already has.
+        records (iterable): Parsed log entries.
+    """
+    stats = current_stats()
+    aggregates = parsed_data.aggregates
+    if aggregates is not None and aggregates.records != len(parsed_data):
+        aggregates = parsed_data.aggregates = None
+    records = iter(records)
+    while True:
+        # Parsing the records happens inside this timer, but the timers are exclusive
+        with stats.timer("store"):
+            batch = list(islice(records, PARSE_BATCH_SIZE))
+            parsed_data.extend(batch)
+        if not batch:
             break
-        except ValueError:
-            continue
-    print(f'{datetime_obj} and {timestamp_str} and {formats_to_try}')
-    if datetime_obj is None:
-        raise ValueError(f"Time data '{timestamp_str}' does not match any known format.")
+        if aggregates is not None:
+            with stats.timer("analysis"):
+                aggregates.update_batch(batch)
 
-    if parser.__class__.__name__ == "SystemdJournalParser":
-        datetime_obj = datetime_obj.replace(year=datetime.now().year)
 
-    return datetime_obj.strftime("%Y-%m-%d %H:%M:%S")
+def process_log_files(file_paths, format_type, line_filter=None, time_range=None, merge=False):
+    """
+    Parse one or more log files (e.g. a rotated set, oldest first) into one store.
+
+    Args:
+        file_paths (list): Paths of the log files, in the order they are read.
+        format_type (str): Log file format.
+        line_filter (LineFilter or None): Only keep lines that match this filter.
+        time_range (TimeRange or None): Only keep entries within this time range.
+        merge (bool): Whether to interleave the entries of the files by time.
+
+    Returns:
+        tuple: A tuple containing (RecordStore with the parsed data, parser instance).
+    """
+    parser = get_parser_for_format(format_type)
+    parsed_data = RecordStore()
+    config = getattr(parser, 'analysis_config', {})
+    if config:
+        parsed_data.aggregates = StreamingAnalyzer(config)
+    store_records(parsed_data, iter_log_records(file_paths, format_type, parser, line_filter, time_range,
+                                                totals=parsed_data, merge=merge))
+    return parsed_data, parser
 
 
-def process_log_file(file_path, format_type):
+def process_log_file(file_path, format_type, line_filter=None, time_range=None):
     """
     Select the appropriate parser based on the given format and process the file.
 
     Args:
         file_path (str): Path to the log file to be processed.
         format_type (str): Log file format.
+        line_filter (LineFilter or None): Only keep lines that match this filter.
+        time_range (TimeRange or None): Only keep entries within this time range.
+
+    Returns:
+        tuple: A tuple containing (RecordStore with the parsed data, parser instance).
+    """
+    return process_log_files([file_path], format_type, line_filter, time_range)
+
+
+def analyze_log_files(file_paths, format_type, line_filter=None, time_range=None, analysis_fields=None):
+    """
+    Parse and analyze one or more log files in a single streaming pass without keeping the records.
+
+    Args:
+        file_paths (list): Paths of the log files, in the order they are read.
+        format_type (str): Log file format.
+        line_filter (LineFilter or None): Only analyze lines that match this filter.
+        time_range (TimeRange or None): Only analyze entries within this time range.
+        analysis_fields (iterable or None): Only run the analyses of these fields.
+
+    Returns:
+        tuple: A tuple containing (StreamingAnalyzer, parser instance).
+    """
+    parser = get_analysis_parser(format_type, line_filter.fields if line_filter else (), analysis_fields)
+    analyzer = StreamingAnalyzer(getattr(parser, 'analysis_config', {}))
+    with current_stats().timer("analysis"):
+        for record in iter_log_records(file_paths, format_type, parser, line_filter, time_range,
+                                       totals=analyzer):
+            analyzer.update(record)
+    return analyzer, parser
+
+
+def group_log_files(file_paths, format_type, aggregator, line_filter=None, time_range=None):
+    """
+    Parse one or more log files and feed their entries into a group-by aggregation
+    in a single streaming pass without keeping the records.
+
+    Args:
+        file_paths (list): Paths of the log files, in the order they are read.
+        format_type (str): Log file format.
+        aggregator (GroupByAggregator): The aggregation to fill.
+        line_filter (LineFilter or None): Only group lines that match this filter.
+        time_range (TimeRange or None): Only group entries within this time range.
 
     Returns:
-        tuple: A tuple containing (list of parsed data, parser instance).
+        GroupByAggregator: The filled aggregation.
     """
     parser = get_parser_for_format(format_type)
-    parsed_data = []
-    line_number = 0
-    for line in read_log_file(file_path):
-        line_number += 1
-        parsed_line = parser.parse_line(line)
-        if parsed_line and 'timestamp' in parsed_line:
-            try:
-                parsed_line['timestamp'] = convert_to_standard_timestamp(
-                    parsed_line['timestamp'], parser)
-                parsed_data.append(parsed_line)
-            except ValueError as e:
-                print(f"Warning: Skipping line {line_number} due to timestamp error. Details: {e}")
-                
-    return parsed_data, parser
\ No newline at end of file
+    parser.select_fields(['timestamp', *aggregator.fields, *([aggregator.sum_field] if aggregator.sum_field else ()),
+                          *(line_filter.fields if line_filter else ())])
+    records = iter_log_records(file_paths, format_type, parser, line_filter, time_range, totals=aggregator)
+    stats = current_stats()
+    while True:
+        # Parsing the records happens inside this timer, but the timers are exclusive
+        with stats.timer("analysis"):
+            batch = list(islice(records, PARSE_BATCH_SIZE))
+            aggregator.update_batch(batch)
+        if not batch:
+            break
+    return aggregator
+
+
+def analyze_log_file(file_path, format_type, line_filter=None, time_range=None):
+    """
+    Parse and analyze a log file in a single streaming pass without keeping the records.
+
+    Args:
+        file_path (str): Path to the log file to be analyzed.
+        format_type (str): Log file format.
+        line_filter (LineFilter or None): Only analyze lines that match this filter.
+        time_range (TimeRange or None): Only analyze entries within this time range.
+
+    Returns:
+        tuple: A tuple containing (StreamingAnalyzer, parser instance).
+    """
+    return analyze_log_files([file_path], format_type, line_filter, time_range)
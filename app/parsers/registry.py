@@ -0,0 +1,270 @@
+import importlib
+import json
+import os
+import re
+from functools import lru_cache
+from .log_format import LogFormat
+from .base_parser import BaseParser
+from .split_parser import SplitParser
+from utils import (get_range, time_difference, get_counts, rate_per_minute, rate_per_hour,
+                   top_counts_per_hour, get_percentiles)
+from analysis import ApproximateTopValues, ApproximateDistinctCount
+
+# Module and class of the built-in parser for each format. A parser module (and its
+# compiled patterns) is only imported once its format is used.
+BUILTIN_PARSERS = {
+    LogFormat.CLF.value: (".clf_parser", "CLFParser"),
+    LogFormat.SYSLOG.value: (".syslog_parser", "SyslogParser"),
+    LogFormat.SYSTEMD.value: (".systemd_journal_parser", "SystemdJournalParser"),
+    LogFormat.JSON.value: (".json_parser", "JSONParser"),
+}
+
+# Environment variable with format files, separated like PATH. Worker processes
+# inherit it, so they see the same formats as the main process.
+FORMATS_ENV = "LOGLOOM_FORMATS"
+
+# Format file that is read when it exists
+DEFAULT_FORMATS_FILE = os.path.join(os.path.expanduser("~"), ".config", "logloom", "formats.json")
+
+# Entry point group through which installed packages provide formats
+ENTRY_POINT_GROUP = "logloom.parsers"
+
+# Analyses a format file can name in its "analysis" section
+ANALYSIS_FUNCTIONS = {function.__name__: function for function in (
+    get_range, time_difference, get_counts, rate_per_minute, rate_per_hour,
+    top_counts_per_hour, get_percentiles)}
+
+# Parameterized analyses, named with their arguments, e.g. {"ApproximateTopValues": {"k": 5}}
+ANALYSIS_CLASSES = {cls.__name__: cls for cls in (ApproximateTopValues, ApproximateDistinctCount)}
+
+
+def formats_files():
+    """Return the format files of this run: those in LOGLOOM_FORMATS, then the default file."""
+    paths = [path for path in os.environ.get(FORMATS_ENV, "").split(os.pathsep) if path]
+    if os.path.isfile(DEFAULT_FORMATS_FILE):
+        paths.append(DEFAULT_FORMATS_FILE)
+    return paths
+
+
+def add_formats_file(file_path):
+    """
+    Make the formats of a file available, e.g. for --formats-file.
+
+    Args:
+        file_path (str): Path to a JSON format file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(file_path)
+    paths = [path for path in os.environ.get(FORMATS_ENV, "").split(os.pathsep) if path]
+    os.environ[FORMATS_ENV] = os.pathsep.join(paths + [os.path.abspath(file_path)])
+    _declared_formats.cache_clear()
+    compile_format.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _declared_formats(paths):
+    """
+    Read the format specs of the given files. The first file that declares a name wins.
+
+    Returns:
+        dict: Format name -> (spec, file path).
+    """
+    specs = {}
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as file:
+                formats = json.load(file)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"The format file '{path}' is not valid JSON: {e}")
+        if not isinstance(formats, dict):
+            raise ValueError(f"The format file '{path}' must contain an object of formats.")
+        for name, spec in formats.items():
+            specs.setdefault(name, (spec, path))
+    return specs
+
+
+def declared_formats():
+    """Return the formats declared in format files as {name: (spec, file path)}."""
+    return _declared_formats(tuple(formats_files()))
+
+
+def plugin_entry_points():
+    """Return the installed entry points of the logloom.parsers group by name, without loading them."""
+    # Imported here: reading package metadata is only needed when plugins are looked up
+    from importlib.metadata import entry_points
+    return {entry_point.name: entry_point for entry_point in entry_points(group=ENTRY_POINT_GROUP)}
+
+
+def available_formats():
+    """
+    Return the names of all formats: built-in ones first, then declared ones and plugins.
+
+    Returns:
+        list: Format names, in the order --format auto tries them.
+    """
+    names = list(BUILTIN_PARSERS)
+    for name in [*declared_formats(), *plugin_entry_points()]:
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def resolve_analysis(entry, format_name):
+    """Turn an analysis named in a format spec into the analysis function or object."""
+    if isinstance(entry, str) and entry in ANALYSIS_FUNCTIONS:
+        return ANALYSIS_FUNCTIONS[entry]
+    if isinstance(entry, str) and entry in ANALYSIS_CLASSES:
+        return ANALYSIS_CLASSES[entry]()
+    if isinstance(entry, dict) and len(entry) == 1:
+        (name, arguments), = entry.items()
+        if name in ANALYSIS_CLASSES and isinstance(arguments, dict):
+            return ANALYSIS_CLASSES[name](**arguments)
+    raise ValueError(f"Format '{format_name}': unknown analysis {entry!r}. Known analyses: "
+                     f"{', '.join([*ANALYSIS_FUNCTIONS, *ANALYSIS_CLASSES])}.")
+
+
+def compile_analysis_config(config, format_name):
+    """
+    Build an analysis_config from its declarative form. Keys naming several fields
+    (e.g. "timestamp,status") become tuple keys.
+    """
+    analysis_config = {}
+    for key, entries in config.items():
+        fields = tuple(field.strip() for field in key.split(','))
+        analysis_config[fields if len(fields) > 1 else fields[0]] = [
+            resolve_analysis(entry, format_name) for entry in entries]
+    return analysis_config
+
+
+def compile_field_layout(fields, format_name):
+    """
+    Build the field_layout of a SplitParser. A field is given as "name", as "name:N"
+    for a field spanning N tokens, or as {"name": ..., "tokens": N, "strip": "[]"}.
+    """
+    layout = []
+    for field in fields:
+        if isinstance(field, str):
+            name, _, tokens = field.partition(':')
+            field = {"name": name, "tokens": int(tokens) if tokens.isdigit() else tokens or 1}
+        tokens = field.get("tokens", 1)
+        if (not isinstance(field.get("name"), str) or not field["name"] or not isinstance(tokens, int)
+                or tokens < 1 or not isinstance(field.get("strip", ""), str)):
+            raise ValueError(f"Format '{format_name}': invalid split field {field!r}.")
+        layout.append((field["name"], tokens, field.get("strip")))
+    if not layout:
+        raise ValueError(f"Format '{format_name}': a split spec needs at least one field.")
+    return tuple(layout)
+
+
+def compile_spec(name, spec):
+    """
+    Compile a declarative format spec into a parser class.
+
+    A spec has either a "pattern" (a regular expression with named groups) or a
+    "split" layout ({"separator": " ", "fields": [...]}), and optionally
+    "timestamp_formats", "timestamp_layout", "raw_field_prefixes" and "analysis".
+
+    Args:
+        name (str): The format name.
+        spec (dict): The declarative spec.
+
+    Returns:
+        type: A BaseParser subclass.
+
+    Raises:
+        ValueError: If the spec is invalid.
+    """
+    if not isinstance(spec, dict) or ("pattern" in spec) == ("split" in spec):
+        raise ValueError(f"Format '{name}' needs either a 'pattern' or a 'split' spec.")
+
+    timestamp_formats = spec.get("timestamp_formats", [])
+    if isinstance(timestamp_formats, str):
+        timestamp_formats = [timestamp_formats]
+    attributes = {
+        "__doc__": f"Parser for the {name} format, compiled from its declarative spec.",
+        "timestamp_formats": list(timestamp_formats),
+        "timestamp_layout": spec.get("timestamp_layout"),
+        # Timestamps without a year get the current one, like Systemd timestamps
+        "timestamp_without_year": bool(timestamp_formats) and not any(
+            '%Y' in fmt or '%y' in fmt for fmt in timestamp_formats),
+        "raw_field_prefixes": dict(spec.get("raw_field_prefixes", {})),
+        "analysis_config": compile_analysis_config(spec.get("analysis", {}), name),
+    }
+
+    if "pattern" in spec:
+        try:
+            attributes["pattern"] = re.compile(spec["pattern"])
+        except re.error as e:
+            raise ValueError(f"Format '{name}': invalid pattern: {e}")
+        base = BaseParser
+    else:
+        split = spec["split"]
+        separator = split.get("separator", ' ')
+        if separator is not None and (not isinstance(separator, str) or not separator):
+            raise ValueError(f"Format '{name}': the separator must be a non-empty string or null.")
+        attributes["separator"] = separator
+        attributes["field_layout"] = compile_field_layout(split.get("fields", []), name)
+        base = SplitParser
+    class_name = re.sub(r'\W', '', name.title()) + "Parser"
+    return type(class_name, (base,), attributes)
+
+
+@lru_cache(maxsize=None)
+def compile_format(name):
+    """
+    Return the parser class of a format, compiling it on first use.
+
+    Built-in formats win over declared ones, and declared ones over plugins. Entry
+    points are only looked up for names that are neither built in nor declared, so
+    plugins cost nothing unless they are selected.
+
+    Args:
+        name (str): The format name.
+
+    Returns:
+        type: A BaseParser subclass.
+
+    Raises:
+        ValueError: If the format is unknown or its spec is invalid.
+    """
+    if name in BUILTIN_PARSERS:
+        module_name, class_name = BUILTIN_PARSERS[name]
+        module = importlib.import_module(module_name, __package__)
+        return getattr(module, class_name)
+
+    declared = declared_formats()
+    if name in declared:
+        spec, path = declared[name]
+        try:
+            return compile_spec(name, spec)
+        except ValueError as e:
+            raise ValueError(f"{e} (in '{path}')")
+
+    entry_point = plugin_entry_points().get(name)
+    if entry_point is not None:
+        provided = entry_point.load()
+        if isinstance(provided, dict):
+            return compile_spec(name, provided)
+        if isinstance(provided, type) and issubclass(provided, BaseParser):
+            return provided
+        raise ValueError(f"The plugin '{entry_point.value}' of the format '{name}' "
+                         f"must provide a BaseParser subclass or a spec dict.")
+
+    raise ValueError(f"Unsupported log format: {name}. Available formats: "
+                     f"{', '.join(available_formats())}.")
+
+
+def create_parser(name):
+    """
+    Return a new parser instance for a format.
+
+    Args:
+        name (str): The format name (e.g., "CLF", or a declared format).
+
+    Returns:
+        BaseParser: An instance of the format's parser.
+    """
+    return compile_format(name)()
@@ -0,0 +1,84 @@
+from .base_parser import BaseParser
+
+
+class SplitParser(BaseParser):
+    """
+    Parser for logs with a fixed layout, where the fields are separated by a separator
+    and never contain it. Splitting the line is much cheaper than matching
+    a regular expression.
+
+    Subclasses are usually created by the format registry from a declarative "split"
+    spec (see registry.py) and set separator and field_layout.
+    """
+    pattern = None
+
+    # Separator of the fields; None splits on runs of whitespace
+    separator = ' '
+
+    # Tuple of (name, number of tokens, characters to strip) per field. A field of
+    # several tokens is joined with the separator, and the last field takes the rest
+    # of the line. Fields named '-' are skipped.
+    field_layout = ()
+
+    def __init__(self, fields=None):
+        """
+        Args:
+            fields (iterable or None): Projection of the fields to keep, or None for all.
+        """
+        self.token_count = sum(tokens for _, tokens, _ in self.field_layout)
+        self.select_fields(fields)
+
+    def select_fields(self, fields):
+        """Restrict the parsed records to the given fields and build the splitter for them."""
+        super().select_fields(fields)
+        self._split_lines = self.build_splitter()
+
+    def build_splitter(self):
+        """
+        Generate a function that splits a batch of lines for this layout.
+
+        The field accesses are written out as one expression per record (like
+        collections.namedtuple does), so no per-field loop runs for each line.
+
+        Returns:
+            func: Function taking a list of lines and returning one record or None per line.
+        """
+        joiner = ' ' if self.separator is None else self.separator
+        items = []
+        start = 0
+        last = len(self.field_layout) - 1
+        for index, (name, tokens, strip) in enumerate(self.field_layout):
+            if name != '-' and (self.fields is None or name in self.fields):
+                if tokens == 1:
+                    value = f"t[{start}]"
+                elif index == last:
+                    # The last token holds the rest of the line
+                    value = f"{joiner!r}.join(t[{start}:])"
+                else:
+                    value = f"{joiner!r}.join(t[{start}:{start + tokens}])"
+                if strip:
+                    value = f"{value}.strip({strip!r})"
+                items.append(f"{name!r}: {value}")
+            start += tokens
+        max_split = self.token_count - 1
+        source = (f"def split_lines(lines):\n"
+                  f"    return [{{{', '.join(items)}}} if len(t := line.split({self.separator!r}, {max_split})) > {max_split}"
+                  f" else None for line in lines]\n")
+        namespace = {}
+        exec(source, namespace)
+        return namespace['split_lines']
+
+    def parse_line(self, line):
+        return self.parse_lines([line])[0]
+
+    def parse_lines(self, lines):
+        """
+        Split a batch of lines into their fields.
+
+        Args:
+            lines (list): Lines from the log file.
+
+        Returns:
+            list: One parsed record (or None if the line has too few fields) per line.
+        """
+        return self._split_lines(self.strip_ansi(lines))
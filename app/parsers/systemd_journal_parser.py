@@ -1,20 +1,27 @@
 import re
 from .base_parser import BaseParser
-from utils import get_range, time_difference, get_counts
+from utils import get_range, time_difference, get_counts, rate_per_minute
+from analysis import ApproximateTopValues, ApproximateDistinctCount
 
 class SystemdJournalParser(BaseParser):
     """
     Parser for the Systemd Journal format.
     """
     # Timestamp format used in Systemd logs
-    timestamp_format = "%b %d %H:%M:%S"
+    timestamp_formats = ["%b %d %H:%M:%S"]
+
+    # Fixed layout that allows the timestamp normalizer to slice instead of calling strptime
+    timestamp_layout = "systemd"
+
+    # The timestamps do not contain a year, so the normalizer uses the current one
+    timestamp_without_year = True
 
     # Analysis configuration for Systemd data
     analysis_config = {
-        "timestamp": [get_range, time_difference],
+        "timestamp": [get_range, time_difference, rate_per_minute],
         "hostname": [get_counts],
         "service": [get_counts],
-        "pid": [get_counts]
+        "pid": [ApproximateTopValues(), ApproximateDistinctCount()]
     }
 
     # Regular expression to parse the syslog format
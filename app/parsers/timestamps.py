@@ -0,0 +1,249 @@
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# Mapping for English month abbreviations, independent of the locale
+MONTH_MAP = {
+    'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04', 'May': '05', 'Jun': '06',
+    'Jul': '07', 'Aug': '08', 'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
+}
+
+MONTH_NUMBERS = {abbr: int(number) for abbr, number in MONTH_MAP.items()}
+
+MONTH_PATTERN = re.compile(r"([A-Z][a-z]{2})")
+
+STANDARD_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Numeric timestamps at or above this value are epoch milliseconds rather than
+# seconds (1e11 seconds is in the year 5138)
+EPOCH_MILLISECONDS = 10 ** 11
+
+
+def _is_number(text):
+    return text.isascii() and text.isdigit()
+
+
+def _standard_timestamp(year, month, day, hour, minute, second):
+    """
+    Validate the date parts like strptime would and format them as "YYYY-MM-DD HH:MM:SS".
+    Returns None if the parts do not form a valid date.
+    """
+    try:
+        datetime(year, month, day, hour, minute, second)
+    except ValueError:
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
+
+
+def epoch_to_standard(epoch):
+    """
+    Convert a numeric Unix timestamp (e.g. the "ts" of a JSON log) in seconds or
+    milliseconds to the standard format in UTC.
+
+    Args:
+        epoch (int or float): Seconds or milliseconds since 1970-01-01 UTC.
+
+    Returns:
+        str or None: The standardized timestamp, or None if it is out of range.
+    """
+    if abs(epoch) >= EPOCH_MILLISECONDS:
+        epoch = epoch / 1000
+    try:
+        return datetime.fromtimestamp(epoch, timezone.utc).strftime(STANDARD_FORMAT)
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def parse_clf_layout(timestamp_str):
+    """
+    Fast path for CLF timestamps of the layout "DD/Mon/YYYY HH:MM:SS" with an
+    optional " +zzzz" offset. Fixed positions are sliced instead of calling strptime.
+
+    Args:
+        timestamp_str (str): Timestamp string to be converted.
+
+    Returns:
+        str or None: The standardized timestamp, or None if the layout does not fit.
+    """
+    length = len(timestamp_str)
+    if length == 26:
+        offset = timestamp_str[21:26]
+        if (timestamp_str[20] != ' ' or offset[0] not in '+-' or not _is_number(offset[1:])
+                or int(offset[1:3]) > 23 or int(offset[3:5]) > 59):
+            return None
+    elif length != 20:
+        return None
+
+    if (timestamp_str[2] != '/' or timestamp_str[6] != '/' or timestamp_str[11] != ' '
+            or timestamp_str[14] != ':' or timestamp_str[17] != ':'):
+        return None
+
+    month = MONTH_NUMBERS.get(timestamp_str[3:6])
+    day, year = timestamp_str[0:2], timestamp_str[7:11]
+    hour, minute, second = timestamp_str[12:14], timestamp_str[15:17], timestamp_str[18:20]
+    if month is None or not _is_number(day + year + hour + minute + second) or year[0] == '0':
+        return None
+
+    return _standard_timestamp(int(year), month, int(day), int(hour), int(minute), int(second))
+
+
+def parse_systemd_layout(timestamp_str):
+    """
+    Fast path for Systemd timestamps of the layout "Mon DD HH:MM:SS". The log line does
+    not contain a year, so the current year is used.
+
+    Args:
+        timestamp_str (str): Timestamp string to be converted.
+
+    Returns:
+        str or None: The standardized timestamp, or None if the layout does not fit.
+    """
+    if (len(timestamp_str) != 15 or timestamp_str[3] != ' ' or timestamp_str[6] != ' '
+            or timestamp_str[9] != ':' or timestamp_str[12] != ':'):
+        return None
+
+    month = MONTH_NUMBERS.get(timestamp_str[0:3])
+    day = timestamp_str[4:6]
+    hour, minute, second = timestamp_str[7:9], timestamp_str[10:12], timestamp_str[13:15]
+    if month is None or not _is_number(day + hour + minute + second):
+        return None
+
+    # strptime defaults to the year 1900 when no year is given, so validate against it
+    # (e.g. Feb 29 is rejected). Every date that is valid in 1900 exists in any year.
+    if _standard_timestamp(1900, month, int(day), int(hour), int(minute), int(second)) is None:
+        return None
+    return f"{datetime.now().year:04d}-{month:02d}-{day} {hour}:{minute}:{second}"
+
+
+def parse_iso_layout(timestamp_str):
+    """
+    Conversion of ISO 8601 timestamps (e.g. RFC 5424 syslog or the "ts" of a JSON log)
+    such as "2023-10-10T00:00:01.261Z". Fractions of a second are cut off and
+    timestamps with an offset are converted to UTC.
+
+    Returns:
+        str or None: The standardized timestamp, or None if the string is not ISO 8601.
+    """
+    if not is_iso_date(timestamp_str):
+        return None
+    if timestamp_str[-1] in 'Zz':
+        timestamp_str = timestamp_str[:-1] + '+00:00'
+    try:
+        datetime_obj = datetime.fromisoformat(timestamp_str)
+    except ValueError:
+        return None
+    if datetime_obj.tzinfo is not None:
+        datetime_obj = datetime_obj.astimezone(timezone.utc)
+    return datetime_obj.strftime(STANDARD_FORMAT)
+
+
+def is_iso_date(text):
+    """Check whether a string starts like an ISO 8601 date ("YYYY-MM-DD")."""
+    return len(text) >= 10 and text[4] == '-' and text[7] == '-' and text[:4].isdigit()
+
+
+def is_standard_timestamp(value):
+    """Check whether a value has the shape of the standard format "YYYY-MM-DD HH:MM:SS"."""
+    return (type(value) is str and len(value) == 19 and value[4] == '-' and value[7] == '-'
+            and value[10] == ' ' and value[13] == ':' and value[16] == ':')
+
+
+# Fixed-layout fast paths, selected through a parser's timestamp_layout attribute
+FAST_PATHS = {
+    'clf': parse_clf_layout,
+    'systemd': parse_systemd_layout,
+}
+
+
+class TimestampNormalizer:
+    """
+    Converts the timestamps of one parser to the standard format "YYYY-MM-DD HH:MM:SS".
+
+    Conversion happens in three stages:
+    1. An LRU cache keyed on the timestamp string. The supported layouts have a
+       resolution of one second, so busy logs repeat the same key many times.
+    2. A fixed-layout fast path for CLF and Systemd timestamps.
+    3. The generic strptime conversion over the parser's timestamp_formats, starting
+       with the format that matched last.
+
+    Parsers without timestamp_formats only get ISO 8601 timestamps converted; strings
+    that do not start with an ISO date are passed through unchanged.
+    """
+
+    def __init__(self, parser, cache_size=4096):
+        formats = getattr(parser, 'timestamp_formats', [])
+        if isinstance(formats, str):
+            formats = [formats]
+        self.formats = list(formats)
+        self.numeric_formats = [fmt.replace('%b', '%m') for fmt in self.formats]
+        self.fast_path = FAST_PATHS.get(getattr(parser, 'timestamp_layout', None))
+        self.use_current_year = getattr(parser, 'timestamp_without_year', False)
+        self.last_format_index = 0
+        self._convert_cached = lru_cache(maxsize=cache_size)(self._convert)
+
+    def normalize(self, timestamp_str):
+        """
+        Convert a timestamp string to the standard format. Numeric timestamps, which
+        e.g. JSON logs may contain, are taken as Unix time in UTC.
+
+        Args:
+            timestamp_str (str, int or float): Timestamp to be converted.
+
+        Returns:
+            str: Converted timestamp string in the format "YYYY-MM-DD HH:MM:SS".
+
+        Raises:
+            ValueError: If the timestamp does not match any known format, or is
+                neither a string nor a number.
+        """
+        if type(timestamp_str) is not str:
+            result = epoch_to_standard(timestamp_str) if type(timestamp_str) in (int, float) else None
+            if result is None:
+                raise ValueError(f"Time data {timestamp_str!r} is neither a date string nor a Unix timestamp.")
+            return result
+        if not self.formats and not is_iso_date(timestamp_str):
+            return timestamp_str
+
+        result = self._convert_cached(timestamp_str)
+        if result is None:
+            raise ValueError(f"Time data '{timestamp_str}' does not match any known format.")
+        return result
+
+    def _convert(self, timestamp_str):
+        if self.fast_path:
+            result = self.fast_path(timestamp_str)
+            if result is not None:
+                return result
+        if not self.formats:
+            return parse_iso_layout(timestamp_str)
+        return self._convert_with_formats(timestamp_str)
+
+    def _convert_with_formats(self, timestamp_str):
+        """
+        Generic conversion with strptime. Month names are replaced manually to be
+        locale-independent. Returns None if no format matches.
+        """
+        formats_to_try = self.formats
+        month_search = MONTH_PATTERN.search(timestamp_str)
+        if month_search:
+            month_abbr = month_search.group(1)
+            if month_abbr in MONTH_MAP:
+                timestamp_str = timestamp_str.replace(month_abbr, MONTH_MAP[month_abbr])
+                formats_to_try = self.numeric_formats
+
+        # Try the format that matched last before all others
+        order = [self.last_format_index] + [index for index in range(len(formats_to_try))
+                                            if index != self.last_format_index]
+        for index in order:
+            try:
+                datetime_obj = datetime.strptime(timestamp_str, formats_to_try[index])
+            except ValueError:
+                continue
+            self.last_format_index = index
+            if self.use_current_year:
+                try:
+                    datetime_obj = datetime_obj.replace(year=datetime.now().year)
+                except ValueError:
+                    return None
+            return datetime_obj.strftime(STANDARD_FORMAT)
+        return None
@@ -0,0 +1,120 @@
+import re
+from query import parse_query
+
+# A status filter entry: a full code ("404") or a class with trailing x ("5xx", "50x")
+STATUS_SPEC_PATTERN = re.compile(r'^(\d{1,3})(x*)$', re.IGNORECASE)
+
+
+def parse_status_spec(spec):
+    """
+    Parse a status filter such as "5xx", "404" or "4xx,503" into status code prefixes.
+
+    Args:
+        spec (str): Comma-separated status codes or classes.
+
+    Returns:
+        tuple: Prefixes a matching status code starts with (e.g. ("5",) for "5xx").
+
+    Raises:
+        ValueError: If an entry is not a three-character code or class.
+    """
+    prefixes = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        match = STATUS_SPEC_PATTERN.match(entry)
+        if not match or len(entry) != 3:
+            raise ValueError(f"Invalid status filter '{entry}'. Use codes like '404' or classes like '5xx'.")
+        prefixes.append(match.group(1))
+    return tuple(prefixes)
+
+
+class LineFilter:
+    """
+    Filters that run in front of the parsers.
+
+    Every filter has a cheap check on the raw line, which runs before ANSI stripping
+    and regex matching, so lines that cannot match are never parsed. Filters that
+    need a parsed field additionally check the record exactly afterwards.
+    """
+
+    def __init__(self, substrings=(), status=None, query=None):
+        """
+        Args:
+            substrings (iterable): Literal substrings that must all occur in the line.
+            status (str or None): Status filter such as "5xx" or "404,503".
+            query (str or None): Query the parsed records must match, e.g. 'status>=500 AND method=GET'.
+
+        Raises:
+            ValueError: If the status filter or the query is invalid.
+        """
+        self.substrings = tuple(substring.encode() for substring in substrings)
+        self.status_prefixes = parse_status_spec(status) if status else ()
+        self.raw_status_needles = ()
+        self.query = parse_query(query) if query else None
+        # Records are filtered before their timestamps are normalized
+        if self.query is not None and 'timestamp' in self.query.fields():
+            raise ValueError("--query cannot filter on the timestamp. Use --since and --until instead.")
+
+    @property
+    def fields(self):
+        """Fields that the record check needs in the parsed records."""
+        fields = ('status',) if self.status_prefixes else ()
+        if self.query is not None:
+            fields += tuple(sorted(self.query.fields() - set(fields)))
+        return fields
+
+    def bind(self, parser):
+        """
+        Prepare the raw-line checks for a parser.
+
+        Parsers that know which text precedes a field in the raw line declare it in
+        raw_field_prefixes (e.g. the CLF status follows the closing quote of the
+        request). Only then can the status filter reject lines before parsing.
+
+        Args:
+            parser (BaseParser): The parser the filter is used with.
+
+        Returns:
+            LineFilter: The filter itself.
+        """
+        prefix = getattr(parser, 'raw_field_prefixes', {}).get('status')
+        if prefix is not None:
+            self.raw_status_needles = tuple((prefix + status).encode() for status in self.status_prefixes)
+        else:
+            self.raw_status_needles = ()
+        return self
+
+    def match_line(self, line):
+        """
+        Cheap check on the raw, not yet decoded line. False means the line can be skipped.
+
+        Args:
+            line (bytes): A raw line from the log file.
+
+        Returns:
+            bool: Whether the line may match the filter.
+        """
+        for substring in self.substrings:
+            if substring not in line:
+                return False
+        if self.raw_status_needles and b'\x1b' not in line:
+            return any(needle in line for needle in self.raw_status_needles)
+        return True
+
+    def match_record(self, record):
+        """
+        Exact check on a parsed record.
+
+        Args:
+            record (dict): A parsed log entry.
+
+        Returns:
+            bool: Whether the record matches the filter.
+        """
+        if self.status_prefixes:
+            status = str(record.get('status', ''))
+            if len(status) != 3 or not status.startswith(self.status_prefixes):
+                return False
+        if self.query is not None:
+            return self.query.matches(record)
+        return True
@@ -0,0 +1,435 @@
+import ipaddress
+import operator
+import re
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from record_store import DictionaryColumn, TimestampColumn, MISSING
+from time_index import parse_time_bound
+from utils import to_number
+
+# Tokens of a query: parentheses, comparison operators, quoted strings and bare words
+TOKEN_PATTERN = re.compile(r'\s*(?:(?P<paren>[()])|(?P<operator>>=|<=|!=|!~|=|<|>|~)'
+                           r'|"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<word>[^\s()=!<>~"]+))')
+
+COMPARISONS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# Operators whose value is a regular expression searched in the field
+REGEX_OPERATORS = ('~', '!~')
+
+# Cost classes of the query planner, cheapest first. A predicate answered from an
+# inverted index or by bisection is always evaluated before one that has to look at
+# every candidate row, and a regular expression search goes last.
+INDEXED, SCANNED, SCANNED_REGEX = 0, 1, 2
+
+
+class Predicate:
+    """
+    A comparison of one field with a value, e.g. status>=500, ip=10.0.0.0/8 or request~"/api/".
+
+    Numbers are compared numerically, a network in CIDR notation with = and != tests
+    whether an IP address belongs to it, ~ and !~ search a regular expression, and
+    everything else is compared as text. Timestamps are compared as points in time;
+    a date without a time means the start of the day, or its end for <= and >.
+    Entries without the field never match.
+    """
+
+    def __init__(self, field, operator_symbol, value):
+        """
+        Raises:
+            ValueError: If the value is not valid for the operator.
+        """
+        self.field = field
+        self.operator = operator_symbol
+        self.value = value
+        self.epoch = None
+        if field == 'timestamp' and operator_symbol in COMPARISONS:
+            self.value = parse_time_bound(value, end_of_day=operator_symbol in ('<=', '>'))
+            self.epoch = TimestampColumn.to_epoch(self.value)
+        self.test = self.compile_test()
+        # Codes of the dictionary values that match: (column, number of values, codes)
+        self._codes = (None, 0, frozenset())
+
+    def __reduce__(self):
+        # The compiled test is a closure; workers of --workers rebuild it from the text
+        return (Predicate, (self.field, self.operator, self.value))
+
+    def __str__(self):
+        value = self.value.replace('\\', '\\\\').replace('"', '\\"')
+        return f'{self.field}{self.operator}"{value}"'
+
+    def compile_test(self):
+        """Return a function that tests a present field value."""
+        value = self.value
+        if self.operator in REGEX_OPERATORS:
+            try:
+                search = re.compile(value).search
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression '{value}': {e}")
+            if self.operator == '~':
+                return lambda item: search(str(item)) is not None
+            return lambda item: search(str(item)) is None
+
+        compare = COMPARISONS[self.operator]
+        if self.operator in ('=', '!=') and '/' in value:
+            try:
+                network = ipaddress.ip_network(value, strict=False)
+            except ValueError:
+                network = None
+            if network is not None:
+                inside = self.operator == '='
+
+                def in_network(item):
+                    try:
+                        return (ipaddress.ip_address(str(item)) in network) == inside
+                    except ValueError:
+                        return False
+                return in_network
+
+        number = to_number(value)
+        if number is not None and self.epoch is None:
+            def compare_number(item):
+                item = to_number(item)
+                return item is not None and compare(item, number)
+            return compare_number
+        return lambda item: compare(str(item), value)
+
+    def fields(self):
+        return {self.field}
+
+    def matches(self, record):
+        """Whether a single parsed record matches."""
+        value = record.get(self.field, MISSING)
+        return value is not MISSING and self.test(value)
+
+    def matching_codes(self, column):
+        """
+        Return the codes of a dictionary column whose values match, testing each
+        distinct value once. Values added to the column later are tested on the next call.
+        """
+        cached_column, value_count, codes = self._codes
+        if cached_column is not column:
+            value_count, codes = 1, frozenset()
+        values = column.values
+        if value_count != len(values):
+            test = self.test
+            codes = codes.union(code for code in range(value_count, len(values)) if test(values[code]))
+            self._codes = (column, len(values), codes)
+        return codes
+
+    def epoch_ranges(self, column):
+        """Return the (start, stop) row ranges of a sorted timestamp column that match."""
+        epochs, target = column.epochs, self.epoch
+        if self.operator == '>=':
+            return [(bisect_left(epochs, target), len(epochs))]
+        if self.operator == '>':
+            return [(bisect_right(epochs, target), len(epochs))]
+        if self.operator == '<':
+            return [(0, bisect_left(epochs, target))]
+        if self.operator == '<=':
+            return [(0, bisect_right(epochs, target))]
+        start, stop = bisect_left(epochs, target), bisect_right(epochs, target)
+        if self.operator == '=':
+            return [(start, stop)]
+        return [(0, start), (stop, len(epochs))]
+
+    def uses_epochs(self, column):
+        return isinstance(column, TimestampColumn) and self.epoch is not None
+
+    def estimate(self, store):
+        """
+        Estimate the cost of the predicate on a store.
+
+        Returns:
+            tuple: (cost class, number of rows) used to order the predicates of a query.
+        """
+        column = store.columns.get(self.field)
+        if column is None:
+            return (INDEXED, 0)
+        if isinstance(column, DictionaryColumn):
+            postings = column.postings()
+            return (INDEXED, sum(len(postings[code]) for code in self.matching_codes(column) if code in postings))
+        if self.uses_epochs(column) and column.is_sorted():
+            return (INDEXED, sum(stop - start for start, stop in self.epoch_ranges(column)))
+        return (SCANNED_REGEX if self.operator in REGEX_OPERATORS else SCANNED, len(store))
+
+    def rows(self, store, candidates=None):
+        """
+        Return the matching rows of a store.
+
+        Args:
+            store (RecordStore): The parsed log entries.
+            candidates (list or None): Ascending row numbers to check, or None for all rows.
+
+        Returns:
+            list: The matching row numbers in ascending order.
+        """
+        column = store.columns.get(self.field)
+        if column is None:
+            return []
+        if isinstance(column, DictionaryColumn):
+            codes = self.matching_codes(column)
+            if candidates is None:
+                postings = column.postings()
+                return sorted(chain.from_iterable(postings[code] for code in codes if code in postings))
+            column_codes = column.codes
+            return [row for row in candidates if column_codes[row] in codes]
+        if self.uses_epochs(column):
+            if candidates is None and column.is_sorted():
+                return list(chain.from_iterable(range(start, stop) for start, stop in self.epoch_ranges(column)))
+            epochs, target, missing = column.epochs, self.epoch, column.MISSING_VALUE
+            compare = COMPARISONS[self.operator]
+            rows = range(len(store)) if candidates is None else candidates
+            return [row for row in rows if epochs[row] != missing and compare(epochs[row], target)]
+        test, get = self.test, column.get
+        rows = range(len(store)) if candidates is None else candidates
+        return [row for row in rows if (value := get(row)) is not MISSING and test(value)]
+
+
+class And:
+    """All of the conditions match. The cheapest condition is evaluated first."""
+
+    def __init__(self, children):
+        self.children = children
+
+    def __str__(self):
+        return "(" + " AND ".join(str(child) for child in self.children) + ")"
+
+    def fields(self):
+        return set().union(*(child.fields() for child in self.children))
+
+    def matches(self, record):
+        return all(child.matches(record) for child in self.children)
+
+    def plan(self, store):
+        """Return the conditions in the order they are evaluated on a store."""
+        return sorted(self.children, key=lambda child: child.estimate(store))
+
+    def estimate(self, store):
+        return min(child.estimate(store) for child in self.children)
+
+    def rows(self, store, candidates=None):
+        # Each condition only checks the rows that passed the cheaper ones before it
+        for child in self.plan(store):
+            candidates = child.rows(store, candidates)
+            if not candidates:
+                break
+        return candidates
+
+
+class Or:
+    """At least one of the conditions matches."""
+
+    def __init__(self, children):
+        self.children = children
+
+    def __str__(self):
+        return "(" + " OR ".join(str(child) for child in self.children) + ")"
+
+    def fields(self):
+        return set().union(*(child.fields() for child in self.children))
+
+    def matches(self, record):
+        return any(child.matches(record) for child in self.children)
+
+    def estimate(self, store):
+        estimates = [child.estimate(store) for child in self.children]
+        return (max(cost for cost, _ in estimates), min(len(store), sum(rows for _, rows in estimates)))
+
+    def rows(self, store, candidates=None):
+        matched = set()
+        for child in self.children:
+            matched.update(child.rows(store, candidates))
+        return sorted(matched)
+
+
+class Not:
+    """The condition does not match."""
+
+    def __init__(self, child):
+        self.child = child
+
+    def __str__(self):
+        return f"NOT {self.child}"
+
+    def fields(self):
+        return self.child.fields()
+
+    def matches(self, record):
+        return not self.child.matches(record)
+
+    def estimate(self, store):
+        cost, rows = self.child.estimate(store)
+        return (cost, max(0, len(store) - rows))
+
+    def rows(self, store, candidates=None):
+        excluded = set(self.child.rows(store, candidates))
+        rows = range(len(store)) if candidates is None else candidates
+        return [row for row in rows if row not in excluded]
+
+
+def tokenize(text):
+    """
+    Split a query into (kind, text) tokens.
+
+    Raises:
+        ValueError: If the query contains a character that cannot start a token.
+    """
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match:
+            raise ValueError(f"Unexpected '{text[position:].strip()[:20]}' in the query.")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'quoted':
+            value = re.sub(r'\\(.)', r'\1', value)
+        elif kind == 'word' and value.upper() in ('AND', 'OR', 'NOT'):
+            kind = value.upper()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class QueryParser:
+    """
+    Recursive descent parser for queries. NOT binds stronger than AND, AND stronger
+    than OR; AND may be left out between two conditions.
+    """
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self, kind=None):
+        if self.position >= len(self.tokens):
+            raise ValueError("The query ends unexpectedly.")
+        token_kind, value = self.tokens[self.position]
+        if kind is not None and token_kind != kind:
+            raise ValueError(f"Expected {kind} instead of '{value}' in the query.")
+        self.position += 1
+        return value
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("The query is empty.")
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected '{self.tokens[self.position][1]}' in the query.")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() in ('AND', 'NOT', 'word', 'paren') and self.tokens[self.position][1] != ')':
+            if self.peek() == 'AND':
+                self.take()
+            child = self.parse_not()
+            # Nested conjunctions are flattened, so the planner can order all conditions
+            children.extend(child.children if isinstance(child, And) else [child])
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self):
+        if self.peek() == 'NOT':
+            self.take()
+            return Not(self.parse_not())
+        if self.peek() == 'paren':
+            if self.take() != '(':
+                raise ValueError("Unexpected ')' in the query.")
+            node = self.parse_or()
+            if self.take('paren') != ')':
+                raise ValueError("Missing ')' in the query.")
+            return node
+        field = self.take('word')
+        operator_symbol = self.take('operator')
+        if self.peek() not in ('word', 'quoted'):
+            raise ValueError(f"Missing value after '{field}{operator_symbol}' in the query.")
+        return Predicate(field, operator_symbol, self.take())
+
+
+def parse_query(text):
+    """
+    Parse a query such as 'status>=500 AND ip=10.0.0.0/8 AND request~"/api/"'.
+
+    Args:
+        text (str): Conditions combined with AND, OR, NOT and parentheses.
+
+    Returns:
+        Predicate, And, Or or Not: The parsed query.
+
+    Raises:
+        ValueError: If the query is invalid.
+    """
+    return QueryParser(text).parse()
+
+
+class QueryEngine:
+    """
+    Answers queries over one RecordStore.
+
+    Conditions on dictionary-encoded fields (status, ip, level, ...) are answered
+    from inverted indexes, time conditions by bisection, and only the remaining
+    conditions look at the rows that are left. The indexes are built on first use
+    and kept, so repeated queries of an interactive session do not scan the data.
+    """
+
+    def __init__(self, store):
+        """
+        Args:
+            store (RecordStore): The parsed log entries.
+        """
+        self.store = store
+        # Parsed queries by text; a predicate keeps its matching codes between runs
+        self.queries = {}
+
+    def parse(self, text):
+        """
+        Parse a query and check its fields against the store.
+
+        Raises:
+            ValueError: If the query is invalid or names an unknown field.
+        """
+        query = self.queries.get(text)
+        if query is None:
+            query = parse_query(text)
+            unknown = sorted(field for field in query.fields() if field not in self.store)
+            if unknown:
+                raise ValueError(f"Unknown field '{unknown[0]}'. Available fields: "
+                                 f"{', '.join(self.store.keys())}.")
+            self.queries[text] = query
+        return query
+
+    def rows(self, text):
+        """
+        Return the row numbers of the entries matching a query, in ascending order.
+
+        Raises:
+            ValueError: If the query is invalid or names an unknown field.
+        """
+        return self.parse(text).rows(self.store)
+
+    def select(self, text):
+        """
+        Return the entries matching a query as a new RecordStore.
+
+        Raises:
+            ValueError: If the query is invalid or names an unknown field.
+        """
+        return self.store.select_rows(self.rows(text))
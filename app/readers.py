@@ -0,0 +1,349 @@
+import bz2
+import glob
+import gzip
+import lzma
+import os
+import queue
+import threading
+
+# zstd support is optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Size of the blocks read from disk. Large reads keep the number of system calls and
+# Python-level iterations per byte low.
+READ_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Leading bytes of the supported compressed formats. The file name is not used,
+# as rotated logs are not always named after their compression.
+COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+)
+
+# Number of decompressed blocks the reader thread may run ahead of the parser
+PREFETCH_BLOCKS = 4
+
+# Sidecar files that LogLoom writes next to the logs, never matched by glob patterns
+SIDECAR_SUFFIXES = ('.logloom-cache', '.logloom-index', '.logloom-export')
+
+_END_OF_FILE = object()
+
+
+def detect_compression(file_path):
+    """
+    Detect the compression of a file from its leading bytes.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        str or None: 'gzip', 'bz2', 'xz' or 'zstd', or None for an uncompressed file.
+    """
+    with open(file_path, 'rb') as file:
+        head = file.read(6)
+    for magic, compression in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_log_file(file_path):
+    """
+    Open a log file for binary reading, decompressing it transparently.
+
+    Args:
+        file_path (str): Path to the log file.
+
+    Returns:
+        file object: A binary file object that reads the uncompressed content.
+
+    Raises:
+        ValueError: If the file is zstd-compressed and zstandard is not installed.
+    """
+    compression = detect_compression(file_path)
+    if compression == 'gzip':
+        return gzip.open(file_path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(file_path, 'rb')
+    if compression == 'xz':
+        return lzma.open(file_path, 'rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError(f"'{file_path}' is zstd-compressed. Install the 'zstandard' package to read it.")
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(file_path, 'rb'), read_across_frames=True, closefd=True)
+    return open(file_path, 'rb')
+
+
+def expand_log_paths(pattern):
+    """
+    Expand a glob pattern (e.g. "access.log*") into the files of a rotated log set.
+
+    The files are ordered oldest first by modification time, so the entries are
+    read in the order they were written. A path without glob characters, or one
+    that exists as given, is returned unchanged.
+
+    Args:
+        pattern (str): Path to a log file or a glob pattern.
+
+    Returns:
+        list: Paths of the matching log files.
+
+    Raises:
+        FileNotFoundError: If the pattern matches no file.
+    """
+    if os.path.exists(pattern) or not glob.has_magic(pattern):
+        return [pattern]
+    paths = [path for path in glob.glob(pattern)
+             if os.path.isfile(path) and not path.endswith(SIDECAR_SUFFIXES)]
+    if not paths:
+        raise FileNotFoundError(pattern)
+    return sorted(paths, key=lambda path: (os.path.getmtime(path), path))
+
+
+def list_log_directory(directory):
+    """
+    Return the log files directly inside a directory, oldest first.
+
+    Hidden files and LogLoom's own sidecar files are skipped.
+
+    Args:
+        directory (str): Path to the directory.
+
+    Returns:
+        list: Paths of the log files.
+
+    Raises:
+        FileNotFoundError: If the directory contains no log file.
+    """
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)
+             if not name.startswith('.') and not name.endswith(SIDECAR_SUFFIXES)]
+    paths = [path for path in paths if os.path.isfile(path)]
+    if not paths:
+        raise FileNotFoundError(directory)
+    return sorted(paths, key=lambda path: (os.path.getmtime(path), path))
+
+
+def expand_log_inputs(inputs):
+    """
+    Expand the paths, glob patterns and directories given on the command line.
+
+    Each input is expanded on its own (see expand_log_paths and list_log_directory),
+    and the results are concatenated in the given order. A file that is matched by
+    several inputs is read only once.
+
+    Args:
+        inputs (list): Paths to log files, glob patterns or directories.
+
+    Returns:
+        list: Paths of the log files.
+
+    Raises:
+        FileNotFoundError: If an input matches no file.
+    """
+    paths, seen = [], set()
+    for item in inputs:
+        expanded = list_log_directory(item) if os.path.isdir(item) else expand_log_paths(item)
+        for path in expanded:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def iter_blocks(file, limit=None, buffer_size=READ_BUFFER_SIZE):
+    """
+    Read a binary file object in large blocks.
+
+    Args:
+        file (file object): A file opened in binary mode.
+        limit (int or None): Maximum number of bytes to read, or None to read to EOF.
+        buffer_size (int): Size of a single read.
+
+    Yields:
+        bytes: The next block.
+    """
+    while limit is None or limit > 0:
+        block = file.read(buffer_size if limit is None else min(buffer_size, limit))
+        if not block:
+            break
+        if limit is not None:
+            limit -= len(block)
+        yield block
+
+
+def prefetch_blocks(blocks, depth=PREFETCH_BLOCKS):
+    """
+    Produce blocks in a background thread while the caller processes earlier ones.
+
+    zlib, bz2 and lzma release the GIL while they decompress, so decompression and
+    parsing overlap. The bounded queue keeps at most depth blocks in memory. An
+    error in the reader thread is raised in the caller.
+
+    Args:
+        blocks (iterable): The blocks, e.g. from iter_blocks on a compressed file.
+        depth (int): Maximum number of blocks read ahead.
+
+    Yields:
+        bytes: The blocks in their original order.
+    """
+    pending = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+
+    def put(item):
+        # Give up when the consumer stopped early, instead of blocking forever
+        while not stopped.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for block in blocks:
+                if not put(block):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        put(_END_OF_FILE)
+
+    reader = threading.Thread(target=produce, name="logloom-reader", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _END_OF_FILE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        reader.join()
+
+
+def split_raw_lines(blocks):
+    """
+    Split a sequence of blocks into raw lines.
+
+    Lines are split on '\\n' only and returned without their line terminator. They are
+    not decoded, so callers can skip lines (e.g. with a pre-filter) without paying
+    for decoding.
+
+    Args:
+        blocks (iterable): Consecutive blocks of the file content.
+
+    Yields:
+        bytes: A raw line without '\\n'.
+    """
+    remainder = b''
+    for block in blocks:
+        lines = block.split(b'\n')
+        lines[0] = remainder + lines[0]
+        remainder = lines.pop()
+        yield from lines
+    if remainder:
+        yield remainder
+
+
+def iter_raw_lines(file, limit=None, buffer_size=READ_BUFFER_SIZE):
+    """
+    Split the content of a binary file object into raw lines using large block reads.
+
+    Args:
+        file (file object): A file opened in binary mode, positioned at a line start.
+        limit (int or None): Maximum number of bytes to read, or None to read to EOF.
+        buffer_size (int): Size of a single read.
+
+    Yields:
+        bytes: A raw line without '\\n'.
+    """
+    return split_raw_lines(iter_blocks(file, limit, buffer_size))
+
+
+def read_raw_lines(file_path):
+    """
+    Read a log file as raw lines. Compressed files are decompressed in a reader
+    thread, ahead of the parsing.
+
+    Args:
+        file_path (str): Path to the log file to be read.
+
+    Yields:
+        bytes: A raw line without '\\n'.
+    """
+    compressed = detect_compression(file_path) is not None
+    with open_log_file(file_path) as file:
+        blocks = iter_blocks(file)
+        if compressed:
+            blocks = prefetch_blocks(blocks)
+        yield from split_raw_lines(blocks)
+
+
+def read_sample_lines(file_path, size):
+    """
+    Read the complete raw lines within the first bytes of a (possibly compressed) log file.
+
+    Args:
+        file_path (str): Path to the log file.
+        size (int): Number of (uncompressed) bytes to read.
+
+    Returns:
+        list: The non-empty raw lines. A line cut off by the sample size is dropped,
+        unless it is the only one.
+    """
+    with open_log_file(file_path) as file:
+        data = file.read(size)
+    lines = data.split(b'\n')
+    if len(data) >= size and len(lines) > 1:
+        lines.pop()
+    return [line.rstrip(b'\r') for line in lines if line.strip()]
+
+
+def read_raw_range(file_path, start, end):
+    """
+    Read the raw lines of a log file that lie within a byte range.
+
+    The range boundaries must be aligned to the beginning of a line.
+
+    Args:
+        file_path (str): Path to the log file to be read.
+        start (int): Byte offset of the first line.
+        end (int): Byte offset at which reading stops.
+
+    Yields:
+        bytes: A raw line without '\\n'.
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        yield from iter_raw_lines(file, end - start)
+
+
+def decode_log_lines(lines):
+    """
+    Decode a batch of raw lines with a single decode call, which is much cheaper
+    than decoding line by line. A trailing '\\r' of Windows line endings is removed,
+    and invalid UTF-8 sequences are replaced instead of aborting the run.
+
+    Args:
+        lines (list): Raw lines without '\\n'.
+
+    Returns:
+        list: The decoded lines.
+    """
+    if not lines:
+        return []
+    text = b'\n'.join(lines).decode('utf-8', 'replace')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n')
+        if text.endswith('\r'):
+            text = text[:-1]
+    return text.split('\n')
@@ -0,0 +1,527 @@
+import bisect
+import sys
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import islice
+
+
+class _Missing:
+    """Marker for a field that is not present in a record."""
+
+    def __repr__(self):
+        return "MISSING"
+
+    def __reduce__(self):
+        # Keep the marker a singleton when records are pickled (e.g. by worker processes)
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+
+
+class DictionaryColumn:
+    """
+    Dictionary-encoded column: every distinct value is stored once and each row only
+    keeps an integer code. Code 0 marks rows where the field is missing.
+
+    Codes are assigned in order of first appearance, so per-value results keep the
+    order in which the values first occurred in the log.
+    """
+
+    # Inverted index, built on first use: (number of rows it covers, {code: rows})
+    _postings = (None, None)
+
+    def __init__(self, rows=0):
+        self.values = [MISSING]
+        self.index = {}
+        self.codes = array('I', [0]) * rows
+
+    def append(self, value):
+        if value is MISSING:
+            self.codes.append(0)
+            return
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.index[value] = code
+            self.values.append(value)
+        self.codes.append(code)
+
+    def get(self, row):
+        return self.values[self.codes[row]]
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes)
+
+    def values_between(self, start, stop):
+        """Iterate over the values of the rows in [start, stop)."""
+        return map(self.values.__getitem__, self.codes[start:stop])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def counts(self):
+        """Return {value: count} for all present values, counted over the code array."""
+        code_counts = Counter(self.codes)
+        return {self.values[code]: code_counts[code]
+                for code in range(1, len(self.values)) if code in code_counts}
+
+    def value_range(self):
+        """Return (min, max) of the present values, computed over the distinct values."""
+        present = self.values[1:]
+        return min(present), max(present)
+
+    def max_width(self):
+        return max((len(str(value)) for value in self.values[1:]), default=0)
+
+    def postings(self):
+        """
+        Return the inverted index of the column: {code: array of the rows with that code}.
+
+        It is built in one pass over the codes on first use and kept, so repeated
+        queries look rows up instead of scanning the column. Rows appended later
+        (e.g. while a log is followed) are added to the existing index.
+        """
+        covered, postings = self._postings
+        codes = self.codes
+        if covered != len(codes):
+            if covered is None:
+                covered, postings = 0, {}
+            for row in range(covered, len(codes)):
+                code = codes[row]
+                rows = postings.get(code)
+                if rows is None:
+                    rows = postings[code] = array('I')
+                rows.append(row)
+            self._postings = (len(codes), postings)
+        return postings
+
+    def take(self, rows):
+        """Return a new column with the given rows, encoding only the values they use."""
+        column = DictionaryColumn()
+        values, codes, new_codes = self.values, self.codes, {}
+        for row in rows:
+            code = codes[row]
+            new_code = new_codes.get(code)
+            if new_code is None:
+                new_code = 0 if code == 0 else len(column.values)
+                new_codes[code] = new_code
+                if new_code:
+                    column.index[values[code]] = new_code
+                    column.values.append(values[code])
+            column.codes.append(new_code)
+        return column
+
+    def has_values(self):
+        return len(self.values) > 1
+
+    def memory_size(self):
+        return sys.getsizeof(self.codes) + sys.getsizeof(self.values) + sys.getsizeof(self.index)
+
+
+class PlainColumn:
+    """
+    Column that stores one value per row. Used for high-cardinality fields (e.g. free
+    text messages) and values that cannot be dictionary-encoded (e.g. nested JSON).
+    Strings are interned so repeated values still share memory.
+    """
+
+    def __init__(self, values=()):
+        self.values = [sys.intern(value) if type(value) is str else value for value in values]
+
+    def append(self, value):
+        if type(value) is str:
+            value = sys.intern(value)
+        self.values.append(value)
+
+    def get(self, row):
+        return self.values[row]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def values_between(self, start, stop):
+        """Iterate over the values of the rows in [start, stop)."""
+        return iter(self.values[start:stop])
+
+    def __len__(self):
+        return len(self.values)
+
+    def counts(self):
+        counts = {}
+        for value in self.values:
+            if value is not MISSING:
+                counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    def value_range(self):
+        present = [value for value in self.values if value is not MISSING]
+        return min(present), max(present)
+
+    def max_width(self):
+        return max((len(str(value)) for value in self.values if value is not MISSING), default=0)
+
+    def take(self, rows):
+        """Return a new column with the given rows."""
+        column = PlainColumn()
+        values = self.values
+        column.values = [values[row] for row in rows]
+        return column
+
+    def has_values(self):
+        return any(value is not MISSING for value in self.values)
+
+    def memory_size(self):
+        return sys.getsizeof(self.values)
+
+
+class TimestampColumn:
+    """
+    Column of normalized timestamps ("YYYY-MM-DD HH:MM:SS") stored as integer seconds
+    since the epoch. Values are only formatted back to strings when they are read.
+    """
+
+    MISSING_VALUE = -2 ** 63
+
+    # Whether the epochs are ordered, checked on first use: (number of rows covered, result)
+    _sorted = (None, False)
+
+    def __init__(self, rows=0):
+        self.epochs = array('q', [self.MISSING_VALUE]) * rows
+        self._last_text = None
+        self._last_epoch = None
+
+    @staticmethod
+    def to_epoch(text):
+        """
+        Convert a normalized timestamp to epoch seconds.
+
+        Returns:
+            int or None: Epoch seconds, or None if the text is not a normalized timestamp.
+        """
+        if (type(text) is not str or len(text) != 19 or text[4] != '-' or text[7] != '-'
+                or text[10] != ' ' or text[13] != ':' or text[16] != ':' or text[0] == '0'):
+            return None
+        try:
+            moment = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+        return (moment - EPOCH) // ONE_SECOND
+
+    @staticmethod
+    def to_text(epoch):
+        return (EPOCH + epoch * ONE_SECOND).strftime("%Y-%m-%d %H:%M:%S")
+
+    def append(self, value):
+        """
+        Append a normalized timestamp.
+
+        Raises:
+            ValueError: If the value is not a normalized timestamp. Nothing is appended.
+        """
+        if value is MISSING:
+            self.epochs.append(self.MISSING_VALUE)
+            return
+        # Consecutive log lines often share the same second
+        if value != self._last_text:
+            epoch = self.to_epoch(value)
+            if epoch is None:
+                raise ValueError(f"'{value}' is not a normalized timestamp.")
+            self._last_epoch = epoch
+            self._last_text = value
+        self.epochs.append(self._last_epoch)
+
+    def get(self, row):
+        epoch = self.epochs[row]
+        return MISSING if epoch == self.MISSING_VALUE else self.to_text(epoch)
+
+    def __iter__(self):
+        return self.values_between(0, len(self.epochs))
+
+    def values_between(self, start, stop):
+        """
+        Iterate over the values of the rows in [start, stop). Consecutive rows often
+        share the same second, so each run of equal epochs is formatted once.
+        """
+        last_epoch, last_value = None, None
+        for epoch in self.epochs[start:stop]:
+            if epoch != last_epoch:
+                last_epoch = epoch
+                last_value = MISSING if epoch == self.MISSING_VALUE else self.to_text(epoch)
+            yield last_value
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def present_epochs(self):
+        if self.MISSING_VALUE in self.epochs:
+            return [epoch for epoch in self.epochs if epoch != self.MISSING_VALUE]
+        return self.epochs
+
+    def counts(self):
+        counts = Counter(self.present_epochs())
+        return {self.to_text(epoch): count for epoch, count in counts.items()}
+
+    def epoch_range(self):
+        epochs = self.present_epochs()
+        return min(epochs), max(epochs)
+
+    def value_range(self):
+        low, high = self.epoch_range()
+        return self.to_text(low), self.to_text(high)
+
+    def max_width(self):
+        return 19 if len(self.present_epochs()) else 0
+
+    def is_sorted(self):
+        """
+        Whether the epochs never decrease, i.e. ranges can be found by bisection.
+        Appended rows are checked against the last known row only.
+        """
+        covered, is_sorted = self._sorted
+        epochs = self.epochs
+        if covered != len(epochs):
+            if covered is None:
+                covered, is_sorted = 0, True
+            if is_sorted:
+                tail = epochs[max(0, covered - 1):]
+                is_sorted = (self.MISSING_VALUE not in tail
+                             and all(earlier <= later for earlier, later in zip(tail, islice(tail, 1, None))))
+            self._sorted = (len(epochs), is_sorted)
+        return is_sorted
+
+    def take(self, rows):
+        """Return a new column with the given rows."""
+        column = TimestampColumn()
+        epochs = self.epochs
+        column.epochs = array('q', [epochs[row] for row in rows])
+        return column
+
+    def has_values(self):
+        return len(self.present_epochs()) > 0
+
+    def memory_size(self):
+        return sys.getsizeof(self.epochs)
+
+
+class RecordStore:
+    """
+    Columnar in-memory store for parsed log entries.
+
+    Every field is kept in its own column instead of one dictionary per line:
+    normalized timestamps as integer epoch seconds, low-cardinality strings
+    (status, ip, hostname, service, ...) dictionary-encoded, and everything else
+    as interned plain values.
+    """
+
+    # After this many rows, a dictionary column whose distinct values exceed
+    # HIGH_CARDINALITY_RATIO of its rows is converted to a plain column.
+    CARDINALITY_CHECK_ROWS = 4096
+    HIGH_CARDINALITY_RATIO = 0.5
+
+    # StreamingAnalyzer fed with the same records while they were stored (see
+    # parsers_util.store_records), so the insights of a freshly parsed log need no
+    # extra pass. None if the aggregates were not computed.
+    aggregates = None
+
+    def __init__(self):
+        self.columns = {}
+        self.row_count = 0
+        # Number of lines read from the source to produce the records
+        self.lines_read = 0
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build a store from an iterable of record dictionaries.
+
+        Args:
+            records (iterable): Parsed log entries.
+
+        Returns:
+            RecordStore: The filled store.
+        """
+        store = cls()
+        store.extend(records)
+        return store
+
+    def _new_column(self, key, value):
+        if key == 'timestamp' and TimestampColumn.to_epoch(value) is not None:
+            return TimestampColumn(self.row_count)
+        return DictionaryColumn(self.row_count)
+
+    def _replace_column(self, key, column, value):
+        """Switch a column to a more general kind when a value does not fit into it."""
+        if isinstance(column, TimestampColumn):
+            replacement = DictionaryColumn()
+            for old_value in column:
+                replacement.append(old_value)
+            column = replacement
+            try:
+                hash(value)
+                self.columns[key] = column
+                return column
+            except TypeError:
+                pass
+        column = PlainColumn(column)
+        self.columns[key] = column
+        return column
+
+    def append(self, record):
+        """
+        Append a parsed record.
+
+        Args:
+            record (dict): A parsed log entry.
+        """
+        columns = self.columns
+        for key, value in record.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = self._new_column(key, value)
+            try:
+                column.append(value)
+            except (TypeError, ValueError):
+                column = self._replace_column(key, column, value)
+                column.append(value)
+
+        self.row_count += 1
+        # Fill the columns of fields that this record does not have
+        if len(columns) != len(record):
+            for column in columns.values():
+                if len(column) < self.row_count:
+                    column.append(MISSING)
+
+        if self.row_count % self.CARDINALITY_CHECK_ROWS == 0:
+            self._check_cardinality()
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def _check_cardinality(self):
+        for key, column in self.columns.items():
+            if (type(column) is DictionaryColumn
+                    and len(column.values) > self.row_count * self.HIGH_CARDINALITY_RATIO):
+                self.columns[key] = PlainColumn(column)
+
+    def __len__(self):
+        return self.row_count
+
+    def __bool__(self):
+        return self.row_count > 0
+
+    def keys(self):
+        """Return the field names in order of their first appearance."""
+        return list(self.columns)
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    def column(self, key):
+        return self.columns[key]
+
+    def values(self, key):
+        """Yield the present values of a field, skipping rows where it is missing."""
+        return (value for value in self.columns[key] if value is not MISSING)
+
+    def row(self, index, keys=None):
+        """
+        Return a single row as a dictionary of its present fields.
+
+        Args:
+            index (int): Row number.
+            keys (list or None): Fields to include, all fields if None.
+        """
+        record = {}
+        for key in keys if keys is not None else self.columns:
+            column = self.columns.get(key)
+            if column is not None:
+                value = column.get(index)
+                if value is not MISSING:
+                    record[key] = value
+        return record
+
+    def rows(self, keys=None, start=0, stop=None):
+        """Yield the rows in the range [start, stop) as dictionaries of their present fields."""
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        keys = [key for key in (keys if keys is not None else self.columns) if key in self.columns]
+        if not keys:
+            # Rows without any of the fields are still yielded, as empty dictionaries
+            yield from ({} for _ in range(start, stop))
+            return
+        # Column by column instead of row by row, so every column is read in one sweep
+        columns = [self.columns[key].values_between(start, stop) for key in keys]
+        for values in zip(*columns):
+            yield {key: value for key, value in zip(keys, values) if value is not MISSING}
+
+    def __iter__(self):
+        return self.rows()
+
+    def find_timestamp(self, timestamp):
+        """
+        Return the first row whose timestamp is at or after a normalized timestamp.
+
+        A timestamp column whose epochs are ordered (checked once per append, see
+        TimestampColumn.is_sorted) is searched by bisection. Unordered columns, e.g.
+        of several files read without --merge, and other columns are scanned.
+
+        Args:
+            timestamp (str): Normalized timestamp ("YYYY-MM-DD HH:MM:SS").
+
+        Returns:
+            int: Row number, or the number of rows if no entry is that late.
+        """
+        column = self.columns.get('timestamp')
+        if column is None:
+            return self.row_count
+        if isinstance(column, TimestampColumn):
+            epoch = TimestampColumn.to_epoch(timestamp)
+            if column.is_sorted():
+                return bisect.bisect_left(column.epochs, epoch)
+            # Missing values are the smallest epoch, so they never match
+            for index, value in enumerate(column.epochs):
+                if value >= epoch:
+                    return index
+            return self.row_count
+        for index, value in enumerate(column):
+            if value is not MISSING and str(value) >= timestamp:
+                return index
+        return self.row_count
+
+    def select_rows(self, rows):
+        """
+        Return a new store with the given rows, e.g. the result of a query.
+        Fields that none of the rows has are left out.
+
+        Args:
+            rows (iterable): Row numbers in ascending order.
+
+        Returns:
+            RecordStore: The selected entries.
+        """
+        rows = rows if isinstance(rows, (list, range, array)) else list(rows)
+        store = RecordStore()
+        for key, column in self.columns.items():
+            selected = column.take(rows)
+            if selected.has_values():
+                store.columns[key] = selected
+        store.row_count = len(rows)
+        store.lines_read = self.lines_read
+        return store
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.row_count
+        if not 0 <= index < self.row_count:
+            raise IndexError("record index out of range")
+        return self.row(index)
+
+    def memory_size(self):
+        """Approximate memory used by the columns in bytes (values not shared with the interpreter)."""
+        return sum(column.memory_size() for column in self.columns.values())
@@ -0,0 +1,444 @@
+import asyncio
+import json
+import os
+import sys
+from collections import OrderedDict
+from itertools import islice
+from urllib.parse import urlsplit, parse_qsl
+from analysis import StreamingAnalyzer, CountingIterator
+from follow import LogFollower
+from group_by import GroupByAggregator, DEFAULT_MEMORY_MB
+from output_batch import to_json
+from parse_cache import complete_lines_end
+from parsers.parsers_util import (PARSE_BATCH_SIZE, get_parser_for_format, iter_parsed_records,
+                                  store_records, timestamp_warning_for)
+from query import QueryEngine
+from readers import detect_compression, read_raw_lines, read_raw_range
+from record_store import RecordStore
+from stats import current_stats
+from utils import config_fields, select_analyses
+
+# Address and port of 'logloom serve'. Only local clients are served by default.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Rows returned by /select without a limit, and the largest limit accepted
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+
+# Number of filtered views, analyses and group-by aggregations kept between requests
+RESULT_CACHE_SIZE = 16
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 1024 * 1024
+
+# Bytes of appended log data parsed per file before the event loop answers waiting
+# requests (about 50 ms of parsing for CLF)
+SLICE_SIZE = 256 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    """A request that is answered with an HTTP error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def field_list(value, name):
+    """
+    Read a list of field names from a request parameter.
+
+    Args:
+        value (str, list or None): Comma-separated names (query string) or a JSON list.
+        name (str): The parameter, for the error message.
+
+    Returns:
+        list or None: The field names, or None if the parameter was not given.
+
+    Raises:
+        ValueError: If the parameter names no field or a name is not a string.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise ValueError(f"'{name}' must be a comma-separated string or a list of field names.")
+    if not all(isinstance(field, str) for field in value):
+        raise ValueError(f"The field names in '{name}' must be strings.")
+    fields = [field.strip() for field in value if field.strip()]
+    if not fields:
+        raise ValueError(f"'{name}' needs at least one field name.")
+    return fields
+
+
+def int_param(params, name, default, minimum=0, maximum=None):
+    """
+    Read an integer request parameter.
+
+    Raises:
+        ValueError: If the value is not an integer within the allowed range.
+    """
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer, not {value!r}.")
+    if number < minimum or (maximum is not None and number > maximum):
+        limit = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+        raise ValueError(f"'{name}' must be {limit}.")
+    return number
+
+
+def query_param(params):
+    """
+    Read the 'query' parameter.
+
+    Returns:
+        str or None: The query text, None to select all entries.
+    """
+    query = params.get('query') or None
+    if query is not None and not isinstance(query, str):
+        raise ValueError("'query' must be a string.")
+    return query
+
+
+def remember(cache, key, value):
+    """Put a value into a least-recently-used cache of RESULT_CACHE_SIZE entries."""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > RESULT_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+class LogServer:
+    """
+    Keeps parsed log files in memory and answers queries on them over HTTP.
+
+    The files are parsed once into a RecordStore together with its aggregates, so
+    the insights of all entries are ready without a pass over the data. The
+    analyses and group-by aggregations of filtered requests are kept per query and
+    only fed the entries appended since, and the inverted indexes of the query
+    engine are extended instead of being rebuilt.
+
+    Uncompressed files are parsed up to their last complete line and then followed
+    from exactly there. Appended lines and all requests are handled on the same
+    event loop, so a request never sees a half-appended batch and no locks are needed.
+    """
+
+    def __init__(self, file_paths, format_type, line_filter=None, memory_budget=DEFAULT_MEMORY_MB * 2 ** 20):
+        """
+        Args:
+            file_paths (list): Paths of the log files, oldest first.
+            format_type (str): Log file format.
+            line_filter (LineFilter or None): Only keep lines that match this filter.
+            memory_budget (int): Bytes a group-by request may use before it spills to disk.
+        """
+        self.file_paths = file_paths
+        self.format_type = format_type
+        self.line_filter = line_filter
+        self.memory_budget = memory_budget
+        self.parser = get_parser_for_format(format_type)
+        self.config = getattr(self.parser, 'analysis_config', {})
+        self.store = RecordStore()
+        if self.config:
+            self.store.aggregates = StreamingAnalyzer(self.config)
+        self.query_engine = QueryEngine(self.store)
+        # Query text -> (rows of the store covered, numbers of the matching rows)
+        self.views = OrderedDict()
+        # (query, analyzed fields) -> (rows of the store covered, StreamingAnalyzer)
+        self.analyzers = OrderedDict()
+        # (query, fields, sum field) -> (rows of the store covered, GroupByAggregator)
+        self.groups = OrderedDict()
+        # [file path, LogFollower, number of lines read from the file]
+        self.followers = []
+
+    def load(self):
+        """Parse the log files into the store and start following the uncompressed ones."""
+        for file_path in self.file_paths:
+            on_timestamp_error = timestamp_warning_for(file_path, len(self.file_paths))
+            compressed = detect_compression(file_path)
+            if compressed:
+                lines = CountingIterator(read_raw_lines(file_path))
+            else:
+                end = complete_lines_end(file_path, os.path.getsize(file_path))
+                lines = CountingIterator(read_raw_range(file_path, 0, end))
+            store_records(self.store, iter_parsed_records(lines, self.parser, 1, on_timestamp_error,
+                                                          line_filter=self.line_filter))
+            self.store.lines_read += lines.count
+            if not compressed:
+                self.followers.append([file_path, LogFollower(file_path, read_size=SLICE_SIZE, offset=end), lines.count])
+
+    def poll(self):
+        """
+        Parse the lines appended to the followed files since the last call, at most
+        SLICE_SIZE bytes per file.
+
+        Returns:
+            int: Number of lines read; 0 once all files are read to their end.
+        """
+        new_lines = 0
+        for follower in self.followers:
+            file_path, log_follower, lines_read = follower
+            lines = log_follower.read_lines()
+            if log_follower.reopened:
+                follower[2] = lines_read = 0
+            if not lines:
+                continue
+            store_records(self.store, iter_parsed_records(
+                lines, self.parser, lines_read + 1, timestamp_warning_for(file_path, len(self.file_paths)),
+                line_filter=self.line_filter))
+            follower[2] += len(lines)
+            self.store.lines_read += len(lines)
+            new_lines += len(lines)
+        return new_lines
+
+    async def follow(self, interval):
+        """
+        Poll the followed files for appended lines every interval seconds.
+
+        A large append is read in slices of SLICE_SIZE bytes per file until the files
+        are read to their end, so the server keeps up with busy logs. Between two slices
+        the event loop answers the waiting requests. The store is only changed on
+        the event loop, so requests never see a half-appended batch.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            while self.poll():
+                await asyncio.sleep(0)
+
+    def close(self):
+        """Stop following the files and delete the spill files of group-by requests."""
+        for _, log_follower, _ in self.followers:
+            log_follower.close()
+        for _, aggregator in self.groups.values():
+            aggregator.close()
+
+    def matching_rows(self, query):
+        """
+        Return the numbers of the rows that match a query, in ascending order. They
+        are kept per query and only the appended rows are checked on later calls.
+        """
+        store = self.store
+        covered, rows = self.views.get(query) or (0, None)
+        if rows is None or covered != len(store):
+            parsed_query = self.query_engine.parse(query)
+            with current_stats().timer("query"):
+                if rows is None:
+                    rows = list(parsed_query.rows(store))
+                else:
+                    rows.extend(parsed_query.rows(store, list(range(covered, len(store)))))
+        remember(self.views, query, (len(store), rows))
+        return rows
+
+    def new_records(self, query, covered, keys):
+        """Yield the given fields of the entries from row covered on that match a query (or all for None)."""
+        store = self.store
+        if query is None:
+            return store.rows(keys, covered)
+        parsed_query = self.query_engine.parse(query)
+        with current_stats().timer("query"):
+            # The first time from the indexes, then only the appended rows
+            rows = (parsed_query.rows(store) if covered == 0
+                    else parsed_query.rows(store, list(range(covered, len(store)))))
+        return store.select_rows(rows).rows(keys)
+
+    def aggregation(self, cache, key, query, keys, create):
+        """
+        Return a cached aggregation (StreamingAnalyzer or GroupByAggregator) of the
+        entries matching a query. It is fed only the entries appended since its last use.
+
+        Args:
+            cache (OrderedDict): Cache of the aggregations of this kind.
+            key (tuple): The cache key of the request.
+            query (str or None): The query selecting the entries.
+            keys (list): Fields the aggregation reads.
+            create (func): Creates a new, empty aggregation.
+        """
+        covered, aggregation = cache.get(key) or (0, None)
+        if aggregation is None:
+            aggregation = create()
+        if covered != len(self.store):
+            records = self.new_records(query, covered, keys)
+            with current_stats().timer("analysis"):
+                while batch := list(islice(records, PARSE_BATCH_SIZE)):
+                    aggregation.update_batch(batch)
+        remember(cache, key, (len(self.store), aggregation))
+        return aggregation
+
+    def handle_status(self, params):
+        """GET /status: the files, the number of lines and entries and the available fields."""
+        return {
+            "files": self.file_paths,
+            "format": self.format_type,
+            "followed": [file_path for file_path, _, _ in self.followers],
+            "log_length": self.store.lines_read,
+            "parsed_length": len(self.store),
+            "fields": self.store.keys(),
+        }
+
+    def handle_analyze(self, params):
+        """GET /analyze?query=...&fields=status,ip: the insights, like --analyze --output json."""
+        if not self.config:
+            raise ValueError("Analysis is not supported for this log format.")
+        query = query_param(params)
+        fields = field_list(params.get('fields'), 'fields')
+        if query is None and fields is None and self.store.aggregates is not None:
+            # Kept up to date while the entries are stored
+            analyzer = self.store.aggregates
+        else:
+            config = self.config if fields is None else select_analyses(self.config, fields)
+            analyzer = self.aggregation(self.analyzers, (query, tuple(fields or ())), query,
+                                        config_fields(config), lambda: StreamingAnalyzer(config))
+        with current_stats().timer("analysis"):
+            insights = analyzer.insights()
+        return {"log_length": self.store.lines_read, "parsed_length": analyzer.records, "insights": insights}
+
+    def handle_select(self, params):
+        """GET /select?query=...&fields=ip,status&offset=0&limit=100: a page of entries."""
+        query = query_param(params)
+        fields = field_list(params.get('fields'), 'fields')
+        offset = int_param(params, 'offset', 0)
+        limit = int_param(params, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+        store = self.store
+        if query is None:
+            total, page = len(store), list(store.rows(fields, offset, offset + limit))
+        else:
+            rows = self.matching_rows(query)
+            total, page = len(rows), [store.row(row, fields) for row in rows[offset:offset + limit]]
+        return {"total": total, "offset": offset, "rows": page}
+
+    def handle_group(self, params):
+        """GET /group?by=ip,status&query=...&top=10&sum_field=size: a group-by aggregation."""
+        fields = field_list(params.get('by'), 'by')
+        if fields is None:
+            raise ValueError("'by' names the fields to group by, e.g. by=ip,status.")
+        sum_field = params.get('sum_field', 'size')
+        if not isinstance(sum_field, str) or not sum_field:
+            raise ValueError("'sum_field' must be the name of a field.")
+        top = int_param(params, 'top', None, 1)
+        query = query_param(params)
+        aggregator = self.aggregation(
+            self.groups, (query, tuple(fields), sum_field), query, ['timestamp', *fields, sum_field],
+            lambda: GroupByAggregator(fields, sum_field, self.memory_budget))
+        with current_stats().timer("analysis"):
+            groups = list(aggregator.results(top))
+        return {"groups": groups, "parsed_length": aggregator.records}
+
+    ROUTES = {
+        "/": handle_status,
+        "/status": handle_status,
+        "/analyze": handle_analyze,
+        "/select": handle_select,
+        "/group": handle_group,
+    }
+
+    def respond(self, method, target, body):
+        """
+        Answer a single request.
+
+        Parameters come from the query string and, for POST, from a JSON object in
+        the body; the body wins for parameters given in both.
+
+        Args:
+            method (str): The HTTP method.
+            target (str): The request target, e.g. "/select?fields=ip&limit=10".
+            body (bytes): The request body.
+
+        Returns:
+            tuple: (HTTP status, JSON-serializable response).
+        """
+        url = urlsplit(target)
+        handler = self.ROUTES.get(url.path.rstrip('/') or '/')
+        try:
+            if handler is None:
+                raise HTTPError(404, f"Unknown path '{url.path}'. Paths: {', '.join(self.ROUTES)}.")
+            if method not in ('GET', 'POST'):
+                raise HTTPError(405, f"Method {method} is not allowed; use GET or POST.")
+            params = dict(parse_qsl(url.query))
+            if body:
+                payload = json.loads(body)
+                if not isinstance(payload, dict):
+                    raise ValueError("The request body must be a JSON object.")
+                params.update(payload)
+            return 200, handler(self, params)
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"An unexpected error occurred: {e}"}
+
+    async def handle_connection(self, reader, writer):
+        """Serve the HTTP/1.1 requests of one connection, keeping it open between requests."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode('latin-1').split()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if len(parts) != 3 or not parts[2].startswith('HTTP/') or length < 0:
+                    status, response, keep_alive = 400, {"error": "Malformed HTTP request."}, False
+                elif length > MAX_BODY_SIZE:
+                    status, response, keep_alive = 413, {"error": "The request body is too large."}, False
+                else:
+                    method, target, version = parts
+                    body = await reader.readexactly(length) if length else b''
+                    keep_alive = keep_alive and version == 'HTTP/1.1'
+                    status, response = self.respond(method, target, body)
+
+                data = (to_json(response) + "\n").encode()
+                with current_stats().timer("output"):
+                    writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                                 f"Content-Type: application/json\r\n"
+                                 f"Content-Length: {len(data)}\r\n"
+                                 f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(log_server, host=DEFAULT_HOST, port=DEFAULT_PORT, interval=1.0):
+    """
+    Answer HTTP requests on the parsed logs until the process is stopped.
+
+    Args:
+        log_server (LogServer): The loaded logs.
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+        interval (float): Seconds between two checks for appended lines.
+    """
+    server = await asyncio.start_server(log_server.handle_connection, host, port)
+    follow_task = asyncio.create_task(log_server.follow(interval)) if log_server.followers else None
+    print(f"Serving {len(log_server.store):,} entries on http://{host}:{port}/ "
+          f"(following {len(log_server.followers)} of {len(log_server.file_paths)} files). "
+          "Stop with Ctrl+C.", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if follow_task is not None:
+            follow_task.cancel()
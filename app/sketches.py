@@ -0,0 +1,321 @@
+import hashlib
+import heapq
+import math
+from collections import Counter
+
+# Number of distinct values the sketches count exactly before they switch to an
+# approximation with bounded memory
+EXACT_LIMIT = 65536
+
+
+class QuantileSketch:
+    """
+    Quantiles of numbers that are exact while the distinct values fit in memory.
+
+    The numbers are counted per value. Once there are more than exact_limit distinct
+    values, the counts are folded into a histogram with logarithmic buckets (as in
+    DDSketch), whose estimates are within relative_error of the true quantile.
+
+    Both representations only add up counts, so the result does not depend on the
+    order in which values are added or sketches are merged: a streaming, parallel
+    or batch analysis of the same values gives the same quantiles.
+    """
+
+    def __init__(self, exact_limit=EXACT_LIMIT, relative_error=0.01):
+        """
+        Args:
+            exact_limit (int): Number of distinct values counted exactly.
+            relative_error (float): Relative accuracy of the histogram buckets.
+        """
+        self.exact_limit = exact_limit
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.log_gamma = math.log(self.gamma)
+        # Counts per value while exact, counts per bucket afterwards
+        self.counts = {}
+        self.approximate = False
+        self.total = 0
+
+    def add(self, value):
+        """Add a single value."""
+        self.add_counts({value: 1})
+
+    def add_many(self, values):
+        """Add a batch of values."""
+        self.add_counts(Counter(values))
+
+    def add_counts(self, value_counts):
+        """
+        Add values with their number of occurrences.
+
+        Args:
+            value_counts (dict): Number of occurrences per value.
+        """
+        counts = self.counts
+        if self.approximate:
+            bucket = self._bucket
+            for value, count in value_counts.items():
+                key = bucket(value)
+                counts[key] = counts.get(key, 0) + count
+        else:
+            for value, count in value_counts.items():
+                counts[value] = counts.get(value, 0) + count
+            if len(counts) > self.exact_limit:
+                self._to_histogram()
+        self.total += sum(value_counts.values())
+
+    def merge(self, other):
+        """Add all values summarized by another sketch."""
+        if other.approximate and not self.approximate:
+            self._to_histogram()
+        if self.approximate and not other.approximate:
+            self.add_counts(other.counts)
+            return
+        counts = self.counts
+        for key, count in other.counts.items():
+            counts[key] = counts.get(key, 0) + count
+        self.total += other.total
+        if not self.approximate and len(counts) > self.exact_limit:
+            self._to_histogram()
+
+    def __len__(self):
+        return self.total
+
+    def _bucket(self, value):
+        # Buckets of negative values mirror those of positive values; 0 has its own
+        if value == 0:
+            return 0, 0
+        return (1 if value > 0 else -1), math.ceil(math.log(abs(value)) / self.log_gamma)
+
+    def _value(self, key):
+        sign, index = key
+        # The point with the same relative distance to both bounds of the bucket
+        return sign * 2 * self.gamma ** index / (self.gamma + 1)
+
+    def _to_histogram(self):
+        exact = self.counts
+        self.counts = {}
+        self.approximate = True
+        bucket = self._bucket
+        for value, count in exact.items():
+            key = bucket(value)
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def quantile(self, q):
+        """
+        Return a quantile. Exact quantiles interpolate linearly between the two
+        nearest ranks; approximate ones return the value of the bucket of the rank.
+
+        Args:
+            q (float): Quantile between 0 and 1 (e.g. 0.95).
+
+        Returns:
+            float or None: The quantile, or None if no values were added.
+        """
+        if not self.total:
+            return None
+        if self.approximate:
+            points = sorted((self._value(key), count) for key, count in self.counts.items())
+        else:
+            points = sorted(self.counts.items())
+        rank = q * (self.total - 1)
+        lower_rank = math.floor(rank)
+        lower = None
+        cumulative = 0
+        for value, count in points:
+            cumulative += count
+            if lower is None and cumulative > lower_rank:
+                lower = value
+            # The value of the next rank, or the last value
+            if cumulative > lower_rank + 1 or cumulative == self.total:
+                upper = value
+                break
+        if self.approximate:
+            return float(lower)
+        return lower + (upper - lower) * (rank - lower_rank)
+
+
+class FrequentItems:
+    """
+    Counts of items that are exact up to exact_limit distinct items, with a
+    heavy-hitter summary in the Misra-Gries / Space-Saving family beyond it.
+
+    Once the summary is used, the median counter is subtracted from all counters
+    whenever more than capacity items are tracked, and those that drop to zero are
+    discarded. The subtracted amounts are kept as offset: the true count of an item
+    lies between its counter and counter + offset, and the offset never exceeds
+    2 * total / capacity.
+
+    While the counts are exact, they do not depend on the order of updates and
+    merges, so a streaming, parallel or batch analysis reports the same top items.
+    """
+
+    def __init__(self, capacity, exact_limit=EXACT_LIMIT):
+        """
+        Args:
+            capacity (int): Maximum number of counters kept between two purges.
+            exact_limit (int): Number of distinct items counted exactly.
+        """
+        self.capacity = capacity
+        self.exact_limit = max(capacity, exact_limit)
+        self.counts = {}
+        self.offset = 0
+        self.total = 0
+        self.approximate = False
+
+    @classmethod
+    def for_error(cls, error, exact_limit=EXACT_LIMIT):
+        """Create a summary whose count error stays below error * total."""
+        return cls(max(2, math.ceil(2 / error)), exact_limit)
+
+    def update(self, item):
+        self.update_many({item: 1})
+
+    def update_many(self, item_counts):
+        """
+        Add many items at once.
+
+        Args:
+            item_counts (dict): Number of occurrences per item, e.g. a Counter of a batch.
+        """
+        counts = self.counts
+        for item, count in item_counts.items():
+            counts[item] = counts.get(item, 0) + count
+            self.total += count
+        self._limit()
+
+    def merge(self, other):
+        counts = self.counts
+        for item, count in other.counts.items():
+            counts[item] = counts.get(item, 0) + count
+        self.total += other.total
+        self.offset += other.offset
+        self.approximate = self.approximate or other.approximate
+        self._limit()
+
+    def _limit(self):
+        if not self.approximate:
+            if len(self.counts) <= self.exact_limit:
+                return
+            self.approximate = True
+        while len(self.counts) > self.capacity:
+            self._purge()
+
+    def _purge(self):
+        ordered = sorted(self.counts.values())
+        median = ordered[(len(ordered) - 1) // 2]
+        self.offset += median
+        self.counts = {item: count - median for item, count in self.counts.items() if count > median}
+
+    def top(self, k):
+        """
+        Return the k items with the highest counters. Equal counters are ordered by
+        the items' text, so the result does not depend on the order of updates.
+
+        Once the summary is approximate, items whose counter is below the offset are
+        left out: their count is dominated by the error.
+
+        Returns:
+            list: (item, estimated count, maximum error) tuples. The estimate is an
+            upper bound and the true count is at least estimate - error; the error
+            is 0 while the counts are exact.
+        """
+        offset = self.offset
+        candidates = [(item, count) for item, count in self.counts.items() if count >= offset]
+        largest = heapq.nsmallest(k, candidates, key=lambda entry: (-entry[1], str(entry[0])))
+        return [(item, count + offset, offset) for item, count in largest]
+
+
+def stable_hash64(value):
+    """
+    Return a 64-bit hash that is the same in every process and run.
+    Python's hash() of strings is randomized per process and cannot be merged.
+    """
+    if not isinstance(value, bytes):
+        value = str(value).encode('utf-8', 'surrogatepass')
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """
+    Number of distinct values, counted exactly up to exact_limit values and
+    estimated with HyperLogLog in 2 ** precision bytes beyond it.
+
+    Values are hashed with blake2b, so sketches built in different worker processes
+    can be merged by taking the register-wise maximum. Repeated values are collected
+    in a set first, so each distinct value is hashed only once. Both the exact set
+    and the registers are independent of the order of updates and merges.
+    """
+
+    # Number of distinct values collected before they are hashed into the registers
+    PENDING_LIMIT = 4096
+
+    def __init__(self, precision=14, exact_limit=EXACT_LIMIT):
+        """
+        Args:
+            precision (int): Number of index bits between 4 and 18; the relative
+                standard error is about 1.04 / sqrt(2 ** precision).
+            exact_limit (int): Number of distinct values counted exactly.
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be between 4 and 18, not {precision}.")
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.registers = bytearray(1 << precision)
+        self.pending = set()
+        # Whether the values were hashed into the registers instead of kept in pending
+        self.approximate = False
+
+    @classmethod
+    def for_error(cls, error, exact_limit=EXACT_LIMIT):
+        """Create a sketch with a relative standard error of at most error."""
+        precision = math.ceil(math.log2((1.04 / error) ** 2))
+        return cls(min(18, max(4, precision)), exact_limit)
+
+    def update(self, item):
+        self.pending.add(item)
+        self._limit()
+
+    def update_many(self, items):
+        self.pending.update(items)
+        self._limit()
+
+    def _limit(self):
+        if len(self.pending) > (self.PENDING_LIMIT if self.approximate else self.exact_limit):
+            self.approximate = True
+            self._flush()
+
+    def _flush(self):
+        registers = self.registers
+        index_shift = 64 - self.precision
+        rest_mask = (1 << index_shift) - 1
+        for item in self.pending:
+            hashed = stable_hash64(item)
+            index = hashed >> index_shift
+            rank = index_shift - (hashed & rest_mask).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+        self.pending = set()
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Only HyperLogLog sketches with the same precision can be merged.")
+        self.pending |= other.pending
+        if other.approximate:
+            self.approximate = True
+            self.registers = bytearray(map(max, self.registers, other.registers))
+        self._limit()
+
+    def estimate(self):
+        """Return the number of distinct values, estimated once it exceeds exact_limit."""
+        if not self.approximate:
+            return len(self.pending)
+        self._flush()
+        registers = self.registers
+        size = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        raw = alpha * size * size / sum(2.0 ** -register for register in registers)
+        empty = registers.count(0)
+        if raw <= 2.5 * size and empty:
+            # Linear counting is more accurate for small cardinalities
+            return round(size * math.log(size / empty))
+        return round(raw)
@@ -0,0 +1,192 @@
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+# Optional sampling profiler, used for --profile paths ending in .html
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# Stages in the order they are reported
+STAGES = ("read", "prefilter", "decode", "ansi", "parse", "timestamps", "store", "query", "analysis", "output")
+
+# Counters in the order they are reported, with their labels
+COUNTERS = {
+    "lines_read": "Lines read",
+    "lines_prefiltered": "Lines rejected by the pre-filter",
+    "lines_matched": "Lines matched",
+    "lines_unmatched": "Lines not matched",
+    "records_filtered": "Records rejected by a filter",
+    "timestamp_errors": "Timestamp errors",
+}
+
+# Number of profile entries printed for --profile
+PROFILE_TOP = 25
+
+
+class RunStats:
+    """
+    Counters and stage timers of a run, shown with --stats.
+
+    The pipeline records its stages per batch of lines, never per line. Timers are
+    exclusive: time spent in a timer nested inside another one (e.g. parsing while
+    the analysis pulls the next records) only counts for the inner stage, so the
+    stage times add up to the instrumented wall time.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.counters = {}
+        self.timings = {}
+        self._timed = 0.0
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        """Context manager that adds the exclusive time of its block to a stage."""
+        started = time.perf_counter()
+        timed_before = self._timed
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            own = elapsed - (self._timed - timed_before)
+            self.timings[name] = self.timings.get(name, 0.0) + own
+            self._timed = timed_before + elapsed
+
+    def merge(self, other):
+        """Add the counters and timings of another run, e.g. of a worker process."""
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+        for name, seconds in other.timings.items():
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        return {"counters": dict(self.counters), "timings": dict(self.timings)}
+
+    def format_table(self):
+        """Format the counters and timings as a summary table."""
+        lines = ["=" * 50, "Run Statistics".center(50), "=" * 50]
+        for name, label in COUNTERS.items():
+            if name in self.counters:
+                lines.append(f"{label:<36}{self.counters[name]:>14,}")
+        total = sum(self.timings.values())
+        lines.append("-" * 50)
+        lines.append(f"{'Stage':<20}{'Seconds':>15}{'Share':>15}")
+        ordered = [stage for stage in STAGES if stage in self.timings]
+        ordered += [stage for stage in self.timings if stage not in STAGES]
+        for stage in ordered:
+            seconds = self.timings[stage]
+            share = seconds / total if total else 0
+            lines.append(f"{stage:<20}{seconds:>15.3f}{share:>15.1%}")
+        lines.append(f"{'total':<20}{total:>15.3f}")
+        lines_read = self.counters.get("lines_read", 0)
+        if total and lines_read:
+            lines.append(f"{'Lines per second':<36}{lines_read / total:>14,.0f}")
+        return "\n".join(lines)
+
+
+class DisabledStats:
+    """Stand-in while --stats is off: counting does nothing and timers cost one call per batch."""
+
+    enabled = False
+    _null_timer = nullcontext()
+
+    def count(self, name, amount=1):
+        pass
+
+    def timer(self, name):
+        return self._null_timer
+
+
+DISABLED = DisabledStats()
+
+# The statistics of the current run; DISABLED unless --stats is given
+_current = DISABLED
+
+
+def current_stats():
+    """Return the statistics the pipeline records into (DISABLED if --stats is off)."""
+    return _current
+
+
+def activate_stats(stats):
+    """
+    Make stats the statistics of the current process.
+
+    Args:
+        stats (RunStats or None): The statistics to record into, or None to switch them off.
+
+    Returns:
+        RunStats or DisabledStats: The previously active statistics.
+    """
+    global _current
+    previous = _current
+    _current = stats if stats is not None else DISABLED
+    return previous
+
+
+def start_profiler(profile_path):
+    """
+    Start a profiler for --profile. Paths ending in .html use pyinstrument.
+
+    Raises:
+        ValueError: If an HTML profile is requested and pyinstrument is not installed.
+    """
+    if profile_path.endswith('.html'):
+        if pyinstrument is None:
+            raise ValueError("HTML profiles need the 'pyinstrument' package. Use a .prof path for cProfile.")
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def stop_profiler(profiler, profile_path, stream):
+    """Stop the profiler, save its result and print the most expensive functions."""
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        stream.write(summary.getvalue())
+    else:
+        profiler.stop()
+        with open(profile_path, 'w') as file:
+            file.write(profiler.output_html())
+    stream.write(f"Profile written to {profile_path}\n")
+
+
+@contextmanager
+def instrumented(stats_format=None, profile_path=None, stream=None):
+    """
+    Record statistics and/or profile the body, and report them when it ends.
+
+    Args:
+        stats_format (str or None): "table" or "json" to collect statistics, None to skip them.
+        profile_path (str or None): File for the profile, None to skip profiling.
+        stream (file object or None): Destination of the report, standard error by default.
+    """
+    stream = stream or sys.stderr
+    profiler = start_profiler(profile_path) if profile_path else None
+    stats = RunStats() if stats_format else None
+    previous = activate_stats(stats)
+    try:
+        yield stats
+    finally:
+        if profiler is not None:
+            stop_profiler(profiler, profile_path, stream)
+        activate_stats(previous if previous.enabled else None)
+        if stats is not None:
+            report = json.dumps(stats.as_dict(), indent=2) if stats_format == "json" else stats.format_table()
+            stream.write(report + "\n")
@@ -0,0 +1,307 @@
+import bisect
+import os
+from datetime import date, datetime, timedelta
+from parse_cache import (complete_lines_end, directory_is_owned, file_fingerprint, fingerprint_matches,
+                         read_sidecar, write_sidecar)
+from parsers.parsers_util import convert_to_standard_timestamp
+from parsers.timestamps import is_standard_timestamp
+from readers import READ_BUFFER_SIZE, decode_log_lines, detect_compression
+
+# Increase whenever the layout of the index entry changes
+TIME_INDEX_VERSION = 3
+
+# Distance between two entries of the sparse index
+TIME_INDEX_INTERVAL = 8 * 1024 * 1024
+
+# Once the binary search has narrowed a boundary down to this many bytes, the rest
+# is left to the parser, which checks every record exactly
+SCAN_THRESHOLD = 64 * 1024
+
+
+def parse_time_bound(text, end_of_day=False):
+    """
+    Parse a --since/--until value such as "2023-10-10 14:00" into a normalized timestamp.
+
+    Args:
+        text (str): An ISO date, optionally with a time ("2023-10-10", "2023-10-10 14:15:30").
+            "today" and "yesterday" can be used instead of the date ("yesterday 14:00").
+        end_of_day (bool): Whether a date without a time means the end of that day.
+
+    Returns:
+        str: The timestamp in the format "YYYY-MM-DD HH:MM:SS".
+
+    Raises:
+        ValueError: If the text is not an ISO date.
+    """
+    text = text.strip()
+    day, _, time_of_day = text.partition(' ')
+    relative_days = {"today": 0, "yesterday": 1}.get(day.lower())
+    if relative_days is not None:
+        day = (date.today() - timedelta(days=relative_days)).isoformat()
+        text = f"{day} {time_of_day}".strip()
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"'{text}' is not a date and time like '2023-10-10 14:00'.")
+    if end_of_day and len(text) == 10:
+        moment = moment.replace(hour=23, minute=59, second=59)
+    # Normalized log timestamps carry no time zone either
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def time_index_path_for(file_path, format_type):
+    """
+    Return the path of the sidecar time index for a log file and format.
+
+    Args:
+        file_path (str): Path to the log file.
+        format_type (str): Log file format.
+
+    Returns:
+        str: Path of the index file next to the log file.
+    """
+    return f"{file_path}.{format_type}.logloom-index"
+
+
+def line_timestamp(line, parser):
+    """
+    Return the normalized timestamp of a raw line, or None if it has no valid one.
+    Timestamps the parser passes through unconverted are left out, since they
+    cannot be ordered against the others.
+    """
+    record = parser.parse_lines(decode_log_lines([line.rstrip(b'\n')]))[0]
+    if not record or 'timestamp' not in record:
+        return None
+    try:
+        timestamp = convert_to_standard_timestamp(record['timestamp'], parser)
+    except ValueError:
+        return None
+    return timestamp if is_standard_timestamp(timestamp) else None
+
+
+def line_start_at(file, offset):
+    """Return the offset of the first line that starts at or after offset."""
+    if offset <= 0:
+        return 0
+    file.seek(offset - 1)
+    file.readline()
+    return file.tell()
+
+
+def probe_timestamp(file, offset, limit, parser):
+    """
+    Find the first line with a timestamp that starts in [offset, limit).
+
+    Args:
+        file (file object): The log file, opened in binary mode.
+        offset (int): Byte offset to start at; a partial line there is skipped.
+        limit (int): Byte offset at which the search stops.
+        parser (BaseParser): Parser used to read the timestamps.
+
+    Returns:
+        tuple or None: (line start, next line start, normalized timestamp), or None
+        if no line in the range has a timestamp.
+    """
+    position = line_start_at(file, offset)
+    file.seek(position)
+    while position < limit:
+        line = file.readline()
+        if not line:
+            return None
+        timestamp = line_timestamp(line, parser)
+        if timestamp is not None:
+            return position, position + len(line), timestamp
+        position += len(line)
+    return None
+
+
+def count_newlines(file, start, end):
+    """Count the lines that end in the byte range [start, end)."""
+    file.seek(start)
+    count, remaining = 0, end - start
+    while remaining > 0:
+        block = file.read(min(READ_BUFFER_SIZE, remaining))
+        if not block:
+            break
+        count += block.count(b'\n')
+        remaining -= len(block)
+    return count
+
+
+def bisect_file(file, parser, before, lo, hi):
+    """
+    Binary search for the point where the timestamps of a time-ordered log stop
+    satisfying before().
+
+    Invariants: all lines with a timestamp that start before lo satisfy before(),
+    and the first line with a timestamp at or after hi does not (or there is none).
+    Each probe reads the timestamp of a single line in the middle of the range.
+
+    Args:
+        file (file object): The log file, opened in binary mode.
+        parser (BaseParser): Parser used to read the timestamps.
+        before (func): Predicate on normalized timestamps, True up to the boundary.
+        lo (int): Line start where the search begins.
+        hi (int): Byte offset where the search ends.
+
+    Returns:
+        tuple: The narrowed (lo, hi); lo is a line start and hi - lo is at most SCAN_THRESHOLD.
+    """
+    while hi - lo > SCAN_THRESHOLD:
+        middle = (lo + hi) // 2
+        found = probe_timestamp(file, middle, hi, parser)
+        if found is not None and before(found[2]):
+            lo = found[1]
+        else:
+            # Lines between middle and the probed line have no timestamp
+            hi = middle
+    return lo, max(lo, hi)
+
+
+def extend_time_index(file, parser, index, end):
+    """
+    Add entries to a sparse index for the bytes up to end.
+
+    Every TIME_INDEX_INTERVAL bytes, the index stores the start of the next line,
+    the number of lines before it and the first timestamp from there on. Only these
+    probes are parsed; the rest of the file is just scanned for line breaks.
+
+    Args:
+        file (file object): The log file, opened in binary mode.
+        parser (BaseParser): Parser used to read the timestamps.
+        index (dict): The index; "offset" and "lines" describe the part covered so far.
+        end (int): Byte offset (a line start) up to which the index should cover the file.
+    """
+    entries = index["entries"]
+    offset, lines = index["offset"], index["lines"]
+    boundary = len(entries) * TIME_INDEX_INTERVAL
+    while boundary < end:
+        line_start = line_start_at(file, boundary)
+        if line_start >= end:
+            break
+        lines += count_newlines(file, offset, line_start)
+        found = probe_timestamp(file, line_start, min(end, line_start + TIME_INDEX_INTERVAL), parser)
+        entries.append((line_start, lines, found[2] if found else None))
+        offset = line_start
+        boundary += TIME_INDEX_INTERVAL
+    index["lines"] = lines + count_newlines(file, offset, end)
+    index["offset"] = end
+
+
+def load_time_index(file_path, format_type, parser):
+    """
+    Load the sparse time index of a log file, building or extending it as needed.
+
+    The index is stored as JSON next to the log file, but only if the directory
+    belongs to the current user; elsewhere it is built for this run only.
+
+    Args:
+        file_path (str): Path to the log file.
+        format_type (str): Log file format.
+        parser (BaseParser): Parser used to read the timestamps.
+
+    Returns:
+        dict: The index with its "entries".
+    """
+    index_path = time_index_path_for(file_path, format_type)
+    entry = read_sidecar(index_path, TIME_INDEX_VERSION, as_json=True)
+    if entry is None or not fingerprint_matches(file_path, entry["fingerprint"]):
+        entry = {"version": TIME_INDEX_VERSION, "offset": 0, "lines": 0, "entries": []}
+
+    # Only complete lines are indexed, so a line that is still being written is not counted
+    end = complete_lines_end(file_path, os.path.getsize(file_path))
+    if end > entry["offset"] or "fingerprint" not in entry:
+        with open(file_path, 'rb') as file:
+            extend_time_index(file, parser, entry, end)
+        entry["fingerprint"] = file_fingerprint(file_path, end)
+        if directory_is_owned(file_path):
+            write_sidecar(index_path, entry, as_json=True)
+    return entry
+
+
+def index_bounds(entries, before, size):
+    """
+    Use the index to find the interval that contains the boundary of before().
+
+    Returns:
+        tuple: (line start lo, number of lines before lo, hi) for bisect_file.
+    """
+    timed = [entry for entry in entries if entry[2] is not None]
+    position = bisect.bisect_left(timed, True, key=lambda entry: not before(entry[2]))
+    lo, lines = (timed[position - 1][0], timed[position - 1][1]) if position else (0, 0)
+    hi = timed[position][0] if position < len(timed) else size
+    return lo, lines, hi
+
+
+class TimeRange:
+    """
+    Restricts the analysis to entries between two normalized timestamps (inclusive).
+
+    For uncompressed files, locate() finds the byte range of the matching entries by
+    binary search, assuming the log is ordered by time as it is appended. Records
+    are still checked exactly, so only the boundaries rely on that order.
+    """
+
+    def __init__(self, since=None, until=None):
+        """
+        Args:
+            since (str or None): Earliest normalized timestamp to keep.
+            until (str or None): Latest normalized timestamp to keep.
+        """
+        self.since = since
+        self.until = until
+
+    def contains(self, timestamp):
+        return ((self.since is None or timestamp >= self.since)
+                and (self.until is None or timestamp <= self.until))
+
+    def filter(self, records):
+        """
+        Yield the records whose normalized timestamp lies in the range.
+
+        Raises:
+            ValueError: If a timestamp could not be normalized, so that comparing it
+                with the bounds would be meaningless.
+        """
+        for record in records:
+            timestamp = record['timestamp']
+            if not is_standard_timestamp(timestamp):
+                raise ValueError(
+                    f"--since and --until need timestamps that can be normalized, but '{timestamp}' "
+                    "is not. Add its layout to the timestamp_formats of the parser.")
+            if self.contains(timestamp):
+                yield record
+
+    def locate(self, file_path, format_type, parser):
+        """
+        Find the part of a log file that can contain entries of the range.
+
+        Args:
+            file_path (str): Path to the log file.
+            format_type (str): Log file format, used to name the sidecar index.
+            parser (BaseParser): Parser used to read the timestamps.
+
+        Returns:
+            tuple or None: (start, end, number of lines before start), or None if the
+            file is compressed and has to be read as a whole.
+        """
+        if detect_compression(file_path):
+            return None
+        size = os.path.getsize(file_path)
+        entries = load_time_index(file_path, format_type, parser)["entries"]
+
+        with open(file_path, 'rb') as file:
+            start, lines_before, end = 0, 0, size
+            if self.since is not None:
+                def before(timestamp):
+                    return timestamp < self.since
+                lo, lines, hi = index_bounds(entries, before, size)
+                start, _ = bisect_file(file, parser, before, lo, hi)
+                lines_before = lines + count_newlines(file, lo, start)
+            if self.until is not None:
+                def before(timestamp):
+                    return timestamp <= self.until
+                lo, _, hi = index_bounds(entries, before, size)
+                _, hi = bisect_file(file, parser, before, max(lo, start), max(hi, start))
+                end = min(size, line_start_at(file, hi))
+        return start, max(start, end), lines_before
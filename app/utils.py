@@ -1,9 +1,26 @@
+import heapq
+import io
+import math
 from datetime import datetime
+from readers import open_log_file, read_raw_lines
+from record_store import RecordStore, TimestampColumn, MISSING
+from sketches import QuantileSketch
+
+# Length of the prefix of a normalized timestamp ("YYYY-MM-DD HH:MM:SS") that
+# identifies its minute and hour bucket
+MINUTE_BUCKET = 16
+HOUR_BUCKET = 13
+
+# Number of most frequent values listed per bucket by top_counts_per_hour
+TOP_PER_BUCKET = 3
+
+# Percentiles reported by get_percentiles
+PERCENTILES = (50, 95, 99)
 
 
 def read_log_file(file_path):
     """
-    Read a log file and yield its lines.
+    Read a log file and yield its lines. Compressed files are decompressed.
 
     Args:
         file_path (str): Path to the log file to be read.
@@ -11,7 +28,7 @@ def read_log_file(file_path):
     Yields:
         str: A line from the log file.
     """
-    with open(file_path, 'r') as file:
+    with io.TextIOWrapper(open_log_file(file_path), encoding='utf-8', errors='replace') as file:
         for line in file:
             yield line
 
@@ -72,9 +89,18 @@ def get_range(items):
 
 
 def time_difference(items):
-    """Calculates time difference between earliest and latest timestamp."""
-    times = [datetime.strptime(ts, "%Y-%m-%d %H:%M:%S") for ts in items]
-    delta = max(times) - min(times)
+    """
+    Calculates time difference between earliest and latest timestamp.
+    Normalized timestamps sort chronologically as strings, so only two of them are parsed.
+    """
+    items = iter(items)
+    earliest = latest = next(items)
+    for ts in items:
+        if ts < earliest:
+            earliest = ts
+        elif ts > latest:
+            latest = ts
+    delta = datetime.strptime(latest, "%Y-%m-%d %H:%M:%S") - datetime.strptime(earliest, "%Y-%m-%d %H:%M:%S")
     return {"time_difference": delta.total_seconds() / 60}
 
 
@@ -86,10 +112,107 @@ def get_counts(items):
     return {"counts": counts}
 
 
+def count_per_bucket(items, length):
+    """Counts normalized timestamps per bucket, identified by the first length characters."""
+    counts = {}
+    for ts in items:
+        bucket = ts[:length]
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def rate_per_minute(items):
+    """Gets the number of entries per minute."""
+    return {"rate_per_minute": count_per_bucket(items, MINUTE_BUCKET)}
+
+
+def rate_per_hour(items):
+    """Gets the number of entries per hour."""
+    return {"rate_per_hour": count_per_bucket(items, HOUR_BUCKET)}
+
+
+def top_values_per_bucket(buckets, top=TOP_PER_BUCKET):
+    """Reduces {bucket: {value: count}} to the most frequent (value, count) pairs per bucket."""
+    return {bucket: heapq.nlargest(top, counts.items(), key=lambda item: item[1])
+            for bucket, counts in buckets.items()}
+
+
+def top_counts_per_hour(items):
+    """
+    Gets the most frequent values per hour.
+    Used with a (timestamp, field) key, so the items are (timestamp, value) pairs.
+    """
+    buckets = {}
+    for ts, value in items:
+        counts = buckets.setdefault(ts[:HOUR_BUCKET], {})
+        counts[value] = counts.get(value, 0) + 1
+    return {"top_per_hour": top_values_per_bucket(buckets)}
+
+
+def to_number(item):
+    """Returns an item as a number, or None if it is not numeric (e.g. a CLF size of '-')."""
+    if type(item) is str:
+        if item.isdigit():
+            return int(item)
+        try:
+            item = float(item)
+        except ValueError:
+            return None
+    elif type(item) not in (int, float):
+        return None
+    return item if math.isfinite(item) else None
+
+
+def sketch_percentiles(sketch):
+    """
+    Reads the PERCENTILES from a QuantileSketch. They are exact unless the sketch
+    ran out of room for its distinct values, which is flagged in the result.
+    """
+    if not len(sketch):
+        return {"percentiles": {}}
+    result = {"percentiles": {percentile: sketch.quantile(percentile / 100) for percentile in PERCENTILES}}
+    if sketch.approximate:
+        result["percentiles_approximate"] = True
+    return result
+
+
+def get_percentiles(items):
+    """
+    Gets the percentiles of the numeric items. They are exact up to a limit of
+    distinct values and approximate beyond it, so the memory stays bounded.
+    """
+    sketch = QuantileSketch()
+    sketch.add_many([number for number in map(to_number, items) if number is not None])
+    return sketch_percentiles(sketch)
+
+
+def insight_key(key):
+    """Returns the insights key of an analysis_config key; tuple keys are joined with '/'."""
+    return key if isinstance(key, str) else "/".join(key)
+
+
+def config_fields(config):
+    """Returns the fields used by an analysis_config, including those in tuple keys."""
+    fields = []
+    for key in config:
+        for field in ((key,) if isinstance(key, str) else key):
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+
+def select_analyses(config, fields):
+    """
+    Restrict an analysis_config to the given fields. A tuple key is kept if all of its fields are given.
+    """
+    fields = set(fields)
+    return {key: functions for key, functions in config.items()
+            if (key in fields if isinstance(key, str) else fields.issuperset(key))}
+
+
 def count_lines_in_file(file_path):
     """Count the number of lines in a file."""
-    with open(file_path, 'r') as file:
-        return sum(1 for _ in file)
+    return sum(1 for _ in read_raw_lines(file_path))
 
 
 def count_lines_in_list(lst):
@@ -97,23 +220,101 @@ def count_lines_in_list(lst):
     return len(lst)
 
 
+def column_range(column):
+    """Computes get_range directly on a RecordStore column."""
+    return {"range": column.value_range()}
+
+
+def column_time_difference(column):
+    """Computes time_difference on a RecordStore column of epoch timestamps."""
+    if not isinstance(column, TimestampColumn):
+        return time_difference(value for value in column if value is not MISSING)
+    earliest, latest = column.epoch_range()
+    return {"time_difference": (latest - earliest) / 60}
+
+
+def column_counts(column):
+    """Computes get_counts directly on a RecordStore column."""
+    return {"counts": column.counts()}
+
+
+def column_bucket_counts(column, seconds, length):
+    """Counts a timestamp column per bucket of the given length in seconds."""
+    if not isinstance(column, TimestampColumn):
+        return count_per_bucket((value for value in column if value is not MISSING), length)
+    counts = {}
+    for epoch in column.present_epochs():
+        bucket = epoch // seconds
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return {TimestampColumn.to_text(bucket * seconds)[:length]: count for bucket, count in counts.items()}
+
+
+def column_rate_per_minute(column):
+    """Computes rate_per_minute on the epoch seconds of a RecordStore column."""
+    return {"rate_per_minute": column_bucket_counts(column, 60, MINUTE_BUCKET)}
+
+
+def column_rate_per_hour(column):
+    """Computes rate_per_hour on the epoch seconds of a RecordStore column."""
+    return {"rate_per_hour": column_bucket_counts(column, 3600, HOUR_BUCKET)}
+
+
+# Column-level counterparts of the analysis functions. They work on the encoded
+# columns (e.g. counting dictionary codes) instead of building a list of items.
+COLUMN_ANALYSES = {
+    get_range: column_range,
+    time_difference: column_time_difference,
+    get_counts: column_counts,
+    rate_per_minute: column_rate_per_minute,
+    rate_per_hour: column_rate_per_hour,
+}
+
+
 def analyze_log_data(parsed_data, config):
+    """
+    Apply the analysis functions of a parser's analysis_config to the parsed data.
+
+    Args:
+        parsed_data (RecordStore or list): The parsed log entries.
+        config (dict): Maps field names (or tuples of field names, whose functions
+            receive tuples of values) to lists of analysis functions.
+
+    Returns:
+        dict: Insights keyed by the analyzed field.
+    """
     insights = {}
     # Check if a config is provided and is not empty
     if not config:
         return insights
-        
+
+    if not isinstance(parsed_data, RecordStore):
+        parsed_data = RecordStore.from_records(parsed_data)
+
     for key, functions in config.items():
-        # Ensure the key exists in the parsed data to avoid errors
-        if parsed_data and key in parsed_data[0]:
-            items = [entry[key] for entry in parsed_data if key in entry]
-            if not items:
+        if not isinstance(key, str):
+            # Combined key: the functions receive the rows where all fields are present
+            if not all(field in parsed_data for field in key):
                 continue
+            columns = [parsed_data.column(field) for field in key]
+            items = [values for values in zip(*columns) if MISSING not in values]
+            if items:
+                for function in functions:
+                    insights.setdefault(insight_key(key), {}).update(function(items))
+            continue
+
+        # Ensure the key exists in the parsed data to avoid errors
+        if key not in parsed_data or not any(True for _ in parsed_data.values(key)):
+            continue
+        column = parsed_data.column(key)
 
-            for function in functions:
-                result = function(items)
-                if key in insights:
-                    insights[key].update(result)
-                else:
-                    insights[key] = result
-    return insights
\ No newline at end of file
+        for function in functions:
+            column_function = COLUMN_ANALYSES.get(function)
+            if column_function:
+                result = column_function(column)
+            else:
+                result = function(list(parsed_data.values(key)))
+            if key in insights:
+                insights[key].update(result)
+            else:
+                insights[key] = result
+    return insights
@@ -0,0 +1,230 @@
+"""
+Benchmark of the whole parsing pipeline for every log format.
+
+Generates a deterministic synthetic log per format (see generate_logs.py) and measures:
+
+- pipeline: process_log_files and the first Analyze, as used by the interactive mode
+- stream: analyze_log_files, as used by --stream
+- stages: read, parse, timestamp normalization, record store and analysis, each
+  timed on its own over the output of the previous stage
+
+Every measurement runs in a fresh process, so its peak RSS is not inflated by an
+earlier one. Times are the best of --repeat runs. The results are written as JSON
+and can be compared with compare_results.py.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--lines N] [--malformed RATIO] [--formats CLF,JSON]
+                                        [--repeat N] [--output results.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..', 'app'))
+
+from parsers import parsers_util  # noqa: E402
+from parsers.parsers_util import (PARSE_BATCH_SIZE, get_parser_for_format,  # noqa: E402
+                                  convert_to_standard_timestamp)
+from readers import read_raw_lines, decode_log_lines  # noqa: E402
+from record_store import RecordStore  # noqa: E402
+from utils import analyze_log_data  # noqa: E402
+from analysis import InsightsCache  # noqa: E402
+from generate_logs import LINE_BUILDERS, write_log  # noqa: E402
+
+# resource is only available on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STAGES = ("read", "parse", "timestamps", "store", "analysis")
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_pipeline(file_path, format_type):
+    """
+    Parse into a RecordStore and analyze it like the interactive mode, with the
+    aggregates computed while parsing. Returns the number of lines read.
+    """
+    parsed_data, parser = parsers_util.process_log_files([file_path], format_type)
+    InsightsCache().insights(parsed_data, getattr(parser, 'analysis_config', {}))
+    return parsed_data.lines_read
+
+
+def run_stream(file_path, format_type):
+    """Analyze in a single streaming pass. Returns the number of lines read."""
+    analyzer, _ = parsers_util.analyze_log_files([file_path], format_type)
+    analyzer.insights()
+    return analyzer.lines_read
+
+
+def run_stages(file_path, format_type):
+    """
+    Run the pipeline stage by stage, keeping each intermediate result.
+
+    Returns:
+        tuple: ({stage: seconds}, number of lines read).
+    """
+    parser = get_parser_for_format(format_type)
+    timings = {}
+
+    started = time.perf_counter()
+    raw_lines = list(read_raw_lines(file_path))
+    timings["read"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parsed = []
+    for start in range(0, len(raw_lines), PARSE_BATCH_SIZE):
+        parsed.extend(parser.parse_lines(decode_log_lines(raw_lines[start:start + PARSE_BATCH_SIZE])))
+    timings["parse"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    records = []
+    for record in parsed:
+        if not record or 'timestamp' not in record:
+            continue
+        try:
+            record['timestamp'] = convert_to_standard_timestamp(record['timestamp'], parser)
+        except ValueError:
+            continue
+        records.append(record)
+    timings["timestamps"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    store = RecordStore.from_records(records)
+    timings["store"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    analyze_log_data(store, getattr(parser, 'analysis_config', {}))
+    timings["analysis"] = time.perf_counter() - started
+
+    return timings, len(raw_lines)
+
+
+def measure(mode, file_path, format_type, repeat):
+    """
+    Run one measurement repeatedly. Runs inside a fresh worker process.
+
+    Returns:
+        dict: Best time (or best time per stage), lines/sec and peak RSS.
+    """
+    # Warnings about malformed lines are expected and would only slow the run down
+    with open(os.devnull, 'w') as devnull, redirect_stderr(devnull):
+        if mode == "stages":
+            best = {}
+            for _ in range(repeat):
+                timings, lines = run_stages(file_path, format_type)
+                for stage, seconds in timings.items():
+                    best[stage] = min(seconds, best.get(stage, seconds))
+            total = sum(best.values())
+            return {"seconds": best, "lines_per_sec": lines / total, "peak_rss_mb": peak_rss_mb()}
+
+        run = run_pipeline if mode == "pipeline" else run_stream
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            lines = run(file_path, format_type)
+            seconds = time.perf_counter() - started
+            best = seconds if best is None else min(best, seconds)
+        return {"seconds": best, "lines_per_sec": lines / best, "peak_rss_mb": peak_rss_mb()}
+
+
+def measure_in_fresh_process(mode, file_path, format_type, repeat):
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(measure, mode, file_path, format_type, repeat).result()
+
+
+def git_revision():
+    """Return the current commit of the repository, or None outside of git."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_rss(value):
+    return "n/a" if value is None else f"{value:.0f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parsing pipeline for every log format.")
+    parser.add_argument('--lines', type=int, default=200000, help='Lines per generated log.')
+    parser.add_argument('--malformed', type=float, default=0.01, help='Share of malformed lines (0 to 1).')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the log generator.')
+    parser.add_argument('--formats', type=str, default=','.join(LINE_BUILDERS),
+                        help='Comma-separated formats to benchmark.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best one counts.')
+    parser.add_argument('--output', type=str,
+                        help='JSON file for the results (default: benchmarks/results/<date>-<commit>.json).')
+    args = parser.parse_args()
+
+    formats = [format_type.strip() for format_type in args.formats.split(',')]
+    unknown = [format_type for format_type in formats if format_type not in LINE_BUILDERS]
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(unknown)}")
+
+    revision = git_revision()
+    results = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "revision": revision,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "lines": args.lines,
+            "malformed": args.malformed,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "formats": {},
+    }
+
+    print(f"{'Format':<9}{'pipeline (l/s)':>16}{'stream (l/s)':>14}{'peak RSS':>10}  "
+          + "  ".join(f"{stage:>10}" for stage in STAGES))
+    with tempfile.TemporaryDirectory() as directory:
+        for format_type in formats:
+            file_path = os.path.join(directory, f"{format_type}.log")
+            size = write_log(file_path, format_type, args.lines, args.malformed, args.seed)
+            result = {"bytes": size}
+            for mode in ("pipeline", "stream", "stages"):
+                result[mode] = measure_in_fresh_process(mode, file_path, format_type, args.repeat)
+            results["formats"][format_type] = result
+
+            stages = result["stages"]["seconds"]
+            print(f"{format_type:<9}{result['pipeline']['lines_per_sec']:>16,.0f}"
+                  f"{result['stream']['lines_per_sec']:>14,.0f}"
+                  f"{format_rss(result['pipeline']['peak_rss_mb']):>10}  "
+                  + "  ".join(f"{stages[stage]:>9.3f}s" for stage in STAGES))
+
+    output = args.output
+    if output is None:
+        name = f"{datetime.now():%Y%m%d-%H%M%S}-{revision or 'unknown'}.json"
+        output = os.path.join(BENCHMARK_DIR, 'results', name)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark for the timestamp normalization in parsers_util.convert_to_standard_timestamp.
+
+Compares the previous implementation (regex month search and strptime over all
+timestamp_formats for every record) with the cached TimestampNormalizer and prints
+records/sec for CLF and Systemd timestamps.
+
+Usage:
+    python benchmarks/bench_timestamps.py [--records N] [--per-second N]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from parsers.clf_parser import CLFParser  # noqa: E402
+from parsers.systemd_journal_parser import SystemdJournalParser  # noqa: E402
+from parsers.parsers_util import convert_to_standard_timestamp  # noqa: E402
+
+
+def legacy_convert_to_standard_timestamp(timestamp_str, parser):
+    """The implementation before the TimestampNormalizer, without its debug print."""
+    month_map = {
+        'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04', 'May': '05', 'Jun': '06',
+        'Jul': '07', 'Aug': '08', 'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
+    }
+    month_search = re.search(r"([A-Z][a-z]{2})", timestamp_str)
+    if month_search:
+        month_abbr = month_search.group(1)
+        if month_abbr in month_map:
+            timestamp_str = timestamp_str.replace(month_abbr, month_map[month_abbr])
+            formats_to_try = [fmt.replace('%b', '%m') for fmt in getattr(parser, 'timestamp_formats', [])]
+        else:
+            formats_to_try = getattr(parser, 'timestamp_formats', [])
+    else:
+        formats_to_try = getattr(parser, 'timestamp_formats', [])
+
+    datetime_obj = None
+    for fmt in formats_to_try:
+        try:
+            datetime_obj = datetime.strptime(timestamp_str, fmt)
+            break
+        except ValueError:
+            continue
+    if datetime_obj is None:
+        raise ValueError(f"Time data '{timestamp_str}' does not match any known format.")
+    if parser.__class__.__name__ == "SystemdJournalParser":
+        datetime_obj = datetime_obj.replace(year=datetime.now().year)
+    return datetime_obj.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def generate_timestamps(layout, records, per_second):
+    """Generate timestamps where each second repeats per_second times, like a busy log."""
+    start = datetime(2023, 10, 10, 13, 55, 36)
+    timestamps = []
+    for index in range(records):
+        moment = start + timedelta(seconds=index // per_second)
+        if layout == 'clf':
+            timestamps.append(moment.strftime("%d/%b/%Y %H:%M:%S +0200"))
+        else:
+            timestamps.append(moment.strftime("%b %d %H:%M:%S"))
+    return timestamps
+
+
+def measure(function, timestamps, parser):
+    """Return records/sec for converting all timestamps with the given function."""
+    started = time.perf_counter()
+    for timestamp in timestamps:
+        function(timestamp, parser)
+    return len(timestamps) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark timestamp normalization.")
+    parser.add_argument('--records', type=int, default=200000, help='Timestamps per format.')
+    parser.add_argument('--per-second', type=int, default=20,
+                        help='How often each second repeats (1 disables cache hits).')
+    args = parser.parse_args()
+
+    print(f"{'Format':<10}{'before (rec/s)':>18}{'after (rec/s)':>18}{'speedup':>10}")
+    for layout, parser_class in (('clf', CLFParser), ('systemd', SystemdJournalParser)):
+        timestamps = generate_timestamps(layout, args.records, args.per_second)
+        before = measure(legacy_convert_to_standard_timestamp, timestamps, parser_class())
+        after = measure(convert_to_standard_timestamp, timestamps, parser_class())
+        print(f"{layout:<10}{before:>18,.0f}{after:>18,.0f}{after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare two result files of bench_pipeline.py and report regressions.
+
+Throughput (lines/sec) is compared for the pipeline, stream and staged runs, and
+time for every single stage and peak RSS. A change beyond --threshold in the
+wrong direction counts as a regression, and the script then exits with status 1,
+so it can guard a CI job.
+
+Usage:
+    python benchmarks/compare_results.py BASELINE.json CANDIDATE.json [--threshold 0.1]
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(file_path):
+    with open(file_path) as file:
+        return json.load(file)
+
+
+def metrics(result):
+    """
+    Flatten the result of one format into {name: (value, higher is better)}.
+    Metrics without a value (e.g. RSS on platforms without resource) are left out.
+    """
+    values = {}
+    for mode in ("pipeline", "stream", "stages"):
+        values[f"{mode} lines/sec"] = (result[mode]["lines_per_sec"], True)
+        if result[mode]["peak_rss_mb"] is not None:
+            values[f"{mode} peak RSS (MB)"] = (result[mode]["peak_rss_mb"], False)
+    for stage, seconds in result["stages"]["seconds"].items():
+        values[f"{stage} (s)"] = (seconds, False)
+    return values
+
+
+def compare(baseline, candidate, threshold):
+    """
+    Compare the formats present in both result files.
+
+    Returns:
+        tuple: (list of (format, metric, old, new, relative change, regression) rows,
+        number of regressions).
+    """
+    rows, regressions = [], 0
+    for format_type, result in candidate["formats"].items():
+        if format_type not in baseline["formats"]:
+            continue
+        old_metrics = metrics(baseline["formats"][format_type])
+        for name, (new, higher_is_better) in metrics(result).items():
+            if name not in old_metrics:
+                continue
+            old = old_metrics[name][0]
+            change = (new - old) / old if old else 0.0
+            regression = (change < -threshold) if higher_is_better else (change > threshold)
+            regressions += regression
+            rows.append((format_type, name, old, new, change, regression))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument('baseline', help='Result file of the reference run.')
+    parser.add_argument('candidate', help='Result file of the run to check.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative change that counts as a regression (default: 0.1 = 10%%).')
+    args = parser.parse_args()
+
+    baseline, candidate = load_results(args.baseline), load_results(args.candidate)
+    for key in ("lines", "malformed", "seed"):
+        if baseline["meta"][key] != candidate["meta"][key]:
+            print(f"Warning: The runs used different --{key} values "
+                  f"({baseline['meta'][key]} and {candidate['meta'][key]}).")
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"{baseline['meta']['revision']} -> {candidate['meta']['revision']}")
+    print(f"{'Format':<9}{'Metric':<28}{'before':>14}{'after':>14}{'change':>9}")
+    for format_type, name, old, new, change, regression in rows:
+        marker = "  REGRESSION" if regression else ""
+        print(f"{format_type:<9}{name:<28}{old:>14,.3f}{new:>14,.3f}{change:>+9.1%}{marker}")
+
+    if regressions:
+        print(f"{regressions} regression(s) beyond {args.threshold:.0%}.")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
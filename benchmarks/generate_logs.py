@@ -0,0 +1,139 @@
+"""
+Deterministic synthetic log generator for the benchmarks.
+
+Writes log files in every LogFormat (CLF, Syslog, Systemd, JSON). The same seed,
+size and malformed-line ratio always produce the same bytes, so benchmark runs on
+different machines or commits work on identical input. Malformed lines are a mix
+of lines that no parser matches and lines whose timestamp cannot be normalized.
+
+Usage:
+    python benchmarks/generate_logs.py --format CLF --lines 1000000 [--malformed 0.01] [--seed 1] OUTPUT
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from parsers.log_format import LogFormat  # noqa: E402
+
+START = datetime(2023, 10, 10, 0, 0, 0)
+METHODS = ("GET", "GET", "GET", "POST", "PUT", "DELETE")
+STATUSES = ("200", "200", "200", "200", "301", "304", "404", "500", "503")
+LEVELS = ("info", "info", "info", "warn", "error", "debug")
+SERVICES = ("sshd", "cron", "nginx", "kernel", "systemd", "dockerd")
+
+
+def clf_line(rng, moment, index):
+    ip = f"10.{rng.randrange(4)}.{rng.randrange(256)}.{rng.randrange(256)}"
+    size = str(rng.randrange(200, 50000)) if rng.random() > 0.1 else "-"
+    return (f'{ip} - - [{moment.strftime("%d/%b/%Y %H:%M:%S")} +0000] '
+            f'"{rng.choice(METHODS)} /api/v1/items/{rng.randrange(1000)} HTTP/1.1" '
+            f'{rng.choice(STATUSES)} {size}')
+
+
+def syslog_line(rng, moment, index):
+    return (f'<{rng.randrange(192)}> {moment.strftime("%Y-%m-%dT%H:%M:%S")}.{rng.randrange(1000):03d}Z '
+            f'host{rng.randrange(20)} {rng.choice(SERVICES)} {rng.randrange(100, 40000)} ID{rng.randrange(50)} '
+            f'request {index} handled in {rng.randrange(1, 900)} ms')
+
+
+def systemd_line(rng, moment, index):
+    return (f'{moment.strftime("%b %d %H:%M:%S")} host{rng.randrange(20)} '
+            f'{rng.choice(SERVICES)}[{rng.randrange(100, 40000)}]: session {index} opened for user u{rng.randrange(500)}')
+
+
+def json_line(rng, moment, index):
+    return json.dumps({
+        "timestamp": moment.strftime("%Y-%m-%d %H:%M:%S"),
+        "level": rng.choice(LEVELS),
+        "service": rng.choice(SERVICES),
+        "msg": f"request {index} handled",
+        "duration_ms": rng.randrange(1, 900),
+    })
+
+
+# Line builders per format
+LINE_BUILDERS = {
+    LogFormat.CLF.value: clf_line,
+    LogFormat.SYSLOG.value: syslog_line,
+    LogFormat.SYSTEMD.value: systemd_line,
+    LogFormat.JSON.value: json_line,
+}
+
+
+# Date part of the timestamp per format, replaced to make a timestamp invalid
+DATE_LAYOUTS = {
+    LogFormat.CLF.value: "[%d/%b/%Y ",
+    LogFormat.SYSLOG.value: " %Y-%m-%dT",
+    LogFormat.SYSTEMD.value: "%b %d ",
+    LogFormat.JSON.value: '"%Y-%m-%d ',
+}
+
+
+def malformed_line(rng, line, format_type, moment):
+    """Turn a valid line into one that is skipped: garbage or an invalid timestamp."""
+    if rng.random() < 0.5:
+        return f"garbage {rng.randrange(10 ** 9)} -- not a log line"
+    # Day 32 does not exist, so the line matches but its timestamp cannot be normalized
+    layout = DATE_LAYOUTS[format_type]
+    return line.replace(moment.strftime(layout), moment.strftime(layout.replace("%d", "32")), 1)
+
+
+def generate_lines(format_type, count, malformed_ratio=0.0, seed=1):
+    """
+    Generate the lines of a synthetic log, ordered by time.
+
+    Args:
+        format_type (str): A LogFormat value.
+        count (int): Number of lines.
+        malformed_ratio (float): Share of lines that are malformed (0 to 1).
+        seed (int): Seed of the random generator.
+
+    Yields:
+        str: A log line without line break.
+    """
+    build = LINE_BUILDERS[format_type]
+    rng = random.Random(seed)
+    moment = START
+    for index in range(count):
+        # Several lines per second, like a busy log
+        if rng.random() < 0.3:
+            moment += timedelta(seconds=1)
+        line = build(rng, moment, index)
+        if malformed_ratio and rng.random() < malformed_ratio:
+            line = malformed_line(rng, line, format_type, moment)
+        yield line
+
+
+def write_log(file_path, format_type, count, malformed_ratio=0.0, seed=1):
+    """
+    Write a synthetic log file.
+
+    Returns:
+        int: Size of the file in bytes.
+    """
+    with open(file_path, 'w', encoding='utf-8') as file:
+        for line in generate_lines(format_type, count, malformed_ratio, seed):
+            file.write(line + "\n")
+    return os.path.getsize(file_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic log file.")
+    parser.add_argument('output', help='Path of the log file to write.')
+    parser.add_argument('-f', '--format', choices=list(LINE_BUILDERS), default=LogFormat.CLF.value)
+    parser.add_argument('--lines', type=int, default=100000, help='Number of lines.')
+    parser.add_argument('--malformed', type=float, default=0.0, help='Share of malformed lines (0 to 1).')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the random generator.')
+    args = parser.parse_args()
+
+    size = write_log(args.output, args.format, args.lines, args.malformed, args.seed)
+    print(f"Wrote {args.lines:,} {args.format} lines ({size / 1024 / 1024:.1f} MB) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()